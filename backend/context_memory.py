@@ -1,9 +1,28 @@
+"""
+Recent conversation turns per subject.
+
+MongoDB (`chat_context`) holds the full history; the last CONTEXT_TURNS turns
+of recently active subjects are served from a context store
+(backend/context_store.py, selected with CONTEXT_BACKEND):
+
+- memory: a bounded per-process LRU cache of compact __slots__ records with a
+  global record and byte budget, so memory per worker stays flat
+- sqlite / redis: shared by every worker, so all of them read the same turns
+
+A subject missing from the store is loaded once from its rolling summary
+document (backend/context_summary.py), which also holds the last turns, and
+seeded into it. While MongoDB is available, turns only extend subjects
+already in the store, so a worker never starts a partial history that hides
+older turns. Hit / miss / eviction counters are exported through
+get_context_stats().
+"""
 from __future__ import annotations
 
-from collections import defaultdict, deque
 from datetime import datetime
-from typing import Deque, Dict, List, Optional
+from typing import Any, Dict, List, Optional
 
+from backend.context_store import CONTEXT_TURNS, ContextRecord, create_context_store
+from backend.context_summary import load_summary, push_turn, summary_view
 from database.db_connection import get_database
 
 try:
@@ -12,49 +31,65 @@ try:
 except Exception:  # pragma: no cover
     _context_collection = None
 
-_memory_cache: Dict[str, Deque[dict]] = defaultdict(lambda: deque(maxlen=5))
-
-
-def _make_record(subject_id: str, user_msg: str, bot_msg: str, metadata: Optional[dict]) -> dict:
-    return {
-        "subject_id": subject_id,
-        "user": user_msg,
-        "bot": bot_msg,
-        "metadata": metadata or {},
-        "timestamp": datetime.utcnow(),
-    }
+_context_store = create_context_store()
 
 
 def append_context(subject_id: str, user_msg: str, bot_msg: str, metadata: Optional[dict] = None) -> None:
-    record = _make_record(subject_id, user_msg, bot_msg, metadata)
-    cache = _memory_cache[subject_id]
-    cache.append(record)
-
+    timestamp = datetime.utcnow()
+    record = ContextRecord(user_msg, bot_msg, metadata, timestamp)
+    persisted = False
     if _context_collection is not None:
         try:
-            _context_collection.insert_one(record, max_time_ms=2000)
+            _context_collection.insert_one({
+                "subject_id": subject_id,
+                "user": user_msg,
+                "bot": bot_msg,
+                "metadata": metadata or {},
+                "timestamp": timestamp,
+            })
+            persisted = True
+            push_turn(subject_id, record)
         except Exception:  # pragma: no cover
-            # MongoDB unavailable - continue with in-memory cache only
+            # MongoDB unavailable - continue with the context store only
             pass
 
+    try:
+        _context_store.append(subject_id, record, create=not persisted)
+    except Exception:  # pragma: no cover
+        # Shared store unavailable - the turn is in MongoDB
+        pass
 
-def get_context(subject_id: str, limit: int = 5) -> List[dict]:
-    history: List[dict] = list(_memory_cache.get(subject_id, []))
 
-    if not history and _context_collection is not None:
+def get_context(subject_id: str, limit: int = CONTEXT_TURNS) -> List[dict]:
+    try:
+        records = _context_store.get(subject_id)
+    except Exception:  # pragma: no cover
+        # Shared store unavailable - read MongoDB directly
+        records = None
+
+    if records is None:
+        records = []
+        if _context_collection is not None:
+            try:
+                records = [ContextRecord.from_doc(turn) for turn in load_summary(subject_id).get("recent", [])]
+            except Exception:  # pragma: no cover
+                # MongoDB unavailable - nothing stored for this subject yet
+                return []
         try:
-            cursor = (
-                _context_collection.find({"subject_id": subject_id}, max_time_ms=2000)
-                .sort("timestamp", -1)
-                .limit(limit)
-            )
-            history = list(cursor)[::-1]  # oldest first
-            for item in history:
-                item.pop("_id", None)
-            _memory_cache[subject_id] = deque(history, maxlen=limit)
+            _context_store.put(subject_id, records)
         except Exception:  # pragma: no cover
-            # MongoDB unavailable - use in-memory cache only
-            history = list(_memory_cache.get(subject_id, []))
+            # Shared store unavailable - serve what MongoDB returned
+            pass
+
+    return [record.to_dict(subject_id) for record in records[-limit:]]
+
+
+def get_context_summary(subject_id: str) -> dict:
+    """Rolled-up history of a subject: emotion distribution, recurring topics, last escalation."""
+    if _context_collection is None:
+        return summary_view(None)
+    return summary_view(load_summary(subject_id))
 
-    return history[-limit:]
 
+def get_context_stats() -> Dict[str, Any]:
+    return _context_store.stats()
@@ -0,0 +1,387 @@
+"""
+Backends holding the last CONTEXT_TURNS conversation turns per subject.
+
+Selected with CONTEXT_BACKEND:
+
+- memory (default): a bounded per-process LRU cache (ContextCache). Each
+  uvicorn worker only sees the turns it handled itself.
+- sqlite: one row per subject in a WAL-mode SQLite file (CONTEXT_SQLITE_PATH)
+  shared by every worker on the host.
+- redis: one list per subject on a Redis-protocol server (CONTEXT_REDIS_URL,
+  needs the redis package); "fakeredis://" uses the in-process fakeredis
+  stand-in, like mongomock:// for MongoDB.
+
+Every backend appends and trims a subject's turns atomically, so all workers
+read the same last N turns in one lookup. MongoDB (`chat_context`) stays the
+source of truth: a subject missing from the store is a miss, loaded from
+MongoDB by the caller and seeded with put(), and subjects idle longer than
+CONTEXT_IDLE_TTL are dropped from the store.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+try:
+    import redis
+except ImportError:  # optional: only needed for CONTEXT_BACKEND=redis
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_BACKEND = os.getenv("CONTEXT_BACKEND", "memory").lower()
+CONTEXT_TURNS = int(os.getenv("CONTEXT_TURNS", "5"))
+CONTEXT_MAX_TEXT_CHARS = int(os.getenv("CONTEXT_MAX_TEXT_CHARS", "1000"))
+CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv("CONTEXT_CACHE_MAX_ENTRIES", "50000"))
+CONTEXT_CACHE_MAX_BYTES = int(float(os.getenv("CONTEXT_CACHE_MAX_MB", "64")) * (1 << 20))
+CONTEXT_IDLE_TTL = float(os.getenv("CONTEXT_IDLE_TTL", str(6 * 3600)))
+CONTEXT_SQLITE_PATH = os.getenv("CONTEXT_SQLITE_PATH", os.path.join("data", "context_store.sqlite3"))
+CONTEXT_REDIS_URL = os.getenv("CONTEXT_REDIS_URL", "redis://localhost:6379/0")
+
+# URLs with this scheme are served by fakeredis (in-process Redis stand-in)
+IN_MEMORY_REDIS_PREFIX = "fakeredis://"
+
+
+class ContextRecord:
+    """One conversation turn as held in a context store."""
+
+    __slots__ = ("user", "bot", "emotion", "probability", "tags", "tone", "escalate", "sent_at", "timestamp", "nbytes")
+
+    def __init__(self, user: str, bot: str, metadata: Optional[dict], timestamp: datetime):
+        metadata = metadata or {}
+        self.user = (user or "")[:CONTEXT_MAX_TEXT_CHARS]
+        self.bot = (bot or "")[:CONTEXT_MAX_TEXT_CHARS]
+        self.emotion: Optional[str] = metadata.get("emotion")
+        probability = metadata.get("probability")
+        self.probability: Optional[float] = float(probability) if probability is not None else None
+        self.tags: Tuple[str, ...] = tuple(metadata.get("tags") or ())
+        self.tone: Optional[str] = metadata.get("tone")
+        self.escalate = bool(metadata.get("escalate", False))
+        self.sent_at: Optional[str] = metadata.get("timestamp")
+        self.timestamp = timestamp
+        self.nbytes = (
+            sys.getsizeof(self)
+            + sys.getsizeof(self.user)
+            + sys.getsizeof(self.bot)
+            + sys.getsizeof(self.tags)
+            + sum(sys.getsizeof(tag) for tag in self.tags)
+        )
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "ContextRecord":
+        return cls(doc.get("user", ""), doc.get("bot", ""), doc.get("metadata"), doc.get("timestamp") or datetime.utcnow())
+
+    def metadata(self) -> Dict[str, Any]:
+        metadata: Dict[str, Any] = {}
+        for key, value in (
+            ("emotion", self.emotion),
+            ("probability", self.probability),
+            ("tags", list(self.tags) if self.tags else None),
+            ("tone", self.tone),
+            ("escalate", True if self.escalate else None),
+            ("timestamp", self.sent_at),
+        ):
+            if value is not None:
+                metadata[key] = value
+        return metadata
+
+    def to_dict(self, subject_id: str) -> dict:
+        return {
+            "subject_id": subject_id,
+            "user": self.user,
+            "bot": self.bot,
+            "metadata": self.metadata(),
+            "timestamp": self.timestamp,
+        }
+
+    def to_json(self) -> str:
+        """Compact serialized form used by the shared backends."""
+        return json.dumps(
+            [self.user, self.bot, self.metadata(), self.timestamp.isoformat()],
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def from_json(cls, data) -> "ContextRecord":
+        user, bot, metadata, timestamp = json.loads(data)
+        return cls(user, bot, metadata, datetime.fromisoformat(timestamp))
+
+
+class ContextCache:
+    """Thread-safe per-subject turn cache with LRU eviction under an entry and byte budget."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = CONTEXT_CACHE_MAX_ENTRIES, max_bytes: int = CONTEXT_CACHE_MAX_BYTES,
+                 turns: int = CONTEXT_TURNS, idle_ttl: float = CONTEXT_IDLE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.turns = turns
+        self.idle_ttl = idle_ttl
+        # subject_id -> (last access, turns), least recently used first
+        self._subjects: "OrderedDict[str, Tuple[float, Deque[ContextRecord]]]" = OrderedDict()
+        self._entries = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def _drop(self, subject_id: str) -> None:
+        _, records = self._subjects.pop(subject_id)
+        self._entries -= len(records)
+        self._bytes -= sum(record.nbytes for record in records)
+
+    def _enforce_budget(self, now: float) -> None:
+        # Idle subjects sit at the LRU end, so expiry stops at the first active one
+        while self._subjects:
+            subject_id, (last_access, _) = next(iter(self._subjects.items()))
+            if now - last_access <= self.idle_ttl:
+                break
+            self._drop(subject_id)
+            self._stats["expirations"] += 1
+        while len(self._subjects) > 1 and (self._entries > self.max_entries or self._bytes > self.max_bytes):
+            self._drop(next(iter(self._subjects)))
+            self._stats["evictions"] += 1
+
+    def get(self, subject_id: str) -> Optional[List[ContextRecord]]:
+        """Cached turns (oldest first), or None on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._subjects.get(subject_id)
+            if entry is None or now - entry[0] > self.idle_ttl:
+                self._stats["misses"] += 1
+                return None
+            self._subjects[subject_id] = (now, entry[1])
+            self._subjects.move_to_end(subject_id)
+            self._stats["hits"] += 1
+            return list(entry[1])
+
+    def append(self, subject_id: str, record: ContextRecord, create: bool = True) -> None:
+        """Add a turn; with create=False a subject that is not cached stays a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._subjects.pop(subject_id, None)
+            if entry is None and not create:
+                return
+            records = entry[1] if entry else deque(maxlen=self.turns)
+            if len(records) == records.maxlen:
+                self._entries -= 1
+                self._bytes -= records[0].nbytes
+            records.append(record)
+            self._entries += 1
+            self._bytes += record.nbytes
+            self._subjects[subject_id] = (now, records)
+            self._enforce_budget(now)
+
+    def put(self, subject_id: str, records: List[ContextRecord]) -> None:
+        """Replace a subject's turns (e.g. after loading them from MongoDB)."""
+        now = time.monotonic()
+        with self._lock:
+            if subject_id in self._subjects:
+                self._drop(subject_id)
+            turns = deque(records[-self.turns:], maxlen=self.turns)
+            self._subjects[subject_id] = (now, turns)
+            self._entries += len(turns)
+            self._bytes += sum(record.nbytes for record in turns)
+            self._enforce_budget(now)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._subjects.clear()
+            self._entries = 0
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": self.name,
+                "subjects": len(self._subjects),
+                "entries": self._entries,
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                **self._stats,
+            }
+
+
+class SQLiteContextStore:
+    """One JSON row per subject in a WAL-mode SQLite file shared by the workers of a host."""
+
+    name = "sqlite"
+    PURGE_EVERY = 1000  # appends between idle-subject purges
+
+    def __init__(self, path: str = CONTEXT_SQLITE_PATH, turns: int = CONTEXT_TURNS, idle_ttl: float = CONTEXT_IDLE_TTL):
+        self.path = path
+        self.turns = turns
+        self.idle_ttl = idle_ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expirations": 0}
+        self._appends = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS chat_context ("
+            "subject_id TEXT PRIMARY KEY, turns TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._connection().execute("CREATE INDEX IF NOT EXISTS chat_context_updated ON chat_context (updated_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shared between threads, nor with forked workers
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self._stats[key] += n
+
+    def get(self, subject_id: str) -> Optional[List[ContextRecord]]:
+        row = self._connection().execute(
+            "SELECT turns FROM chat_context WHERE subject_id = ? AND updated_at >= ?",
+            (subject_id, time.time() - self.idle_ttl),
+        ).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return [ContextRecord.from_json(turn) for turn in json.loads(row[0])]
+
+    def append(self, subject_id: str, record: ContextRecord, create: bool = True) -> None:
+        connection = self._connection()
+        now = time.time()
+        # BEGIN IMMEDIATE takes the write lock up front, so read-modify-write is atomic across workers
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT turns FROM chat_context WHERE subject_id = ? AND updated_at >= ?",
+                (subject_id, now - self.idle_ttl),
+            ).fetchone()
+            if row is not None or create:
+                turns = (json.loads(row[0]) if row else []) + [record.to_json()]
+                connection.execute(
+                    "INSERT OR REPLACE INTO chat_context (subject_id, turns, updated_at) VALUES (?, ?, ?)",
+                    (subject_id, json.dumps(turns[-self.turns:]), now),
+                )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        with self._lock:
+            self._appends += 1
+            purge = self._appends % self.PURGE_EVERY == 0
+        if purge:
+            self.purge_idle()
+
+    def put(self, subject_id: str, records: List[ContextRecord]) -> None:
+        turns = [record.to_json() for record in records[-self.turns:]]
+        self._connection().execute(
+            "INSERT OR REPLACE INTO chat_context (subject_id, turns, updated_at) VALUES (?, ?, ?)",
+            (subject_id, json.dumps(turns), time.time()),
+        )
+
+    def purge_idle(self) -> int:
+        """Delete subjects idle longer than idle_ttl; returns how many were removed."""
+        cursor = self._connection().execute(
+            "DELETE FROM chat_context WHERE updated_at < ?", (time.time() - self.idle_ttl,)
+        )
+        self._count("expirations", cursor.rowcount)
+        return cursor.rowcount
+
+    def clear(self) -> None:
+        self._connection().execute("DELETE FROM chat_context")
+
+    def stats(self) -> Dict[str, Any]:
+        subjects = self._connection().execute("SELECT COUNT(*) FROM chat_context").fetchone()[0]
+        with self._lock:
+            return {"backend": self.name, "path": self.path, "subjects": subjects, **self._stats}
+
+
+class RedisContextStore:
+    """One list per subject on a Redis-protocol server; appends are RPUSH + LTRIM in one transaction."""
+
+    name = "redis"
+    KEY_PREFIX = "chat_context:"
+    EMPTY = b"-"
+
+    def __init__(self, url: str = CONTEXT_REDIS_URL, turns: int = CONTEXT_TURNS, idle_ttl: float = CONTEXT_IDLE_TTL):
+        if url.startswith(IN_MEMORY_REDIS_PREFIX):
+            import fakeredis
+
+            self.client = fakeredis.FakeRedis()
+        else:
+            if redis is None:
+                raise RuntimeError("CONTEXT_BACKEND=redis needs the redis package")
+            self.client = redis.Redis.from_url(url, socket_timeout=2.0)
+        self.url = url
+        self.turns = turns
+        self.idle_ttl = int(idle_ttl)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def get(self, subject_id: str) -> Optional[List[ContextRecord]]:
+        turns = self.client.lrange(self.KEY_PREFIX + subject_id, 0, -1)
+        if not turns:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return [ContextRecord.from_json(turn) for turn in turns if turn != self.EMPTY]
+
+    def append(self, subject_id: str, record: ContextRecord, create: bool = True) -> None:
+        key = self.KEY_PREFIX + subject_id
+        pipe = self.client.pipeline(transaction=True)
+        # RPUSHX only extends an existing list, leaving unknown subjects a miss
+        (pipe.rpush if create else pipe.rpushx)(key, record.to_json())
+        pipe.ltrim(key, -self.turns, -1)
+        pipe.expire(key, self.idle_ttl)
+        pipe.execute()
+
+    def put(self, subject_id: str, records: List[ContextRecord]) -> None:
+        key = self.KEY_PREFIX + subject_id
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(key)
+        # Redis has no empty lists: a subject without history is stored as the EMPTY marker
+        turns = [record.to_json() for record in records[-self.turns:]] or [self.EMPTY]
+        pipe.rpush(key, *turns)
+        pipe.expire(key, self.idle_ttl)
+        pipe.execute()
+
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter(match=self.KEY_PREFIX + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": self.name, **self._stats}
+
+
+def create_context_store(backend: str = CONTEXT_BACKEND):
+    """Build the configured store, falling back to the in-process cache if it cannot be opened."""
+    try:
+        if backend == "sqlite":
+            return SQLiteContextStore()
+        if backend == "redis":
+            return RedisContextStore()
+        if backend != "memory":
+            logger.error(f"Unknown CONTEXT_BACKEND {backend!r}; using the in-process cache")
+    except Exception:
+        logger.exception(f"Could not open the {backend} context store; using the in-process cache")
+    return ContextCache()
@@ -0,0 +1,231 @@
+"""
+Rolling per-subject conversation summaries.
+
+`chat_context` keeps every turn; `chat_context_summaries` keeps one small
+document per subject (_id = subject_id) with:
+
+- recent: the last CONTEXT_TURNS turns (oldest first)
+- emotions / topics: counts over the turns that aged out of `recent`
+  (topics are MENTAL_HEALTH_TOPICS words found in the user's messages)
+- last_escalation: the newest escalated turn or crisis
+- turns / compacted: turns seen and turns folded into the counts
+
+push_turn() adds a turn with one atomic $push/$slice and folds the turns it
+pushed out of `recent` into the counts with a single $inc, so the summary is
+maintained incrementally and reading a subject's context is one find_one by
+_id however long the history is. Subjects whose history predates the summary
+are compacted from `chat_context` once (compact_subject); run
+`python -m backend.context_summary` to backfill all of them up front.
+"""
+import argparse
+import logging
+import re
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from backend.context_store import CONTEXT_TURNS, ContextRecord
+from backend.relevance_checker import MENTAL_HEALTH_TOPICS
+from database.db_connection import get_database
+
+logger = logging.getLogger(__name__)
+
+db = get_database()
+chat_context = db["chat_context"]
+context_summaries = db["chat_context_summaries"]
+
+SUMMARY_TOP_TOPICS = 5
+TOPIC_WORDS = frozenset(MENTAL_HEALTH_TOPICS)
+_WORD_RE = re.compile(r"[a-z']+")
+
+
+def ensure_summary_indexes() -> None:
+    chat_context.create_index([("subject_id", ASCENDING), ("timestamp", ASCENDING)])
+
+
+def _key(name: str) -> str:
+    """Mongo-safe field name for a counter key."""
+    return name.replace(".", "_").lstrip("$") or "_"
+
+
+def turn_topics(text: str) -> List[str]:
+    return sorted(TOPIC_WORDS.intersection(_WORD_RE.findall((text or "").lower())))
+
+
+def _turn_doc(record: ContextRecord) -> dict:
+    return {"user": record.user, "bot": record.bot, "metadata": record.metadata(), "timestamp": record.timestamp}
+
+
+def _escalation(turn: dict, reason: str = "escalate") -> dict:
+    metadata = turn.get("metadata") or {}
+    return {"timestamp": turn.get("timestamp"), "reason": reason, "emotion": metadata.get("emotion")}
+
+
+def _count_turn(turn: dict, emotions: Counter, topics: Counter) -> None:
+    emotion = (turn.get("metadata") or {}).get("emotion")
+    if emotion:
+        emotions[_key(emotion)] += 1
+    for topic in turn_topics(turn.get("user", "")):
+        topics[_key(topic)] += 1
+
+
+def _fold(turns: List[dict]) -> Dict[str, int]:
+    """$inc document folding aged-out turns into the emotion/topic counts."""
+    emotions: Counter = Counter()
+    topics: Counter = Counter()
+    for turn in turns:
+        _count_turn(turn, emotions, topics)
+    inc = {f"emotions.{name}": count for name, count in emotions.items()}
+    inc.update({f"topics.{name}": count for name, count in topics.items()})
+    inc["compacted"] = len(turns)
+    return inc
+
+
+def push_turn(subject_id: str, record: ContextRecord, turns: int = CONTEXT_TURNS) -> None:
+    """Append a turn to the subject's summary, folding the turns it pushes out of `recent`."""
+    turn = _turn_doc(record)
+    update = {
+        "$push": {"recent": {"$each": [turn], "$slice": -turns}},
+        "$inc": {"turns": 1},
+        "$set": {"last_turn_at": record.timestamp},
+        # Summaries created here still need the older history folded in (compact_subject)
+        "$setOnInsert": {"subject_id": subject_id, "compacted_at": None},
+    }
+    if record.escalate:
+        update["$set"]["last_escalation"] = _escalation(turn)
+    before = context_summaries.find_one_and_update(
+        {"_id": subject_id},
+        update,
+        projection={"recent": 1},
+        upsert=True,
+        return_document=ReturnDocument.BEFORE,
+    )
+    # find_one_and_update is atomic, so each pre-image's overflow is folded exactly once
+    recent = (before or {}).get("recent") or []
+    aged_out = recent[:max(0, len(recent) + 1 - turns)]
+    if aged_out:
+        context_summaries.update_one({"_id": subject_id}, {"$inc": _fold(aged_out)})
+
+
+def record_escalation(subject_id: str, reason: str, emotion: Optional[str] = None, timestamp: Optional[datetime] = None) -> None:
+    """Mark an escalation (e.g. a crisis reply) that is not stored as a conversation turn."""
+    context_summaries.update_one(
+        {"_id": subject_id},
+        {
+            "$set": {"last_escalation": {"timestamp": timestamp or datetime.utcnow(), "reason": reason, "emotion": emotion}},
+            "$setOnInsert": {"subject_id": subject_id, "turns": 0, "recent": [], "compacted_at": None},
+        },
+        upsert=True,
+    )
+
+
+def compact_subject(subject_id: str, turns: int = CONTEXT_TURNS) -> dict:
+    """
+    Rebuild a subject's summary from its full `chat_context` history.
+
+    Streams the history once in timestamp order. The rebuilt document only
+    replaces the stored one if no turn was pushed meanwhile.
+    """
+    current = context_summaries.find_one({"_id": subject_id}, {"turns": 1, "last_escalation": 1}) or {}
+    emotions: Counter = Counter()
+    topics: Counter = Counter()
+    recent: List[dict] = []
+    count = 0
+    last_escalation = None
+    cursor = chat_context.find({"subject_id": subject_id}, {"_id": 0}).sort("timestamp", ASCENDING)
+    for doc in cursor:
+        turn = _turn_doc(ContextRecord.from_doc(doc))
+        count += 1
+        if (doc.get("metadata") or {}).get("escalate"):
+            last_escalation = _escalation(turn)
+        recent.append(turn)
+        if len(recent) > turns:
+            _count_turn(recent.pop(0), emotions, topics)
+
+    stored_escalation = current.get("last_escalation")
+    if stored_escalation and (
+        last_escalation is None or (stored_escalation.get("timestamp") or datetime.min) > (last_escalation.get("timestamp") or datetime.min)
+    ):
+        last_escalation = stored_escalation  # crisis marks are not in chat_context
+
+    summary = {
+        "subject_id": subject_id,
+        "recent": recent,
+        "turns": count,
+        "compacted": max(0, count - len(recent)),
+        "emotions": dict(emotions),
+        "topics": dict(topics),
+        "last_escalation": last_escalation,
+        "last_turn_at": recent[-1]["timestamp"] if recent else None,
+        "compacted_at": datetime.utcnow(),
+    }
+    try:
+        context_summaries.replace_one({"_id": subject_id, "turns": current.get("turns")}, summary, upsert=not current)
+    except DuplicateKeyError:
+        # A turn created the summary meantime; the next load compacts again
+        pass
+    return {"_id": subject_id, **summary}
+
+
+def load_summary(subject_id: str) -> dict:
+    """The subject's summary document, compacting its history first if that never happened."""
+    doc = context_summaries.find_one({"_id": subject_id})
+    if doc is None or doc.get("compacted_at") is None:
+        doc = compact_subject(subject_id)
+    return doc
+
+
+def summary_view(doc: Optional[dict]) -> dict:
+    """API form of a summary document: emotion shares, top topics and the last escalation."""
+    doc = doc or {}
+    emotions = doc.get("emotions") or {}
+    total = sum(emotions.values())
+    topics = Counter(doc.get("topics") or {})
+    return {
+        "turns": doc.get("turns", 0),
+        "summarized_turns": doc.get("compacted", 0),
+        "emotion_distribution": {name: round(count / total, 3) for name, count in sorted(emotions.items())} if total else {},
+        "recurring_topics": [name for name, _ in topics.most_common(SUMMARY_TOP_TOPICS)],
+        "last_escalation": doc.get("last_escalation"),
+        "last_turn_at": doc.get("last_turn_at"),
+    }
+
+
+def compact_all(subject_ids: Optional[List[str]] = None) -> int:
+    """Compact every subject in chat_context (or the given ones) without a compacted summary."""
+    if subject_ids is None:
+        subject_ids = chat_context.distinct("subject_id")
+    done = {
+        doc["_id"]
+        for doc in context_summaries.find({"_id": {"$in": subject_ids}, "compacted_at": {"$ne": None}}, {"_id": 1})
+    }
+    compacted = 0
+    for subject_id in subject_ids:
+        if subject_id in done:
+            continue
+        compact_subject(subject_id)
+        compacted += 1
+    return compacted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill rolling conversation summaries from chat_context")
+    parser.add_argument("--subject", action="append", default=None, help="Subject to compact (repeatable; default: all)")
+    parser.add_argument("--force", action="store_true", help="Rebuild summaries that already exist")
+    args = parser.parse_args()
+
+    ensure_summary_indexes()
+    if args.force:
+        subject_ids = args.subject or chat_context.distinct("subject_id")
+        for subject_id in subject_ids:
+            compact_subject(subject_id)
+        print(f"✅ Rebuilt {len(subject_ids)} conversation summaries")
+    else:
+        print(f"✅ Compacted {compact_all(args.subject)} conversation summaries")
+
+
+if __name__ == "__main__":
+    main()
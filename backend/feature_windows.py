@@ -0,0 +1,134 @@
+"""
+Aligned per-window feature matrices of physiological recordings.
+
+Shared by offline ingestion (database/wearable_preprocess.py) and live
+uploads (backend/wearable_upload.py), so both score windows with the same
+features: per-window means of the WINDOW_SENSORS channels on one common
+timeline, plus event and spectral features (HRV, SCRs, respiration and pulse
+rate) computed at each sensor's own rate on the same window grid. LF/HF
+needs a longer RR span than a typical window (physio_signals.LF_HF_WINDOW_S),
+so it is NaN for windows without that much history.
+"""
+import numpy as np
+
+from backend.physio_signals import (
+    DEFAULT_HOP_S,
+    DEFAULT_WINDOW_S,
+    ECG_SAMPLE_RATE,
+    EDA_SAMPLE_RATE,
+    LF_HF_WINDOW_S,
+    align_signals,
+    detect_r_peaks,
+    hrv_by_window,
+    lf_hf_by_window,
+    pulse_rate_by_window,
+    resp_rate_by_window,
+    scr_by_window,
+    window_means,
+)
+from backend.wellness_fusion import PWI_FEATURES
+
+# PWI feature -> sensor whose per-window mean feeds it ("ecg" is per-window RMSSD)
+WINDOW_SENSORS = {"eda": "EDA", "temp": "Temp", "bvp": "BVP", "resp": "Resp"}
+
+# Common timeline for the WINDOW_SENSORS channels: the slowest WESAD rate (wrist EDA/TEMP)
+ALIGN_RATE_HZ = 4.0
+
+# Spectral rate feature -> (sensor, per-window estimator): breaths/min and bpm
+RATE_FEATURES = {"resp_rate": ("Resp", resp_rate_by_window), "pulse_rate": ("BVP", pulse_rate_by_window)}
+
+# Per-window features stored next to the PWI inputs (SCRs per minute, mean SCR amplitude in uS)
+WINDOW_EXTRA_FEATURES = ["scr_rate", "scr_amplitude"]
+
+
+def hrv_windows(ecg, fs=ECG_SAMPLE_RATE, window_s=DEFAULT_WINDOW_S, hop_s=None):
+    """Time-domain HRV and LF/HF per window, from one R-peak detection pass."""
+    peaks = detect_r_peaks(ecg, fs)
+    windows = hrv_by_window(ecg, fs=fs, window_s=window_s, hop_s=hop_s, peaks=peaks)
+    spectral = lf_hf_by_window(peaks, fs, len(ecg) / fs, window_s=window_s, hop_s=hop_s)
+    windows["lf_hf"] = spectral["lf_hf"]
+    return windows
+
+
+def segment_lf_hf(ecg, fs=ECG_SAMPLE_RATE):
+    """LF/HF over a whole ECG segment (NaN when shorter than LF_HF_WINDOW_S)."""
+    duration_s = len(ecg) / fs
+    if duration_s < LF_HF_WINDOW_S:
+        return float("nan")
+    return float(lf_hf_by_window(detect_r_peaks(ecg, fs), fs, duration_s, window_s=duration_s)["lf_hf"][0])
+
+
+def extract_feature_matrix(
+    signals,
+    sample_rates,
+    window_s=DEFAULT_WINDOW_S,
+    hop_s=DEFAULT_HOP_S,
+):
+    """
+    Aligned per-window feature matrix for a recording.
+
+    The WINDOW_SENSORS channels (700 Hz chest, 4-64 Hz wrist) are first
+    resampled onto one ALIGN_RATE_HZ timeline and windowed together
+    (physio_signals.align_signals / window_means). Event and spectral features
+    ("ecg" RMSSD, "lf_hf", "resp_rate", "pulse_rate", WINDOW_EXTRA_FEATURES)
+    are computed at each sensor's own rate on the same window grid. Columns
+    are cut to the shortest one.
+
+    Args:
+        signals: Sensor name -> array (in-memory or memory-mapped)
+        sample_rates: Sensor name -> sample rate in Hz
+        window_s: Window length in seconds
+        hop_s: Step between window starts in seconds
+
+    Returns:
+        {"names", "start_s", "values" (float32, windows x names), "window_s",
+        "hop_s", "duration_s"}, or None when no channel is long enough
+    """
+    columns = {}
+    durations = []
+    present = {
+        feature: sensor for feature, sensor in WINDOW_SENSORS.items()
+        if signals.get(sensor) is not None and len(signals[sensor])
+    }
+    if present:
+        aligned_names, aligned = align_signals(
+            {feature: signals[sensor] for feature, sensor in present.items()},
+            {feature: sample_rates.get(sensor, ECG_SAMPLE_RATE) for feature, sensor in present.items()},
+            ALIGN_RATE_HZ,
+        )
+        means = window_means(aligned, ALIGN_RATE_HZ, window_s, hop_s)
+        for col, feature in enumerate(aligned_names):
+            columns[feature] = means[:, col]
+        durations.append(aligned.shape[0] / ALIGN_RATE_HZ)
+    ecg = signals.get('ECG')
+    if ecg is not None and len(ecg):
+        fs = sample_rates.get('ECG', ECG_SAMPLE_RATE)
+        hrv = hrv_windows(ecg, fs, window_s=window_s, hop_s=hop_s)
+        columns["ecg"], columns["lf_hf"] = hrv["rmssd"], hrv["lf_hf"]
+        durations.append(len(ecg) / fs)
+    for name, (sensor, estimator) in RATE_FEATURES.items():
+        arr = signals.get(sensor)
+        if arr is not None and len(arr):
+            columns[name] = estimator(arr, sample_rates.get(sensor, ECG_SAMPLE_RATE), window_s, hop_s)
+    eda = signals.get('EDA')
+    if eda is not None and len(eda):
+        fs = sample_rates.get('EDA', EDA_SAMPLE_RATE)
+        scrs = scr_by_window(eda, fs=fs, window_s=window_s, hop_s=hop_s)
+        columns["scr_rate"], columns["scr_amplitude"] = scrs["scr_rate"], scrs["scr_amplitude"]
+    n_windows = min((len(values) for values in columns.values()), default=0)
+    if not n_windows:
+        return None
+
+    names = PWI_FEATURES + WINDOW_EXTRA_FEATURES
+    values = np.full((n_windows, len(names)), np.nan, dtype=np.float32)
+    for col, name in enumerate(names):
+        if name in columns:
+            values[:, col] = columns[name][:n_windows]
+    return {
+        "names": names,
+        "start_s": np.arange(n_windows) * hop_s,
+        "values": values,
+        "window_s": window_s,
+        "hop_s": hop_s,
+        "duration_s": max(durations) if durations else n_windows * hop_s + window_s,
+    }
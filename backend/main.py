@@ -6,8 +6,12 @@ Upgraded to support empathetic chatbot with user registration.
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 import logging
+import os
+import threading
 
-from fastapi import Depends, FastAPI, HTTPException, Request, status
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field, EmailStr
 
@@ -17,14 +21,29 @@ from backend.empathy_engine import (
     generate_response as generate_empathy_response,
     generate_empathetic_reply,
 )
-from backend.context_memory import append_context, get_context
+from backend.context_memory import append_context, get_context, get_context_stats, get_context_summary
+from backend.context_summary import ensure_summary_indexes, record_escalation
 from backend.safety_guard import detect_crisis, CRISIS_RESPONSE
 from backend.relevance_checker import is_relevant
 from database.chat_logger import log_chat
 from database.fetch_chat_api import router as history_router
 from backend.utils.emotion_fallback import detect_fallback_emotion
+from backend.wellness_cache import get_cache_stats
 from backend.wellness_fusion import compute_pwi
+from backend.wellness_cohort import MAX_COHORT_SIZE, compute_cohort_pwi
+from backend.wellness_snapshots import recompute_if_scoring_changed
+from backend.wellness_baselines import start_baseline_refresher
+from backend.wellness_series import (
+    DEFAULT_SERIES_POINTS,
+    DOWNSAMPLE_METHODS,
+    MAX_SERIES_POINTS,
+    get_pwi_series,
+    naive_utc,
+)
 from backend.recommendations import generate_recommendations
+from backend.stress_events import get_stress_events
+from backend.signal_buffers import buffer_stats
+from backend.wearable_upload import UploadError, enqueue_upload, parse_frames, queue_depths, start_upload_workers
 from backend.auth import (
     authenticate_user,
     register_user,
@@ -68,6 +87,33 @@ app.add_middleware(
 # Include history router (protected)
 app.include_router(history_router, dependencies=[Depends(get_current_user)])
 
+
+@app.on_event("startup")
+def refresh_wellness_snapshots():
+    """Recompute materialized PWI snapshots in the background if scoring changed."""
+    threading.Thread(target=recompute_if_scoring_changed, daemon=True).start()
+
+
+@app.on_event("startup")
+def schedule_baseline_refresh():
+    """Keep rolling 7/30-day baselines up to date in the background."""
+    start_baseline_refresher(float(os.getenv("BASELINE_REFRESH_INTERVAL", "900")))
+
+
+@app.on_event("startup")
+def prepare_context_summaries():
+    """Index chat_context for one-time summary compaction of older histories."""
+    try:
+        ensure_summary_indexes()
+    except Exception:
+        logger.exception("Could not create chat context indexes")
+
+
+@app.on_event("startup")
+def start_wearable_upload_workers():
+    """Worker threads draining live wearable uploads into ring buffers and the PWI state."""
+    start_upload_workers()
+
 # -----------------------------
 # Models
 # -----------------------------
@@ -105,6 +151,13 @@ class RegisterResponse(BaseModel):
     subject_id: str
 
 
+class CohortWellnessRequest(BaseModel):
+    subject_ids: Optional[List[str]] = Field(default=None, max_length=MAX_COHORT_SIZE)
+    subject_prefix: Optional[str] = None
+    status: Optional[str] = None
+    limit: int = Field(default=MAX_COHORT_SIZE, ge=1, le=MAX_COHORT_SIZE)
+
+
 # -----------------------------
 # Health endpoint
 # -----------------------------
@@ -113,6 +166,17 @@ def health_check():
     return {"status": "ok", "message": "Backend is running"}
 
 
+@app.get("/metrics")
+def metrics(current_user: dict = Depends(get_current_user)):
+    """In-process cache, buffer and queue counters of this worker."""
+    return {
+        "context_cache": get_context_stats(),
+        "wellness_cache": get_cache_stats(),
+        "signal_buffers": buffer_stats(),
+        "upload_queues": queue_depths(),
+    }
+
+
 # -----------------------------
 # Auth endpoints
 # -----------------------------
@@ -244,6 +308,10 @@ def chat_with_emotion(
             )
         except Exception:
             logger.exception("Failed to log crisis event")
+        try:
+            record_escalation(subject_id, reason="crisis", emotion="crisis")
+        except Exception:
+            logger.exception("Failed to record crisis escalation")
         
         return response
 
@@ -407,6 +475,7 @@ def chat_with_emotion(
                 "probability": float(emotion_prob),
                 "tags": tags,
                 "tone": tone,
+                "escalate": escalate_flag,
                 "timestamp": timestamp,
             },
         )
@@ -469,6 +538,10 @@ def emotion_analysis(
             "pwi": None,
             "status": "Crisis Detected",
         }
+        try:
+            record_escalation(subject_id, reason="crisis", emotion="crisis")
+        except Exception:
+            logger.exception("Failed to record crisis escalation")
         return ChatResponse(
             text=CRISIS_RESPONSE,
             emotion="crisis",
@@ -550,6 +623,7 @@ def emotion_analysis(
                 "probability": float(top_prob),
                 "tags": tags,
                 "tone": tone,
+                "escalate": escalate_flag,
                 "timestamp": timestamp,
             },
         )
@@ -581,6 +655,119 @@ def get_wellness(subject_id: str, current_user: dict = Depends(get_current_user)
     return result
 
 
+@app.get("/wellness/{subject_id}/series")
+def get_wellness_series(
+    subject_id: str,
+    start: Optional[datetime] = Query(default=None, alias="from"),
+    end: Optional[datetime] = Query(default=None, alias="to"),
+    points: int = Query(default=DEFAULT_SERIES_POINTS, ge=2, le=MAX_SERIES_POINTS),
+    method: str = Query(default="lttb"),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Get the PWI and feature history for a subject, downsampled server-side.
+    
+    Long ranges return at most `points` points (LTTB or min/max buckets), so
+    multi-month charts keep a small payload.
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"method must be one of {', '.join(DOWNSAMPLE_METHODS)}",
+        )
+    # Compare and query as naive UTC, whether or not the client sent an offset
+    start, end = naive_utc(start), naive_utc(end)
+    if start and end and start > end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'from' must be before 'to'",
+        )
+    return get_pwi_series(subject_id, start=start, end=end, points=points, method=method)
+
+
+@app.get("/wellness/{subject_id}/events")
+def get_wellness_events(
+    subject_id: str,
+    since: Optional[datetime] = None,
+    limit: int = Query(default=50, ge=1, le=500),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Get detected stress-onset events for a subject, newest first.
+    """
+    return {"subject_id": subject_id, "events": get_stress_events(subject_id, since=since, limit=limit)}
+
+
+@app.get("/context/{subject_id}/summary")
+def get_conversation_summary(
+    subject_id: str,
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Get the rolling conversation summary of a subject: emotion distribution,
+    recurring topics and the last escalation.
+    """
+    return {"subject_id": subject_id, **get_context_summary(subject_id)}
+
+
+@app.post("/wellness/bulk")
+def get_cohort_wellness(
+    data: CohortWellnessRequest,
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Get wellness data for many subjects at once (clinician dashboards).
+    
+    Select subjects with an explicit subject_ids list or a subject_prefix
+    filter; optionally keep only one wellness status. Every subject gets the
+    same PWI as /wellness/{subject_id}.
+    """
+    if not data.subject_ids and not data.subject_prefix:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide subject_ids or subject_prefix",
+        )
+    return compute_cohort_pwi(
+        subject_ids=data.subject_ids,
+        subject_prefix=data.subject_prefix,
+        status=data.status,
+        limit=data.limit,
+    )
+
+
+@app.post("/wearable/upload", status_code=status.HTTP_202_ACCEPTED)
+async def upload_wearable_chunks(request: Request, current_user: dict = Depends(get_current_user)):
+    """
+    Upload live sensor chunks for the authenticated user's subject.
+    
+    The body is one or more binary frames (application/octet-stream): a small
+    header with channel, sample rate and start time followed by little-endian
+    samples, raw or gzip/zstd compressed (see backend/wearable_upload.py).
+    Chunks are queued for ingestion; 503 with Retry-After means the server is
+    behind and the client should resend later.
+    """
+    subject_id = current_user["subject_id"]
+    body = await request.body()
+    try:
+        # Decompressing and validating a large upload would block the event loop
+        chunks = await run_in_threadpool(parse_frames, body)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    if not enqueue_upload(subject_id, chunks):
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"detail": "Ingestion queue full, retry later"},
+            headers={"Retry-After": "5"},
+        )
+    return {
+        "subject_id": subject_id,
+        "accepted": [
+            {"channel": c.channel, "samples": int(c.samples.size), "sample_rate": c.sample_rate}
+            for c in chunks
+        ],
+    }
+
+
 @app.get("/recommendations")
 def get_recommendations(
     emotion: str,
@@ -0,0 +1,646 @@
+"""
+Vectorized physiological signal processing (pure NumPy).
+
+ECG: Pan-Tompkins-style R-peak detection (band-pass, derivative, squaring,
+moving-window integration, adaptive threshold, refractory period) and
+RR-interval HRV metrics (RMSSD, SDNN, mean HR) per window.
+
+EDA: skin-conductance responses (SCRs) from a tonic/phasic decomposition,
+with onsets and peaks at derivative sign changes, filtered by amplitude and
+rise time; SCR rate and amplitude per window.
+
+Spectral features (HRV LF/HF from the resampled RR series, respiration rate,
+BVP pulse rate) come from one batched rfft over a stacked window matrix per
+signal.
+
+Per-window statistics for any channel come from strided sliding-window views
+(no copies of overlapping windows). Channels recorded at different rates are
+aligned onto one timeline (aggregated or interpolated) so their windows share
+a grid; label arrays are run-length encoded into condition segments.
+
+Every step works on whole arrays; long recordings (e.g. memory-mapped WESAD
+ECG at 700 Hz) are processed in overlapping chunks, so the only Python loops
+are over chunks and never over samples.
+"""
+from typing import Dict, Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+ECG_SAMPLE_RATE = 700
+
+# R-peak detector settings
+QRS_BAND_HZ = (5.0, 15.0)
+INTEGRATION_WINDOW_S = 0.15
+REFRACTORY_S = 0.25
+THRESHOLD_WINDOW_S = 2.0
+THRESHOLD_RATIO = 0.3
+
+# Physiologically plausible RR intervals (30-200 bpm)
+RR_MIN_S = 0.3
+RR_MAX_S = 2.0
+
+# SCR detector settings
+EDA_SAMPLE_RATE = 4  # Empatica E4 wrist EDA
+EDA_SMOOTH_S = 1.0  # low-pass before differentiating
+TONIC_WINDOW_S = 10.0  # slow (tonic) skin-conductance level
+SCR_MIN_AMPLITUDE = 0.01  # microsiemens
+SCR_RISE_TIME_S = (0.5, 5.0)
+
+# Spectral feature settings (Hz)
+RR_RESAMPLE_HZ = 4.0
+LF_BAND_HZ = (0.04, 0.15)
+HF_BAND_HZ = (0.15, 0.40)
+# Shortest RR span LF/HF is estimated over: a few cycles of the slowest LF
+# component (0.04 Hz = 25 s period); the usual short-term length is 2-5 min
+LF_HF_WINDOW_S = 120.0
+RESP_BAND_HZ = (0.1, 0.7)  # 6-42 breaths/min
+RESP_TARGET_HZ = 10.0  # chest Resp is decimated from 700 Hz before the FFT
+PULSE_BAND_HZ = (0.7, 3.5)  # 42-210 bpm
+FFT_OVERSAMPLE = 4  # zero-padding factor for finer frequency bins
+
+DEFAULT_WINDOW_S = 60.0
+DEFAULT_HOP_S = 30.0
+DEFAULT_CHUNK_S = 300.0
+# Samples materialized at once when reducing sliding windows
+WINDOW_BLOCK_SAMPLES = 1 << 21
+
+
+# -----------------------------
+# Filtering primitives
+# -----------------------------
+def moving_average(x: np.ndarray, width: int) -> np.ndarray:
+    """Centered moving average (same length as x) via a cumulative sum."""
+    x = np.asarray(x, dtype=float)
+    width = int(width)
+    if width <= 1 or x.size == 0:
+        return x.copy()
+    width = min(width, x.size)
+    padded = np.pad(x, (width // 2, width - 1 - width // 2), mode="edge")
+    csum = np.cumsum(padded)
+    csum = np.concatenate(([0.0], csum))
+    return (csum[width:] - csum[:-width]) / width
+
+
+def bandpass(x: np.ndarray, fs: float, low_hz: float, high_hz: float) -> np.ndarray:
+    """Band-pass as the difference of two moving-average low-pass filters."""
+    smooth_high = moving_average(x, max(1, round(fs / high_hz)))
+    smooth_low = moving_average(x, max(1, round(fs / low_hz)))
+    return smooth_high - smooth_low
+
+
+def running_max(x: np.ndarray, width: int) -> np.ndarray:
+    """
+    Centered running maximum in O(n) (van Herk / Gil-Werman).
+
+    Blocks of `width` samples get prefix and suffix maxima with
+    np.maximum.accumulate; every window spans at most two blocks.
+    """
+    x = np.asarray(x, dtype=float)
+    width = int(width)
+    n = x.size
+    if width <= 1 or n == 0:
+        return x.copy()
+    left = width // 2
+    padded = np.pad(x, (left, width - 1 - left), constant_values=-np.inf)
+    n_blocks = -(-padded.size // width)
+    blocks = np.pad(padded, (0, n_blocks * width - padded.size), constant_values=-np.inf).reshape(n_blocks, width)
+    prefix = np.maximum.accumulate(blocks, axis=1).ravel()
+    suffix = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    starts = np.arange(n)
+    return np.maximum(suffix[starts], prefix[starts + width - 1])
+
+
+# -----------------------------
+# R-peak detection
+# -----------------------------
+def _detect_r_peaks_block(ecg: np.ndarray, fs: float) -> np.ndarray:
+    ecg = np.nan_to_num(np.asarray(ecg, dtype=float))
+    if ecg.size < int(fs):
+        return np.empty(0, dtype=np.int64)
+
+    filtered = bandpass(ecg, fs, *QRS_BAND_HZ)
+    energy = np.diff(filtered, prepend=filtered[0]) ** 2
+    integrated = moving_average(energy, max(1, round(INTEGRATION_WINDOW_S * fs)))
+
+    # Adaptive threshold: a fraction of the local envelope over a few beats
+    threshold = THRESHOLD_RATIO * running_max(integrated, round(THRESHOLD_WINDOW_S * fs))
+    # Refractory period: a candidate must be the maximum within +/- REFRACTORY_S
+    local_max = running_max(integrated, 2 * round(REFRACTORY_S * fs) + 1)
+    rising = np.empty_like(integrated, dtype=bool)
+    rising[0] = False
+    rising[1:] = integrated[1:] > integrated[:-1]
+    candidates = np.flatnonzero((integrated >= local_max) & (integrated > threshold) & rising)
+    if candidates.size == 0:
+        return candidates.astype(np.int64)
+
+    # Refine to the largest absolute band-passed deflection near each candidate
+    half = max(1, round(INTEGRATION_WINDOW_S * fs))
+    offsets = np.arange(-half, half + 1)
+    index = np.clip(candidates[:, None] + offsets[None, :], 0, ecg.size - 1)
+    peaks = index[np.arange(candidates.size), np.argmax(np.abs(filtered[index]), axis=1)]
+    return np.unique(peaks).astype(np.int64)
+
+
+def detect_r_peaks(ecg: np.ndarray, fs: float = ECG_SAMPLE_RATE, chunk_s: Optional[float] = DEFAULT_CHUNK_S) -> np.ndarray:
+    """
+    Detect R-peak sample indices in an ECG signal.
+
+    Args:
+        ecg: 1-D ECG array (in-memory or np.memmap; (n, 1) is flattened)
+        fs: Sampling rate in Hz
+        chunk_s: Process in chunks of this many seconds (None = whole array)
+
+    Returns:
+        Sorted int64 array of R-peak indices
+    """
+    ecg = np.asarray(ecg).reshape(-1)
+    n = ecg.shape[0]
+    if not chunk_s or n <= chunk_s * fs:
+        return _detect_r_peaks_block(ecg, fs)
+
+    chunk = int(chunk_s * fs)
+    margin = int(THRESHOLD_WINDOW_S * fs)
+    found = []
+    for start in range(0, n, chunk):
+        stop = min(start + chunk, n)
+        lo = max(0, start - margin)
+        block_peaks = _detect_r_peaks_block(ecg[lo:min(n, stop + margin)], fs) + lo
+        found.append(block_peaks[(block_peaks >= start) & (block_peaks < stop)])
+    peaks = np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+    # Drop near-duplicates detected on both sides of a chunk boundary
+    if peaks.size > 1:
+        keep = np.ones(peaks.size, dtype=bool)
+        keep[1:] = np.diff(peaks) > REFRACTORY_S * fs
+        peaks = peaks[keep]
+    return peaks
+
+
+# -----------------------------
+# RR intervals & HRV
+# -----------------------------
+def rr_intervals(peaks: np.ndarray, fs: float = ECG_SAMPLE_RATE):
+    """
+    RR intervals (seconds) with their end times and a plausibility mask.
+
+    Returns:
+        (rr, times, valid) arrays of length len(peaks) - 1
+    """
+    peaks = np.asarray(peaks)
+    if peaks.size < 2:
+        empty = np.empty(0)
+        return empty, empty, np.empty(0, dtype=bool)
+    rr = np.diff(peaks) / fs
+    times = peaks[1:] / fs
+    valid = (rr >= RR_MIN_S) & (rr <= RR_MAX_S)
+    return rr, times, valid
+
+
+def compute_rmssd(rr: np.ndarray, valid: Optional[np.ndarray] = None) -> Optional[float]:
+    """RMSSD in milliseconds over successive valid RR intervals."""
+    rr = np.asarray(rr, dtype=float)
+    if valid is None:
+        valid = np.ones(rr.size, dtype=bool)
+    pair_ok = valid[1:] & valid[:-1]
+    if not pair_ok.any():
+        return None
+    diffs = np.diff(rr)[pair_ok]
+    return float(np.sqrt(np.mean(diffs ** 2)) * 1000)
+
+
+def _detect_scrs_block(eda: np.ndarray, fs: float) -> Dict[str, np.ndarray]:
+    eda = np.nan_to_num(np.asarray(eda, dtype=float).reshape(-1))
+    smoothed = moving_average(eda, max(1, round(EDA_SMOOTH_S * fs)))
+    tonic = moving_average(smoothed, max(1, round(TONIC_WINDOW_S * fs)))
+    phasic = smoothed - tonic
+
+    # Onsets: derivative turns positive; peaks: derivative turns non-positive
+    rising = np.diff(phasic) > 0
+    onsets = np.flatnonzero(~rising[:-1] & rising[1:]) + 1
+    peaks = np.flatnonzero(rising[:-1] & ~rising[1:]) + 1
+    if onsets.size == 0 or peaks.size == 0:
+        empty = np.empty(0)
+        return {"onsets": empty.astype(np.int64), "peaks": empty.astype(np.int64), "amplitudes": empty, "rise_times": empty}
+
+    # Pair every peak with the latest onset before it
+    owner = np.searchsorted(onsets, peaks) - 1
+    paired = owner >= 0
+    peaks, onsets = peaks[paired], onsets[owner[paired]]
+    amplitudes = phasic[peaks] - phasic[onsets]
+    rise_times = (peaks - onsets) / fs
+    keep = (
+        (amplitudes >= SCR_MIN_AMPLITUDE)
+        & (rise_times >= SCR_RISE_TIME_S[0])
+        & (rise_times <= SCR_RISE_TIME_S[1])
+    )
+    return {"onsets": onsets[keep], "peaks": peaks[keep], "amplitudes": amplitudes[keep], "rise_times": rise_times[keep]}
+
+
+def detect_scrs(eda: np.ndarray, fs: float = EDA_SAMPLE_RATE, chunk_s: Optional[float] = DEFAULT_CHUNK_S) -> Dict[str, np.ndarray]:
+    """
+    Detect skin-conductance responses in an EDA signal (microsiemens).
+
+    Args:
+        eda: 1-D EDA array (in-memory or np.memmap; (n, 1) is flattened)
+        fs: Sampling rate in Hz
+        chunk_s: Process in chunks of this many seconds (None = whole array)
+
+    Returns:
+        dict of arrays: onsets, peaks (sample indices), amplitudes (uS), rise_times (s)
+    """
+    eda = np.asarray(eda).reshape(-1)
+    n = eda.shape[0]
+    if not chunk_s or n <= chunk_s * fs:
+        return _detect_scrs_block(eda, fs)
+
+    chunk = int(chunk_s * fs)
+    margin = int((TONIC_WINDOW_S + SCR_RISE_TIME_S[1]) * fs)
+    found = []
+    for start in range(0, n, chunk):
+        stop = min(start + chunk, n)
+        lo = max(0, start - margin)
+        block = _detect_scrs_block(eda[lo:min(n, stop + margin)], fs)
+        owned = (block["peaks"] + lo >= start) & (block["peaks"] + lo < stop)
+        found.append({
+            "onsets": block["onsets"][owned] + lo,
+            "peaks": block["peaks"][owned] + lo,
+            "amplitudes": block["amplitudes"][owned],
+            "rise_times": block["rise_times"][owned],
+        })
+    return {key: np.concatenate([part[key] for part in found]) for key in found[0]}
+
+
+def scr_by_window(
+    eda: np.ndarray,
+    fs: float = EDA_SAMPLE_RATE,
+    window_s: float = DEFAULT_WINDOW_S,
+    hop_s: Optional[float] = None,
+    chunk_s: Optional[float] = DEFAULT_CHUNK_S,
+) -> Dict[str, np.ndarray]:
+    """
+    SCR rate (per minute) and mean amplitude (uS) per window.
+
+    Returns:
+        dict of arrays: start_s, scr_rate, scr_amplitude (NaN when a window has no SCR), count
+    """
+    hop_s = hop_s or window_s
+    duration = np.asarray(eda).reshape(-1).shape[0] / fs
+    starts = np.arange(0.0, max(duration - window_s, 0.0) + 1e-9, hop_s)
+    scrs = detect_scrs(eda, fs, chunk_s=chunk_s)
+    times = scrs["peaks"] / fs
+
+    csum = np.concatenate(([0.0], np.cumsum(scrs["amplitudes"])))
+    lo = np.searchsorted(times, starts)
+    hi = np.searchsorted(times, starts + window_s)
+    count = (hi - lo).astype(float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        amplitude = np.where(count > 0, (csum[hi] - csum[lo]) / count, np.nan)
+    return {
+        "start_s": starts,
+        "scr_rate": count * 60.0 / window_s,
+        "scr_amplitude": amplitude,
+        "count": count,
+    }
+
+
+def hrv_by_window(
+    ecg: np.ndarray,
+    fs: float = ECG_SAMPLE_RATE,
+    window_s: float = DEFAULT_WINDOW_S,
+    hop_s: Optional[float] = None,
+    chunk_s: Optional[float] = DEFAULT_CHUNK_S,
+    peaks: Optional[np.ndarray] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Per-window HRV metrics from an ECG recording.
+
+    Window sums are taken from cumulative sums at searchsorted boundaries, so
+    overlapping windows (hop < window) cost no more than disjoint ones.
+
+    Returns:
+        dict of arrays: start_s, rmssd (ms), sdnn (ms), mean_hr (bpm), beats.
+        Windows with fewer than two usable intervals hold NaN.
+    """
+    hop_s = hop_s or window_s
+    duration = np.asarray(ecg).reshape(-1).shape[0] / fs
+    if peaks is None:
+        peaks = detect_r_peaks(ecg, fs, chunk_s=chunk_s)
+
+    starts = np.arange(0.0, max(duration - window_s, 0.0) + 1e-9, hop_s)
+    rr, times, valid = rr_intervals(peaks, fs)
+
+    rr_ok = np.where(valid, rr, 0.0)
+    pair_ok = np.zeros(rr.size, dtype=bool)
+    succ_sq = np.zeros(rr.size)
+    if rr.size > 1:
+        pair_ok[1:] = valid[1:] & valid[:-1]
+        succ_sq[1:] = np.where(pair_ok[1:], np.diff(rr) ** 2, 0.0)
+
+    def window_sums(values: np.ndarray) -> np.ndarray:
+        csum = np.concatenate(([0.0], np.cumsum(values)))
+        return csum[np.searchsorted(times, starts + window_s)] - csum[np.searchsorted(times, starts)]
+
+    count = window_sums(valid.astype(float))
+    total = window_sums(rr_ok)
+    total_sq = window_sums(rr_ok ** 2)
+    pairs = window_sums(pair_ok.astype(float))
+    succ = window_sums(succ_sq)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_rr = np.where(count > 0, total / count, np.nan)
+        var_rr = np.where(count > 1, (total_sq - count * mean_rr ** 2) / (count - 1), np.nan)
+        sdnn = np.sqrt(np.clip(var_rr, 0, None)) * 1000
+        rmssd = np.where(pairs > 0, np.sqrt(succ / pairs) * 1000, np.nan)
+        mean_hr = 60.0 / mean_rr
+
+    usable = count >= 2
+    return {
+        "start_s": starts,
+        "rmssd": np.where(usable, rmssd, np.nan),
+        "sdnn": np.where(usable, sdnn, np.nan),
+        "mean_hr": np.where(usable, mean_hr, np.nan),
+        "beats": count,
+    }
+
+
+def summarize_windows(values: np.ndarray) -> Dict[str, Optional[float]]:
+    """Mean/std across windows, ignoring NaN windows."""
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if values.size == 0:
+        return {"mean": None, "std": None}
+    return {"mean": float(values.mean()), "std": float(values.std())}
+
+
+# -----------------------------
+# Sliding-window features
+# -----------------------------
+def window_count(n_samples: int, fs: float, window_s: float, hop_s: Optional[float] = None) -> int:
+    """Number of full windows of window_s seconds, every hop_s seconds."""
+    window = int(round(window_s * fs))
+    hop = max(1, int(round((hop_s or window_s) * fs)))
+    if window < 1 or n_samples < window:
+        return 0
+    return (n_samples - window) // hop + 1
+
+
+def sliding_windows(x: np.ndarray, fs: float, window_s: float, hop_s: Optional[float] = None) -> np.ndarray:
+    """(n_windows, window) strided view of a 1-D signal; overlapping windows share memory."""
+    x = np.asarray(x).reshape(-1)
+    window = max(1, int(round(window_s * fs)))
+    hop = max(1, int(round((hop_s or window_s) * fs)))
+    if x.size < window:
+        return np.empty((0, window), dtype=x.dtype)
+    return sliding_window_view(x, window)[::hop]
+
+
+def window_stats(
+    x: np.ndarray,
+    fs: float,
+    window_s: float = DEFAULT_WINDOW_S,
+    hop_s: Optional[float] = DEFAULT_HOP_S,
+) -> Dict[str, np.ndarray]:
+    """
+    Mean, std, min and max of every window of a signal.
+
+    Reductions run on the strided view in blocks of windows (bounded by
+    WINDOW_BLOCK_SAMPLES), so memory-mapped recordings are never fully loaded.
+    Windows containing NaN hold NaN.
+
+    Returns:
+        dict of arrays: start_s, mean, std, min, max
+    """
+    views = sliding_windows(x, fs, window_s, hop_s)
+    n, window = views.shape
+    hop_s = hop_s or window_s
+    stats = {key: np.full(n, np.nan) for key in ("mean", "std", "min", "max")}
+    block = max(1, WINDOW_BLOCK_SAMPLES // max(1, window))
+    for start in range(0, n, block):
+        chunk = np.asarray(views[start:start + block], dtype=float)
+        stop = start + chunk.shape[0]
+        stats["mean"][start:stop] = chunk.mean(axis=1)
+        stats["std"][start:stop] = chunk.std(axis=1)
+        stats["min"][start:stop] = chunk.min(axis=1)
+        stats["max"][start:stop] = chunk.max(axis=1)
+    stats["start_s"] = np.arange(n) * hop_s
+    return stats
+
+
+# -----------------------------
+# Multi-rate alignment
+# -----------------------------
+def resample_to_rate(x: np.ndarray, fs: float, target_hz: float, chunk: int = WINDOW_BLOCK_SAMPLES) -> np.ndarray:
+    """
+    Resample a signal onto a uniform target_hz grid starting at t=0.
+
+    Faster signals are aggregated (mean of the samples falling in each output
+    bin, np.add.reduceat chunk by chunk); slower ones are linearly interpolated.
+    """
+    x = np.asarray(x).reshape(-1)
+    n_out = int(x.shape[0] * target_hz / fs)
+    if fs == target_hz:
+        return np.asarray(x[:n_out], dtype=float)
+    if fs < target_hz:
+        return np.interp(np.arange(n_out) / target_hz, np.arange(x.shape[0]) / fs, np.asarray(x, dtype=float))
+    ratio = fs / target_hz
+    if ratio.is_integer():
+        return decimate(x, int(ratio), chunk)[:n_out]
+
+    bounds = np.floor(np.arange(n_out + 1) * ratio).astype(np.int64)
+    out = np.empty(n_out)
+    per_block = max(1, int(chunk / ratio))
+    for start in range(0, n_out, per_block):
+        stop = min(start + per_block, n_out)
+        lo = bounds[start]
+        block = np.asarray(x[lo:bounds[stop]], dtype=float)
+        out[start:stop] = np.add.reduceat(block, bounds[start:stop] - lo) / np.diff(bounds[start:stop + 1])
+    return out
+
+
+def align_signals(signals: Dict[str, np.ndarray], sample_rates: Dict[str, float], target_hz: float):
+    """
+    Stack channels recorded at different rates onto one timeline.
+
+    Returns:
+        (names, matrix): float32 matrix of shape (n_samples, len(names)) at
+        target_hz, cut to the shortest channel
+    """
+    names = [name for name, arr in signals.items() if arr is not None and len(arr)]
+    columns = [resample_to_rate(signals[name], sample_rates[name], target_hz) for name in names]
+    n = min((column.size for column in columns), default=0)
+    matrix = np.empty((n, len(names)), dtype=np.float32)
+    for col, column in enumerate(columns):
+        matrix[:, col] = column[:n]
+    return names, matrix
+
+
+def window_means(matrix: np.ndarray, fs: float, window_s: float = DEFAULT_WINDOW_S, hop_s: Optional[float] = None) -> np.ndarray:
+    """
+    Mean of every window of every column of an aligned (n_samples, n_channels) matrix.
+
+    Uses column-wise cumulative sums, so all channels are windowed in one pass;
+    windows containing NaN hold NaN (as in window_stats).
+    """
+    matrix = np.asarray(matrix, dtype=float)
+    window = max(1, int(round(window_s * fs)))
+    hop = max(1, int(round((hop_s or window_s) * fs)))
+    if matrix.shape[0] < window:
+        return np.empty((0, matrix.shape[1]))
+    starts = np.arange(0, matrix.shape[0] - window + 1, hop)
+    missing = np.isnan(matrix)
+    zero = np.zeros((1, matrix.shape[1]))
+    csum = np.concatenate((zero, np.cumsum(np.where(missing, 0.0, matrix), axis=0)))
+    nans = np.concatenate((zero, np.cumsum(missing, axis=0)))
+    means = (csum[starts + window] - csum[starts]) / window
+    return np.where(nans[starts + window] - nans[starts] > 0, np.nan, means)
+
+
+# -----------------------------
+# Label segments
+# -----------------------------
+def label_segments(labels: np.ndarray):
+    """
+    Run-length encode a label array into constant segments.
+
+    Returns:
+        (values, starts, stops) arrays; segment i covers labels[starts[i]:stops[i]]
+    """
+    labels = np.asarray(labels).reshape(-1)
+    if labels.size == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return labels[:0], empty, empty
+    boundaries = np.flatnonzero(labels[1:] != labels[:-1]) + 1
+    starts = np.concatenate(([0], boundaries))
+    stops = np.concatenate((boundaries, [labels.size]))
+    return labels[starts], starts, stops
+
+
+# -----------------------------
+# Spectral features
+# -----------------------------
+def decimate(x: np.ndarray, factor: int, chunk: int = WINDOW_BLOCK_SAMPLES) -> np.ndarray:
+    """Downsample by averaging blocks of `factor` samples (box anti-aliasing), chunk by chunk."""
+    x = np.asarray(x).reshape(-1)
+    factor = int(factor)
+    if factor <= 1:
+        return np.asarray(x, dtype=float)
+    n = (x.shape[0] // factor) * factor
+    step = max(factor, (chunk // factor) * factor)
+    parts = [
+        np.asarray(x[start:min(start + step, n)], dtype=float).reshape(-1, factor).mean(axis=1)
+        for start in range(0, n, step)
+    ]
+    return np.concatenate(parts) if parts else np.empty(0)
+
+
+def _window_spectra(segments: np.ndarray, fs: float):
+    """Power spectra of a (n_windows, window) matrix: demeaned, Hann-tapered, one batched rfft."""
+    window = segments.shape[1]
+    n_fft = 1 << int(np.ceil(np.log2(max(2, window * FFT_OVERSAMPLE))))
+    tapered = (segments - segments.mean(axis=1, keepdims=True)) * np.hanning(window)
+    power = np.abs(np.fft.rfft(tapered, n=n_fft, axis=1)) ** 2
+    return np.fft.rfftfreq(n_fft, d=1.0 / fs), power
+
+
+def dominant_frequency_by_window(
+    x: np.ndarray,
+    fs: float,
+    band,
+    window_s: float = DEFAULT_WINDOW_S,
+    hop_s: Optional[float] = None,
+    target_fs: Optional[float] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Frequency (Hz) of the spectral peak inside `band` for every window.
+
+    The signal is optionally decimated to about target_fs first; windows are
+    reduced in blocks of WINDOW_BLOCK_SAMPLES.
+
+    Returns:
+        dict of arrays: start_s, frequency (NaN for flat windows)
+    """
+    hop_s = hop_s or window_s
+    factor = max(1, int(fs // target_fs)) if target_fs else 1
+    x = decimate(x, factor)
+    fs = fs / factor
+    views = sliding_windows(x, fs, window_s, hop_s)
+    n, window = views.shape
+    frequency = np.full(n, np.nan)
+    block = max(1, WINDOW_BLOCK_SAMPLES // max(1, window * FFT_OVERSAMPLE))
+    for start in range(0, n, block):
+        freqs, power = _window_spectra(np.nan_to_num(np.asarray(views[start:start + block], dtype=float)), fs)
+        in_band = (freqs >= band[0]) & (freqs <= band[1])
+        band_power = power[:, in_band]
+        peak = freqs[in_band][np.argmax(band_power, axis=1)]
+        frequency[start:start + peak.size] = np.where(band_power.max(axis=1) > 0, peak, np.nan)
+    return {"start_s": np.arange(n) * hop_s, "frequency": frequency}
+
+
+def resp_rate_by_window(resp: np.ndarray, fs: float, window_s: float = DEFAULT_WINDOW_S, hop_s: Optional[float] = None) -> np.ndarray:
+    """Respiration rate (breaths/min) per window from the dominant respiratory frequency."""
+    return dominant_frequency_by_window(resp, fs, RESP_BAND_HZ, window_s, hop_s, target_fs=RESP_TARGET_HZ)["frequency"] * 60.0
+
+
+def pulse_rate_by_window(bvp: np.ndarray, fs: float, window_s: float = DEFAULT_WINDOW_S, hop_s: Optional[float] = None) -> np.ndarray:
+    """Pulse rate (bpm) per window from the dominant BVP frequency."""
+    return dominant_frequency_by_window(bvp, fs, PULSE_BAND_HZ, window_s, hop_s)["frequency"] * 60.0
+
+
+def lf_hf_by_window(
+    peaks: np.ndarray,
+    fs: float,
+    duration_s: float,
+    window_s: float = DEFAULT_WINDOW_S,
+    hop_s: Optional[float] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    HRV LF and HF power and LF/HF ratio per window.
+
+    Valid RR intervals are interpolated onto a uniform RR_RESAMPLE_HZ grid.
+    The windows are on the same grid as hrv_by_window, but each spectrum is
+    taken over the max(window_s, LF_HF_WINDOW_S) seconds ending with the
+    window, so the LF band is resolved even on short windows; every span is
+    one row of a stacked matrix transformed with a single rfft. Windows
+    without that much history before their end, or with fewer than one beat
+    every two seconds, hold NaN.
+
+    The spectra are not normalized, so lf and hf are only meaningful
+    relative to each other (lf_hf).
+
+    Returns:
+        dict of arrays: start_s, lf, hf, lf_hf
+    """
+    hop_s = hop_s or window_s
+    starts = np.arange(0.0, max(duration_s - window_s, 0.0) + 1e-9, hop_s)
+    result = {key: np.full(starts.size, np.nan) for key in ("lf", "hf", "lf_hf")}
+    result["start_s"] = starts
+
+    span_s = max(window_s, LF_HF_WINDOW_S)
+    span_starts = starts + window_s - span_s
+    enough = span_starts > -1e-9
+    rr, times, valid = rr_intervals(peaks, fs)
+    if valid.sum() < 4 or not enough.any():
+        return result
+    grid = np.arange(0.0, duration_s, 1.0 / RR_RESAMPLE_HZ)
+    tachogram = np.interp(grid, times[valid], rr[valid])
+
+    span = max(2, int(span_s * RR_RESAMPLE_HZ))
+    first = np.round(span_starts[enough] * RR_RESAMPLE_HZ).astype(np.int64)
+    index = np.minimum(first[:, None] + np.arange(span), grid.size - 1)
+    freqs, power = _window_spectra(tachogram[index], RR_RESAMPLE_HZ)
+    df = freqs[1] - freqs[0]
+    lf = np.full(starts.size, np.nan)
+    hf = np.full(starts.size, np.nan)
+    lf[enough] = power[:, (freqs >= LF_BAND_HZ[0]) & (freqs < LF_BAND_HZ[1])].sum(axis=1) * df
+    hf[enough] = power[:, (freqs >= HF_BAND_HZ[0]) & (freqs < HF_BAND_HZ[1])].sum(axis=1) * df
+
+    valid_times = times[valid]
+    beats = np.searchsorted(valid_times, span_starts + span_s) - np.searchsorted(valid_times, span_starts)
+    with np.errstate(invalid="ignore"):
+        usable = enough & (beats >= span_s / 2.0) & (hf > 0)
+    result["lf"] = np.where(usable, lf, np.nan)
+    result["hf"] = np.where(usable, hf, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result["lf_hf"] = np.where(usable, lf / hf, np.nan)
+    return result
@@ -0,0 +1,239 @@
+"""
+Compact storage of raw wearable signal windows in MongoDB.
+
+Samples are packed into one BSON Binary per subject, channel and
+RAW_BUCKET_S time bucket (collection `wearable_raw`) instead of arrays of
+doubles:
+
+- dtype: float32 (lossless for float32 input); float16 (~3 significant
+  digits) only for channels opted in with WEARABLE_RAW_FLOAT16_CHANNELS
+- delta: differences of consecutive sample bit patterns (integer view,
+  wrapping), which is lossless and turns smooth signals into small numbers
+- compression: zstd when the zstandard package is installed, zlib otherwise
+
+Readers decode straight into NumPy with np.frombuffer. Live uploads are
+flushed here from the ring buffers (backend/signal_buffers.py) once a bucket
+is complete; buckets expire after RAW_RETENTION_DAYS (TTL index).
+
+Compare layouts with: python -m backend.raw_store_benchmark
+"""
+import math
+import os
+import zlib
+from datetime import datetime
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+from bson.binary import Binary
+from pymongo import ASCENDING, UpdateOne
+
+from backend.signal_buffers import add_eviction_listener, subject_buffers
+from database.db_connection import get_database
+
+try:
+    import zstandard
+except ImportError:  # optional: fall back to zlib
+    zstandard = None
+
+db = get_database()
+wearable_raw = db["wearable_raw"]
+
+RAW_BUCKET_S = 60
+RAW_RETENTION_DAYS = float(os.getenv("WEARABLE_RAW_RETENTION_DAYS", "30"))
+RAW_STORE_ENABLED = os.getenv("WEARABLE_RAW_STORE", "1") != "0"
+
+RAW_DTYPES = {"float32": (np.dtype("<f4"), np.dtype("<i4")), "float16": (np.dtype("<f2"), np.dtype("<i2"))}
+# Lossy float16 storage is opt-in per channel, e.g. WEARABLE_RAW_FLOAT16_CHANNELS=ECG,EMG
+RAW_CHANNEL_DTYPES = {
+    channel.strip(): "float16" for channel in os.getenv("WEARABLE_RAW_FLOAT16_CHANNELS", "").split(",") if channel.strip()
+}
+DEFAULT_RAW_DTYPE = "float32"
+DEFAULT_COMPRESSION = "zstd" if zstandard is not None else "zlib"
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 6
+
+EPOCH = datetime(1970, 1, 1)
+
+# subject_id -> {channel: unix time flushed up to}; forgotten with the subject's buffers
+_flushed_until: Dict[str, Dict[str, float]] = {}
+add_eviction_listener(lambda subject_id: _flushed_until.pop(subject_id, None))
+
+
+def ensure_raw_indexes() -> None:
+    wearable_raw.create_index(
+        [("subject_id", ASCENDING), ("channel", ASCENDING), ("bucket", ASCENDING)], unique=True
+    )
+    if RAW_RETENTION_DAYS > 0:
+        wearable_raw.create_index([("stored_at", ASCENDING)], expireAfterSeconds=int(RAW_RETENTION_DAYS * 86400))
+
+
+def encode_samples(
+    samples: np.ndarray,
+    dtype: str = DEFAULT_RAW_DTYPE,
+    delta: bool = True,
+    compression: Optional[str] = DEFAULT_COMPRESSION,
+) -> Tuple[bytes, dict]:
+    """
+    Pack samples into bytes.
+
+    Returns:
+        (payload, encoding) where encoding is {"dtype", "delta", "compression"}
+        as decode_samples expects it
+    """
+    float_type, int_type = RAW_DTYPES[dtype]
+    values = np.ascontiguousarray(samples, dtype=float_type)
+    if delta and values.size:
+        bits = values.view(int_type)
+        encoded = np.empty_like(bits)
+        encoded[0] = bits[0]
+        np.subtract(bits[1:], bits[:-1], out=encoded[1:])  # wraps, exactly undone by cumsum
+        values = encoded
+    payload = values.tobytes()
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        payload = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(payload)
+    elif compression == "zlib":
+        payload = zlib.compress(payload, ZLIB_LEVEL)
+    elif compression is not None:
+        raise ValueError(f"Unknown compression: {compression}")
+    return payload, {"dtype": dtype, "delta": bool(delta), "compression": compression}
+
+
+def decode_samples(payload: bytes, encoding: dict) -> np.ndarray:
+    """Inverse of encode_samples; uncompressed, non-delta payloads are read without a copy."""
+    float_type, int_type = RAW_DTYPES[encoding["dtype"]]
+    compression = encoding.get("compression")
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        payload = zstandard.ZstdDecompressor().decompress(payload)
+    elif compression == "zlib":
+        payload = zlib.decompress(payload)
+    elif compression is not None:
+        raise ValueError(f"Unknown compression: {compression}")
+    if not encoding.get("delta"):
+        return np.frombuffer(payload, dtype=float_type)
+    return np.cumsum(np.frombuffer(payload, dtype=int_type), dtype=int_type).view(float_type)
+
+
+def _unix_time(timestamp: datetime) -> float:
+    """Unix seconds of a naive UTC datetime (as stored everywhere in this app)."""
+    return (timestamp - EPOCH).total_seconds()
+
+
+def _bucket_start(time_s: float) -> float:
+    return math.floor(time_s / RAW_BUCKET_S) * RAW_BUCKET_S
+
+
+def raw_window_doc(
+    subject_id: str,
+    channel: str,
+    samples: np.ndarray,
+    sample_rate: float,
+    start_time: float,
+    dtype: Optional[str] = None,
+    delta: bool = True,
+    compression: Optional[str] = DEFAULT_COMPRESSION,
+) -> dict:
+    """Document for one bucket of samples starting at start_time (unix seconds)."""
+    dtype = dtype or RAW_CHANNEL_DTYPES.get(channel, DEFAULT_RAW_DTYPE)
+    payload, encoding = encode_samples(samples, dtype, delta, compression)
+    return {
+        "subject_id": subject_id,
+        "channel": channel,
+        "bucket": datetime.utcfromtimestamp(_bucket_start(start_time)),
+        "start_time": float(start_time),
+        "sample_rate": float(sample_rate),
+        "count": int(np.asarray(samples).size),
+        **encoding,
+        "data": Binary(payload),
+        "stored_at": datetime.utcnow(),
+    }
+
+
+def write_raw_windows(docs) -> int:
+    """Upsert bucket documents (a re-sent bucket replaces the stored one)."""
+    operations = [
+        UpdateOne(
+            {"subject_id": doc["subject_id"], "channel": doc["channel"], "bucket": doc["bucket"]},
+            {"$set": doc},
+            upsert=True,
+        )
+        for doc in docs
+    ]
+    if operations:
+        wearable_raw.bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def flush_raw_buckets(subject_id: str) -> int:
+    """
+    Store every bucket the subject's ring buffers completed since the last flush.
+
+    The first bucket after a (re)start may be partial; its document starts at
+    the first buffered sample.
+    """
+    if not RAW_STORE_ENABLED:
+        return 0
+    buffers = subject_buffers(subject_id)
+    if not buffers:
+        return 0
+    docs = []
+    flushed_until = _flushed_until.setdefault(subject_id, {})
+    for channel, buffer in buffers.items():
+        if buffer.end_time is None:
+            continue
+        flushed = max(flushed_until.get(channel, 0.0), buffer.start_time)
+        while True:
+            bucket_end = _bucket_start(flushed) + RAW_BUCKET_S
+            if buffer.end_time < bucket_end:
+                break
+            samples = buffer.window(flushed, bucket_end)
+            if samples is not None and samples.size:
+                docs.append(raw_window_doc(subject_id, channel, samples, buffer.sample_rate, flushed))
+            flushed = bucket_end
+        flushed_until[channel] = flushed
+    return write_raw_windows(docs)
+
+
+def iter_raw_windows(subject_id: str, channel: str, start: datetime, end: datetime) -> Iterator[dict]:
+    """Decoded buckets overlapping [start, end): {"start_time", "sample_rate", "samples"} in time order."""
+    cursor = wearable_raw.find(
+        {
+            "subject_id": subject_id,
+            "channel": channel,
+            "bucket": {"$gte": datetime.utcfromtimestamp(_bucket_start(_unix_time(start))), "$lt": end},
+        },
+        {"_id": 0, "start_time": 1, "sample_rate": 1, "dtype": 1, "delta": 1, "compression": 1, "data": 1},
+    ).sort("bucket", 1)
+    for doc in cursor:
+        yield {
+            "start_time": doc["start_time"],
+            "sample_rate": doc["sample_rate"],
+            "samples": decode_samples(bytes(doc["data"]), doc),
+        }
+
+
+def read_raw_signal(subject_id: str, channel: str, start: datetime, end: datetime):
+    """
+    One contiguous array for a channel over [start, end); gaps hold NaN.
+
+    Returns:
+        (start_time, sample_rate, samples) or None when nothing is stored
+    """
+    windows = list(iter_raw_windows(subject_id, channel, start, end))
+    if not windows:
+        return None
+    fs = windows[-1]["sample_rate"]
+    origin = windows[0]["start_time"]
+    last = windows[-1]
+    total = int(round((last["start_time"] - origin) * fs)) + last["samples"].size
+    signal = np.full(total, np.nan, dtype=np.float32)
+    for window in windows:
+        if window["sample_rate"] != fs:
+            continue
+        offset = int(round((window["start_time"] - origin) * fs))
+        samples = window["samples"][:max(0, total - offset)]
+        signal[offset:offset + samples.size] = samples
+    return origin, fs, signal
@@ -0,0 +1,213 @@
+"""
+Storage benchmark for raw wearable windows in MongoDB.
+
+Stores the same signal as one document per RAW_BUCKET_S bucket in several
+layouts and compares BSON bytes, on-disk size (collStats, real MongoDB only)
+and read throughput (find + decode into NumPy):
+
+- array:  BSON array of doubles (the naive layout)
+- float32 / float16: raw little-endian Binary
+- delta+zlib / delta+zstd: bit-pattern deltas, compressed (float32 and float16)
+
+The signal is a cached WESAD channel (--subject, from database/wesad_cache.py)
+or a synthetic ECG-like trace. The benchmark creates and drops bench_raw_*
+collections, so it runs against an in-memory Mongo stand-in (mongomock) unless
+a real server and a scratch database are both named explicitly.
+
+Usage:
+    python -m backend.raw_store_benchmark
+    python -m backend.raw_store_benchmark --subject S2 --channel ECG --cache-dir data/wearable_cache
+    python -m backend.raw_store_benchmark --mongodb-uri mongodb://localhost:27017/ --db-name bench_scratch
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+import bson
+import numpy as np
+
+DEFAULT_OUTPUT_DIR = os.path.join("mlops", "artifacts", "bench")
+BENCH_COLLECTION_PREFIX = "bench_raw_"
+
+
+def synthetic_signal(seconds: float, fs: float, seed: int = 7) -> np.ndarray:
+    """ECG-like trace: narrow beats every ~0.8 s on a drifting baseline plus noise."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * fs)) / fs
+    phase = (t % 0.8) / 0.8
+    beats = np.exp(-((phase - 0.3) ** 2) / 0.0005)
+    drift = 0.1 * np.sin(2 * np.pi * 0.25 * t)
+    return (beats + drift + 0.01 * rng.standard_normal(t.size)).astype(np.float32)
+
+
+def layouts() -> Dict[str, dict]:
+    """Layout name -> encode_samples arguments (None for the array-of-doubles layout)."""
+    from backend.raw_signal_store import zstandard
+
+    result = {
+        "array": None,
+        "float32": {"dtype": "float32", "delta": False, "compression": None},
+        "float16": {"dtype": "float16", "delta": False, "compression": None},
+        "float32+delta+zlib": {"dtype": "float32", "delta": True, "compression": "zlib"},
+        "float16+delta+zlib": {"dtype": "float16", "delta": True, "compression": "zlib"},
+    }
+    if zstandard is not None:
+        result["float32+delta+zstd"] = {"dtype": "float32", "delta": True, "compression": "zstd"}
+        result["float16+delta+zstd"] = {"dtype": "float16", "delta": True, "compression": "zstd"}
+    return result
+
+
+def build_docs(signal: np.ndarray, fs: float, channel: str, encoding: dict) -> List[dict]:
+    from backend.raw_signal_store import RAW_BUCKET_S, raw_window_doc
+
+    bucket = int(RAW_BUCKET_S * fs)
+    start = 1.7e9
+    docs = []
+    for i in range(0, signal.size, bucket):
+        samples = signal[i:i + bucket]
+        start_time = start + i / fs
+        if encoding is None:
+            docs.append({
+                "subject_id": "bench",
+                "channel": channel,
+                "bucket": datetime.utcfromtimestamp(start_time),
+                "start_time": start_time,
+                "sample_rate": fs,
+                "count": int(samples.size),
+                "values": samples.astype(float).tolist(),
+            })
+        else:
+            docs.append(raw_window_doc("bench", channel, samples, fs, start_time, **encoding))
+    return docs
+
+
+def read_back(collection, encoding: dict) -> np.ndarray:
+    from backend.raw_signal_store import decode_samples
+
+    parts = []
+    for doc in collection.find({}, {"_id": 0, "values": 1, "data": 1, "dtype": 1, "delta": 1, "compression": 1}).sort("bucket", 1):
+        if encoding is None:
+            parts.append(np.asarray(doc["values"], dtype=np.float64))
+        else:
+            parts.append(decode_samples(bytes(doc["data"]), doc))
+    return np.concatenate(parts) if parts else np.empty(0)
+
+
+def run_layout(db, name: str, encoding: dict, signal: np.ndarray, fs: float, channel: str, reads: int) -> Dict[str, Any]:
+    collection = db[BENCH_COLLECTION_PREFIX + name.replace("+", "_")]
+    collection.drop()
+
+    start = time.perf_counter()
+    docs = build_docs(signal, fs, channel, encoding)
+    encode_s = time.perf_counter() - start
+    bson_bytes = sum(len(bson.encode(doc)) for doc in docs)
+    collection.insert_many(docs)
+
+    read_times = []
+    decoded = None
+    for _ in range(max(1, reads)):
+        start = time.perf_counter()
+        decoded = read_back(collection, encoding)
+        read_times.append(time.perf_counter() - start)
+    read_s = float(np.median(read_times))
+
+    result = {
+        "documents": len(docs),
+        "bson_bytes": bson_bytes,
+        "bytes_per_sample": round(bson_bytes / signal.size, 3),
+        "encode_s": round(encode_s, 4),
+        "read_s": round(read_s, 4),
+        "read_msamples_per_s": round(signal.size / read_s / 1e6, 2) if read_s > 0 else None,
+        "max_abs_error": float(np.max(np.abs(decoded.astype(np.float64) - signal.astype(np.float64)))),
+    }
+    try:
+        stats = db.command("collStats", collection.name)
+        result["storage_bytes"] = stats.get("storageSize")
+        result["index_bytes"] = stats.get("totalIndexSize")
+    except Exception:
+        # mongomock has no collStats: BSON bytes are the size measure
+        pass
+    collection.drop()
+    return result
+
+
+def load_signal(args):
+    if args.subject:
+        from database.wesad_cache import feature_sample_rates, feature_signals, load_manifest
+
+        manifest = load_manifest(args.subject, args.cache_dir)
+        if manifest is None:
+            raise SystemExit(f"❌ {args.subject} is not cached in {args.cache_dir} (run python -m database.wesad_cache)")
+        signal = np.asarray(feature_signals(args.subject, args.cache_dir, manifest)[args.channel], dtype=np.float32).reshape(-1)
+        fs = feature_sample_rates(manifest)[args.channel]
+        if args.seconds:
+            signal = signal[:int(args.seconds * fs)]
+        return signal, fs
+    return synthetic_signal(args.seconds or 600, args.sample_rate), args.sample_rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare raw-window storage layouts in MongoDB")
+    parser.add_argument("--subject", default=None, help="Cached WESAD subject to read the signal from")
+    parser.add_argument("--channel", default="ECG", help="Sensor name (ECG, EDA, BVP, Resp, Temp)")
+    parser.add_argument("--cache-dir", default="data/wearable_cache")
+    parser.add_argument("--seconds", type=float, default=None, help="Signal length (default: 600 s synthetic / whole recording)")
+    parser.add_argument("--sample-rate", type=float, default=700.0, help="Synthetic signal sample rate")
+    parser.add_argument("--reads", type=int, default=3, help="Timed full reads per layout (median reported)")
+    parser.add_argument("--mongodb-uri", default=None, help="Real MongoDB server (default: in-memory mongomock)")
+    parser.add_argument("--db-name", default=None, help="Scratch database on --mongodb-uri (required with it)")
+    parser.add_argument("--output", default=None, help="Where to write the JSON results")
+    args = parser.parse_args()
+
+    from database.db_connection import IN_MEMORY_URI_PREFIX
+
+    if args.mongodb_uri:
+        if not args.db_name:
+            parser.error("--mongodb-uri needs an explicit --db-name (bench_raw_* collections are dropped)")
+        os.environ["MONGODB_URI"], os.environ["MONGODB_DB"] = args.mongodb_uri, args.db_name
+    else:
+        os.environ["MONGODB_URI"] = f"{IN_MEMORY_URI_PREFIX}bench"
+    from database.db_connection import get_database
+
+    db = get_database()
+    signal, fs = load_signal(args)
+    print(f"🚀 {signal.size} samples at {fs:g} Hz ({signal.size / fs:.0f} s of {args.channel})")
+
+    results = {
+        "meta": {
+            "subject": args.subject,
+            "channel": args.channel,
+            "samples": int(signal.size),
+            "sample_rate": fs,
+            "in_memory_db": args.mongodb_uri is None,
+            "started_at": datetime.utcnow().isoformat(),
+        },
+        "layouts": {},
+    }
+    for name, encoding in layouts().items():
+        results["layouts"][name] = run_layout(db, name, encoding, signal, fs, args.channel, args.reads)
+
+    baseline = results["layouts"]["array"]
+    print(f"\n{'layout':<20} {'bytes/sample':>12} {'vs array':>9} {'read Msamples/s':>16} {'max error':>10}")
+    for name, stats in results["layouts"].items():
+        ratio = stats["bson_bytes"] / baseline["bson_bytes"]
+        print(
+            f"{name:<20} {stats['bytes_per_sample']:>12} {ratio:>8.1%} "
+            f"{stats['read_msamples_per_s']:>16} {stats['max_abs_error']:>10.2g}"
+        )
+
+    output = args.output
+    if not output:
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+        output = os.path.join(DEFAULT_OUTPUT_DIR, f"raw_store_{stamp}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+"""
+Replay benchmark for the chat pipeline.
+
+Feeds a JSONL corpus through POST /chat either in-process (the app behind a
+FastAPI TestClient, with the auth dependency overridden) or over HTTP against
+a running server, at a configurable concurrency. Reports throughput, per-stage p50/p95/p99 latencies and the
+branch mix (crisis / irrelevant / emotion / error), and saves the results as
+JSON so runs can be compared over time.
+
+Each corpus line is a JSON object; the message is read from "text" (falling
+back to "body" or "title") and the optional "subject_id" is passed through.
+The default corpus (backend/replay_corpus.jsonl) is a small mix of emotional,
+neutral, off-topic and crisis messages.
+
+In-process, stage timers and the --stub-models keyword model are installed in
+the source modules before backend.main is imported, so the app binds them like
+any other import and the real emotion models are never loaded.
+
+Usage:
+    python -m backend.replay_benchmark --stub-models --in-memory-db
+    python -m backend.replay_benchmark --mode http --concurrency 8 --token <jwt>
+    python -m backend.replay_benchmark --stub-models --in-memory-db --baseline mlops/artifacts/bench/<run>.json
+"""
+import argparse
+import contextvars
+import importlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+import types
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "replay_corpus.jsonl")
+DEFAULT_OUTPUT_DIR = os.path.join("mlops", "artifacts", "bench")
+DEFAULT_SUBJECT_ID = "S10"
+PERCENTILES = (50, 95, 99)
+
+# "module.function" imported by backend.main, grouped by the pipeline stage they
+# belong to. Wrapping them before backend.main is imported times each stage
+# without touching the route.
+STAGE_HOOKS = {
+    "crisis": ["backend.safety_guard.detect_crisis"],
+    "relevance": ["backend.relevance_checker.is_relevant"],
+    "emotion": ["backend.emotion_service.predict_emotions", "backend.utils.emotion_fallback.detect_fallback_emotion"],
+    "wellness": ["backend.wellness_fusion.compute_pwi"],
+    "recommendations": ["backend.recommendations.generate_recommendations"],
+    "mlflow": [
+        "mlops.log_inference.log_emotion_prediction",
+        "mlops.log_inference.log_wellness_snapshot",
+        "mlops.log_inference.log_recommendation_triggered",
+        "mlops.log_inference.log_chat_interaction",
+    ],
+    "context": ["backend.context_memory.get_context", "backend.context_memory.append_context"],
+    "reply": ["backend.empathy_engine.generate_empathetic_reply", "backend.empathy_engine.generate_response"],
+    "persist": ["database.chat_logger.log_chat"],
+}
+
+# Deterministic keyword "model" used with --stub-models
+STUB_EMOTION_KEYWORDS = {
+    "sadness": ["sad", "down", "lonely", "cry", "depressed"],
+    "fear": ["anxious", "scared", "afraid", "worried", "nervous"],
+    "anger": ["angry", "mad", "furious", "annoyed"],
+    "joy": ["happy", "glad", "great", "excited"],
+}
+
+# Per-request stage timings; a context variable follows the request into the
+# TestClient's event loop and threadpool, where the stage functions run
+_request_stages: contextvars.ContextVar = contextvars.ContextVar("replay_request_stages", default=None)
+
+
+# -----------------------------
+# Corpus
+# -----------------------------
+def load_corpus(path: str, limit: Optional[int] = None, repeat: int = 1) -> List[dict]:
+    """Load chat messages from a JSONL file."""
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            text = record.get("text") or record.get("body") or record.get("title")
+            if not text:
+                continue
+            items.append({"text": text, "subject_id": record.get("subject_id")})
+    items = items * max(repeat, 1)
+    if limit:
+        items = items[:limit]
+    return items
+
+
+# -----------------------------
+# Stage instrumentation
+# -----------------------------
+def _timed(stage: str, func: Callable) -> Callable:
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings = _request_stages.get()
+            if timings is not None:
+                timings[stage] += (time.perf_counter() - start) * 1000
+    return wrapper
+
+
+def _stub_predict_emotions(text: str, top_n: int = 3):
+    text_lower = text.lower()
+    for label, words in STUB_EMOTION_KEYWORDS.items():
+        if any(word in text_lower for word in words):
+            return [label, "neutral"][:top_n], [0.85, 0.15][:top_n]
+    return ["neutral"], [0.6]
+
+
+def _noop(*args, **kwargs):
+    return None
+
+
+def _seed_wearable_data(db, subject_ids: List[str]) -> None:
+    """Insert synthetic feature documents so the wellness stage has work to do."""
+    rng = random.Random(42)
+    for subject_id in subject_ids:
+        features = {"subject_id": subject_id, "processed_at": datetime.utcnow()}
+        for key, (mean, std) in {
+            "eda": (2.0, 0.5),
+            "temp": (33.0, 0.4),
+            "bvp": (0.0, 40.0),
+            "ecg": (0.001, 0.2),
+            "resp": (0.05, 2.5),
+            "resp_rate": (15.0, 3.0),
+            "pulse_rate": (72.0, 8.0),
+        }.items():
+            features[key] = {"mean": rng.gauss(mean, std * 0.3), "std": std}
+        db["wearable_data"].update_one({"subject_id": subject_id}, {"$set": features}, upsert=True)
+
+
+def _patch(path: str, wrap: Callable[[Callable], Callable]) -> None:
+    """Replace the function at "module.function" with wrap(function)."""
+    module_name, name = path.rsplit(".", 1)
+    module = importlib.import_module(module_name)
+    setattr(module, name, wrap(getattr(module, name)))
+
+
+def prepare_in_process(stub_models: bool, in_memory_db: bool, mlflow: bool, subject_ids: List[str]):
+    """Import the app with instrumentation and return a callable posting one item through a TestClient."""
+    if "backend.main" in sys.modules:
+        raise RuntimeError("backend.main is already imported; stage hooks must be installed first")
+    if in_memory_db:
+        from database.db_connection import IN_MEMORY_URI_PREFIX
+
+        os.environ["MONGODB_URI"] = f"{IN_MEMORY_URI_PREFIX}bench"
+
+    # Everything below runs before backend.main is imported: every module binds
+    # its collections at import time and main binds the (wrapped) functions
+    if stub_models:
+        # Stand-in for the emotion_service module, so the LSTM/transformer stack is never imported
+        stub = types.ModuleType("backend.emotion_service")
+        stub.predict_emotions = _stub_predict_emotions
+        sys.modules["backend.emotion_service"] = stub
+    if not mlflow:
+        for path in STAGE_HOOKS["mlflow"]:
+            _patch(path, lambda func: _noop)
+    for stage, paths in STAGE_HOOKS.items():
+        for path in paths:
+            _patch(path, lambda func, stage=stage: _timed(stage, func))
+
+    from fastapi.testclient import TestClient
+
+    from backend import main
+    from backend.auth import get_current_user
+    from database.db_connection import get_database
+
+    if in_memory_db:
+        _seed_wearable_data(get_database(), subject_ids)
+
+    current_user = {"email": "bench@pai.com", "subject_id": DEFAULT_SUBJECT_ID}
+    main.app.dependency_overrides[get_current_user] = lambda: current_user
+    clients = threading.local()
+
+    def send(item: dict) -> Dict[str, Any]:
+        client = getattr(clients, "client", None)
+        if client is None:
+            client = clients.client = TestClient(main.app, raise_server_exceptions=False)
+        body = {"text": item["text"]}
+        if item.get("subject_id"):
+            body["subject_id"] = item["subject_id"]
+        res = client.post("/chat", json=body)
+        if res.status_code != 200:
+            return {"error": f"http_{res.status_code}"}
+        return {"emotion": res.json().get("emotion")}
+
+    return send
+
+
+def prepare_http(api_base: str, token: Optional[str], email: str, password: str, timeout: float):
+    """Return a callable that posts one corpus item to a running server."""
+    import requests
+
+    if not token:
+        res = requests.post(f"{api_base}/login", json={"email": email, "password": password}, timeout=timeout)
+        res.raise_for_status()
+        token = res.json()["access_token"]
+
+    headers = {"Authorization": f"Bearer {token}"}
+    sessions = threading.local()
+
+    def send(item: dict) -> Dict[str, Any]:
+        session = getattr(sessions, "session", None)
+        if session is None:
+            session = sessions.session = requests.Session()
+        body = {"text": item["text"]}
+        if item.get("subject_id"):
+            body["subject_id"] = item["subject_id"]
+        res = session.post(f"{api_base}/chat", json=body, headers=headers, timeout=timeout)
+        if res.status_code != 200:
+            return {"error": f"http_{res.status_code}"}
+        return {"emotion": res.json().get("emotion")}
+
+    return send
+
+
+# -----------------------------
+# Runner
+# -----------------------------
+def _classify_branch(result: Dict[str, Any]) -> str:
+    if "error" in result:
+        return "error"
+    emotion = result.get("emotion")
+    if emotion in ("crisis", "irrelevant"):
+        return emotion
+    return "emotion"
+
+
+def _run_one(send: Callable, item: dict) -> Dict[str, Any]:
+    stages = defaultdict(float)
+    token = _request_stages.set(stages)
+    start = time.perf_counter()
+    try:
+        result = send(item)
+    except Exception as e:
+        result = {"error": type(e).__name__}
+    finally:
+        _request_stages.reset(token)
+    total_ms = (time.perf_counter() - start) * 1000
+    return {"branch": _classify_branch(result), "total_ms": total_ms, "stages": dict(stages)}
+
+
+def _summarize(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    arr = np.asarray(values, dtype=float)
+    summary = {"count": int(arr.size), "mean": round(float(arr.mean()), 3), "max": round(float(arr.max()), 3)}
+    for pct, value in zip(PERCENTILES, np.percentile(arr, PERCENTILES)):
+        summary[f"p{pct}"] = round(float(value), 3)
+    return summary
+
+
+def run_benchmark(send: Callable, corpus: List[dict], concurrency: int, warmup: int = 0) -> Dict[str, Any]:
+    """Replay the corpus through `send` and aggregate latency statistics."""
+    for item in corpus[:warmup]:
+        _run_one(send, item)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda item: _run_one(send, item), corpus))
+    wall_time = time.perf_counter() - start
+
+    stage_values: Dict[str, List[float]] = defaultdict(list)
+    for result in results:
+        for stage, ms in result["stages"].items():
+            stage_values[stage].append(ms)
+
+    branches = Counter(result["branch"] for result in results)
+    return {
+        "requests": len(results),
+        "wall_time_s": round(wall_time, 3),
+        "throughput_rps": round(len(results) / wall_time, 2) if wall_time > 0 else None,
+        "latency_ms": {
+            "total": _summarize([r["total_ms"] for r in results]),
+            "stages": {stage: _summarize(stage_values[stage]) for stage in STAGE_HOOKS if stage in stage_values},
+        },
+        "branches": {
+            branch: {"count": count, "share": round(count / len(results), 3)}
+            for branch, count in branches.most_common()
+        },
+    }
+
+
+def compare_runs(current: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """Relative change of throughput and p50/p95 latencies against a previous run."""
+    def delta(new, old):
+        if new is None or not old:
+            return None
+        return round((new - old) / old * 100, 1)
+
+    diff = {"throughput_rps_pct": delta(current.get("throughput_rps"), baseline.get("throughput_rps"))}
+    old_total = baseline.get("latency_ms", {}).get("total", {})
+    new_total = current["latency_ms"]["total"]
+    for pct in ("p50", "p95"):
+        diff[f"total_{pct}_pct"] = delta(new_total.get(pct), old_total.get(pct))
+    return diff
+
+
+def save_results(results: Dict[str, Any], output: Optional[str]) -> str:
+    if not output:
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+        output = os.path.join(DEFAULT_OUTPUT_DIR, f"replay_{results['meta']['mode']}_{stamp}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a JSONL corpus through the chat pipeline")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="JSONL file with chat messages (default: replay_corpus.jsonl)")
+    parser.add_argument("--mode", choices=["inprocess", "http"], default="inprocess")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--limit", type=int, default=None, help="Replay at most N messages")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay the corpus N times")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed requests before the run")
+    parser.add_argument("--stub-models", action="store_true", help="Use a keyword stub instead of the emotion models")
+    parser.add_argument("--in-memory-db", action="store_true", help="Use an in-memory Mongo stand-in (mongomock)")
+    parser.add_argument("--mlflow", action="store_true", help="Keep MLflow inference logging enabled")
+    parser.add_argument("--api-base", default="http://127.0.0.1:8000")
+    parser.add_argument("--token", default=None, help="JWT for HTTP mode (otherwise logs in)")
+    parser.add_argument("--email", default="test@pai.com")
+    parser.add_argument("--password", default="123456")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", default=None, help="Where to write the JSON results")
+    parser.add_argument("--baseline", default=None, help="Previous results JSON to compare against")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus, limit=args.limit, repeat=args.repeat)
+    if not corpus:
+        print(f"❌ No messages found in {args.corpus}")
+        return
+    subject_ids = sorted({item.get("subject_id") or DEFAULT_SUBJECT_ID for item in corpus})
+
+    if args.mode == "inprocess":
+        send = prepare_in_process(args.stub_models, args.in_memory_db, args.mlflow, subject_ids)
+    else:
+        send = prepare_http(args.api_base, args.token, args.email, args.password, args.timeout)
+
+    print(f"🚀 Replaying {len(corpus)} messages ({args.mode}, concurrency={args.concurrency})...")
+    results = run_benchmark(send, corpus, args.concurrency, warmup=args.warmup)
+    results["meta"] = {
+        "mode": args.mode,
+        "corpus": args.corpus,
+        "concurrency": args.concurrency,
+        "stub_models": args.stub_models,
+        "in_memory_db": args.in_memory_db,
+        "mlflow": args.mlflow,
+        "started_at": datetime.utcnow().isoformat(),
+    }
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            results["comparison"] = compare_runs(results, json.load(f))
+
+    path = save_results(results, args.output)
+
+    total = results["latency_ms"]["total"]
+    print(f"\n✅ {results['requests']} requests in {results['wall_time_s']}s ({results['throughput_rps']} req/s)")
+    print(f"  total: p50={total.get('p50')}ms p95={total.get('p95')}ms p99={total.get('p99')}ms")
+    for stage, stats in results["latency_ms"]["stages"].items():
+        print(f"  {stage:<16} p50={stats.get('p50')}ms p95={stats.get('p95')}ms p99={stats.get('p99')}ms")
+    branch_mix = ", ".join(f"{branch}={info['count']}" for branch, info in results["branches"].items())
+    print(f"  branches: {branch_mix}")
+    if "comparison" in results:
+        print(f"  vs baseline: {results['comparison']}")
+    print(f"\n💾 Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
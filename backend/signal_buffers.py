@@ -0,0 +1,217 @@
+"""
+In-memory ring buffers holding the most recent samples of live wearable signals.
+
+Uploaded chunks (backend/wearable_upload.py) are appended per subject and
+channel into preallocated, fixed-capacity float32 buffers, so live feature
+extraction reads the last few minutes of a signal without touching MongoDB.
+
+Each buffer stores every sample twice (at i and i + capacity), so any window
+of up to `capacity` samples is one contiguous slice: latest() and window()
+return zero-copy views that feature functions consume directly. A view stays
+valid until the next append to that buffer; uploads for one subject are
+applied by a single worker, which reads its views before appending again.
+
+Every buffer keeps the wall-clock time (unix seconds) of its newest sample; a
+chunk that starts after a gap, or at a different sample rate, restarts the
+buffer, and samples overlapping what is already buffered are dropped. A stale
+chunk, one that ends before the newest buffered sample, is dropped whole and
+counted.
+
+All buffers share a global memory budget (SIGNAL_BUFFER_BUDGET_MB): when a new
+buffer would exceed it, the least recently used subjects are dropped whole.
+Modules keeping their own per-subject state next to the buffers register an
+eviction listener (add_eviction_listener) and forget a subject with them.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+# Seconds of history kept per channel
+BUFFER_SECONDS = float(os.getenv("SIGNAL_BUFFER_SECONDS", "300"))
+
+# Total bytes all ring buffers of this process may hold
+BUFFER_BUDGET_BYTES = int(float(os.getenv("SIGNAL_BUFFER_BUDGET_MB", "256")) * (1 << 20))
+
+# Clock jitter tolerated between consecutive chunks before treating it as a gap
+GAP_TOLERANCE_S = 1.0
+
+
+class RingBuffer:
+    """Fixed-capacity float32 ring buffer of one channel, time-stamped by its newest sample."""
+
+    __slots__ = ("data", "capacity", "sample_rate", "size", "head", "end_time", "stale_chunks", "lock")
+
+    def __init__(self, sample_rate: float, seconds: float = BUFFER_SECONDS):
+        self.sample_rate = float(sample_rate)
+        self.capacity = max(1, int(round(seconds * self.sample_rate)))
+        # Mirrored storage: data[i] == data[i + capacity] for every written slot
+        self.data = np.zeros(2 * self.capacity, dtype=np.float32)
+        self.size = 0  # valid samples
+        self.head = 0  # index of the next write
+        self.end_time: Optional[float] = None
+        self.stale_chunks = 0  # late or re-sent chunks with nothing new
+        self.lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+    @property
+    def start_time(self) -> Optional[float]:
+        if self.end_time is None:
+            return None
+        return self.end_time - self.size / self.sample_rate
+
+    def reset(self) -> None:
+        self.size = 0
+        self.head = 0
+        self.end_time = None
+
+    def _write(self, samples: np.ndarray) -> None:
+        cap = self.capacity
+        first = min(samples.size, cap - self.head)
+        rest = samples.size - first
+        self.data[self.head:self.head + first] = samples[:first]
+        self.data[self.head + cap:self.head + cap + first] = samples[:first]
+        if rest:
+            self.data[:rest] = samples[first:]
+            self.data[cap:cap + rest] = samples[first:]
+        self.head = (self.head + samples.size) % cap
+
+    def append(self, samples: np.ndarray, start_time: float) -> int:
+        """
+        Append a chunk whose first sample was taken at start_time.
+
+        Returns:
+            Number of samples written (overlap with buffered samples is skipped,
+            a stale chunk writes nothing)
+        """
+        samples = np.asarray(samples).reshape(-1)
+        with self.lock:
+            if self.end_time is not None:
+                offset = start_time - self.end_time
+                if offset > GAP_TOLERANCE_S:
+                    self.reset()
+                elif offset < 0:
+                    # Re-sent or overlapping chunk: keep only the new tail
+                    skip = int(round(-offset * self.sample_rate))
+                    if skip >= samples.size:
+                        self.stale_chunks += 1
+                        return 0
+                    samples = samples[skip:]
+                    start_time = self.end_time
+            if self.end_time is None:
+                self.end_time = start_time
+
+            written = samples.size
+            self._write(samples[-self.capacity:])
+            self.size = min(self.capacity, self.size + written)
+            self.end_time += written / self.sample_rate
+            return written
+
+    def _view(self, back: int, n: int) -> np.ndarray:
+        """Zero-copy view of n samples starting `back` samples before the newest one."""
+        start = (self.head - back) % self.capacity
+        return self.data[start:start + n]
+
+    def latest(self, n: int) -> np.ndarray:
+        """View of the newest n samples (fewer if not buffered yet), oldest first."""
+        with self.lock:
+            n = min(int(n), self.size)
+            return self._view(n, n)
+
+    def window(self, start_time: float, end_time: float) -> Optional[np.ndarray]:
+        """View of the samples covering [start_time, end_time), or None if not fully buffered."""
+        with self.lock:
+            if self.end_time is None or end_time > self.end_time + 0.5 / self.sample_rate:
+                return None
+            back = int(round((self.end_time - start_time) * self.sample_rate))
+            n = int(round((end_time - start_time) * self.sample_rate))
+            if back > self.size or n <= 0:
+                return None
+            return self._view(back, n)
+
+
+# subject_id -> {channel: buffer}, least recently used first
+_subjects: "OrderedDict[str, Dict[str, RingBuffer]]" = OrderedDict()
+_buffers_lock = threading.Lock()
+_stats = {"bytes": 0, "evicted_subjects": 0, "evicted_bytes": 0}
+_eviction_listeners: List[Callable[[str], None]] = []
+
+
+def add_eviction_listener(callback: Callable[[str], None]) -> None:
+    """Call callback(subject_id) whenever a subject's buffers are evicted or dropped."""
+    _eviction_listeners.append(callback)
+
+
+def _notify_evicted(subject_ids: List[str]) -> None:
+    # Called without _buffers_lock held, so listeners may use this module
+    for subject_id in subject_ids:
+        for callback in _eviction_listeners:
+            callback(subject_id)
+
+
+def _evict_for(needed: int, keep: str) -> List[str]:
+    """Drop least recently used subjects (never `keep`) until `needed` more bytes fit the budget; returns them."""
+    evicted = []
+    while _stats["bytes"] + needed > BUFFER_BUDGET_BYTES:
+        victim = next((subject for subject in _subjects if subject != keep), None)
+        if victim is None:
+            break
+        freed = sum(buffer.nbytes for buffer in _subjects.pop(victim).values())
+        _stats["bytes"] -= freed
+        _stats["evicted_subjects"] += 1
+        _stats["evicted_bytes"] += freed
+        evicted.append(victim)
+    return evicted
+
+
+def append_samples(subject_id: str, channel: str, samples: np.ndarray, sample_rate: float, start_time: float) -> RingBuffer:
+    """Append a chunk to the subject's buffer for `channel`, creating (or resizing) it as needed."""
+    evicted = []
+    with _buffers_lock:
+        channels = _subjects.setdefault(subject_id, {})
+        _subjects.move_to_end(subject_id)
+        buffer = channels.get(channel)
+        if buffer is None or buffer.sample_rate != float(sample_rate):
+            replaced = buffer.nbytes if buffer is not None else 0
+            buffer = RingBuffer(sample_rate)
+            evicted = _evict_for(buffer.nbytes - replaced, keep=subject_id)
+            channels[channel] = buffer
+            _stats["bytes"] += buffer.nbytes - replaced
+    _notify_evicted(evicted)
+    buffer.append(samples, start_time)
+    return buffer
+
+
+def subject_buffers(subject_id: str) -> Dict[str, RingBuffer]:
+    """Channel name -> buffer for every channel a subject has uploaded (marks the subject as recently used)."""
+    with _buffers_lock:
+        channels = _subjects.get(subject_id)
+        if channels is None:
+            return {}
+        _subjects.move_to_end(subject_id)
+        return dict(channels)
+
+
+def drop_subject(subject_id: str) -> None:
+    with _buffers_lock:
+        channels = _subjects.pop(subject_id, None)
+        if channels:
+            _stats["bytes"] -= sum(buffer.nbytes for buffer in channels.values())
+    _notify_evicted([subject_id])
+
+
+def buffer_stats() -> Dict[str, int]:
+    """Subjects, channels and bytes held, the budget, eviction and stale-chunk counters."""
+    with _buffers_lock:
+        return {
+            "subjects": len(_subjects),
+            "channels": sum(len(channels) for channels in _subjects.values()),
+            "stale_chunks": sum(buffer.stale_chunks for channels in _subjects.values() for buffer in channels.values()),
+            "budget_bytes": BUFFER_BUDGET_BYTES,
+            **_stats,
+        }
@@ -0,0 +1,136 @@
+"""
+Online stress-onset detection on streaming feature windows.
+
+Every monitored feature runs a one-sided CUSUM on its z-score against a slowly
+adapting reference (exponentially weighted mean/variance):
+
+    z = direction * (x - mean) / std
+    S = max(0, S + z - CUSUM_K)        -> onset event when S > CUSUM_H
+
+so a sustained EDA rise, SCR burst, pulse-rate spike or RMSSD drop raises one
+event after a few windows (the reference then restarts at the new level)
+while single noisy windows do not. Updates are O(1) in time and memory per
+subject and feature; the state is a handful of floats persisted inside the
+subject's streaming state document (wellness_stream).
+
+Events are written to the `stress_events` collection and the most recent ones
+are surfaced in the wellness snapshot under "stress_events".
+"""
+import math
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING, DESCENDING
+
+from backend.wellness_fusion import db
+
+stress_events = db["stress_events"]
+
+# Feature -> direction of a stress response (+1 rise, -1 drop)
+MONITORED_FEATURES = {"eda": 1, "scr_rate": 1, "pulse_rate": 1, "ecg": -1}
+
+CUSUM_K = 0.5  # allowance (in std) absorbed per window
+CUSUM_H = 5.0  # decision threshold
+REFERENCE_ALPHA = 0.05  # EW mean/variance update rate (about 20 windows)
+MIN_REFERENCE_WINDOWS = 10  # windows before the reference is trusted
+RECENT_EVENTS = 5  # events kept in the snapshot
+
+
+def ensure_event_indexes() -> None:
+    stress_events.create_index([("subject_id", ASCENDING), ("timestamp", DESCENDING)])
+
+
+class ChangeDetector:
+    """Per-subject CUSUM state; lists are indexed like MONITORED_FEATURES."""
+
+    __slots__ = ("count", "mean", "var", "cusum", "recent")
+
+    def __init__(self):
+        size = len(MONITORED_FEATURES)
+        self.count = [0] * size
+        self.mean = [0.0] * size
+        self.var = [0.0] * size
+        self.cusum = [0.0] * size
+        self.recent: List[dict] = []
+
+    def update(self, features: Dict[str, Optional[float]], timestamp: datetime) -> List[dict]:
+        """Fold one window in; returns the onset events it triggered."""
+        events = []
+        for i, (name, direction) in enumerate(MONITORED_FEATURES.items()):
+            value = features.get(name)
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                continue
+            if self.count[i] >= MIN_REFERENCE_WINDOWS and self.var[i] > 0:
+                std = math.sqrt(self.var[i])
+                z = direction * (value - self.mean[i]) / std
+                self.cusum[i] = max(0.0, self.cusum[i] + z - CUSUM_K)
+                if self.cusum[i] > CUSUM_H:
+                    events.append({
+                        "feature": name,
+                        "direction": "rise" if direction > 0 else "drop",
+                        "timestamp": timestamp,
+                        "value": value,
+                        "reference_mean": self.mean[i],
+                        "reference_std": std,
+                        "score": round(self.cusum[i], 3),
+                    })
+                    # Restart at the new level so a sustained shift raises one event
+                    self.cusum[i] = 0.0
+                    self.mean[i] = value
+
+            # Exponentially weighted reference (plain mean/variance while warming up)
+            self.count[i] += 1
+            alpha = max(REFERENCE_ALPHA, 1.0 / self.count[i])
+            delta = value - self.mean[i]
+            self.mean[i] += alpha * delta
+            self.var[i] = (1 - alpha) * (self.var[i] + alpha * delta * delta)
+
+        if events:
+            self.recent = (self.recent + [_public(event) for event in events])[-RECENT_EVENTS:]
+        return events
+
+    def to_doc(self) -> dict:
+        return {"count": self.count, "mean": self.mean, "var": self.var, "cusum": self.cusum, "recent": self.recent}
+
+    @classmethod
+    def from_doc(cls, doc: Optional[dict]) -> "ChangeDetector":
+        detector = cls()
+        if not doc:
+            return detector
+        size = len(MONITORED_FEATURES)
+        # Pad/trim in case MONITORED_FEATURES changed since the state was written
+        detector.count = (list(doc.get("count", [])) + [0] * size)[:size]
+        detector.mean = (list(doc.get("mean", [])) + [0.0] * size)[:size]
+        detector.var = (list(doc.get("var", [])) + [0.0] * size)[:size]
+        detector.cusum = (list(doc.get("cusum", [])) + [0.0] * size)[:size]
+        detector.recent = list(doc.get("recent", []))[-RECENT_EVENTS:]
+        return detector
+
+
+def _public(event: dict) -> dict:
+    """Snapshot form of an event (JSON-friendly, rounded)."""
+    return {
+        "feature": event["feature"],
+        "direction": event["direction"],
+        "timestamp": event["timestamp"].isoformat(),
+        "value": round(event["value"], 3),
+        "score": event["score"],
+    }
+
+
+def record_events(subject_id: str, events: List[dict]) -> int:
+    """Insert onset events into the stress_events collection."""
+    if not events:
+        return 0
+    now = datetime.utcnow()
+    stress_events.insert_many([{**event, "subject_id": subject_id, "detected_at": now} for event in events], ordered=False)
+    return len(events)
+
+
+def get_stress_events(subject_id: str, since: Optional[datetime] = None, limit: int = 50) -> List[dict]:
+    """Most recent onset events of a subject, newest first."""
+    query = {"subject_id": subject_id}
+    if since:
+        query["timestamp"] = {"$gte": since}
+    cursor = stress_events.find(query, {"_id": 0}).sort("timestamp", DESCENDING).limit(limit)
+    return list(cursor)
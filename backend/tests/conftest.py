@@ -0,0 +1,49 @@
+import os
+import pickle
+import sys
+
+import numpy as np
+import pytest
+
+# Tests run against an in-memory MongoDB (mongomock) and import from the repo root
+os.environ.setdefault("MONGODB_URI", "mongomock://localhost")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+
+def synthetic_wesad(minutes=3, seed=0):
+    """A small nested WESAD-style recording: chest at 700 Hz, wrist at its native rates, baseline label."""
+    rng = np.random.default_rng(seed)
+    seconds = minutes * 60
+    t = np.arange(seconds * 700) / 700
+    ecg = np.exp(-((1.2 * t % 1) - 0.3) ** 2 / 0.0004) + 0.02 * rng.standard_normal(t.size)
+    chest = {
+        "ECG": ecg,
+        "EDA": 5 + 0.05 * np.sin(2 * np.pi * 0.01 * t),
+        "EMG": 0.01 * rng.standard_normal(t.size),
+        "Temp": 33 + 0.01 * rng.standard_normal(t.size),
+        "Resp": np.sin(2 * np.pi * 0.25 * t),
+    }
+    wrist_t = np.arange(seconds * 64) / 64
+    wrist = {
+        "BVP": np.sin(2 * np.pi * 1.2 * wrist_t),
+        "EDA": np.full(seconds * 4, 5.0),
+        "TEMP": np.full(seconds * 4, 33.0),
+    }
+    return {
+        "signal": {
+            "chest": {name: values.reshape(-1, 1) for name, values in chest.items()},
+            "wrist": {name: values.reshape(-1, 1) for name, values in wrist.items()},
+        },
+        "label": np.ones(t.size, dtype=int),
+        "subject": "S2",
+    }
+
+
+@pytest.fixture
+def wesad_dir(tmp_path):
+    """data/wearable-style folder with one synthetic subject (S2/S2.pkl)."""
+    base = tmp_path / "wearable"
+    (base / "S2").mkdir(parents=True)
+    with open(base / "S2" / "S2.pkl", "wb") as f:
+        pickle.dump(synthetic_wesad(), f)
+    return base
@@ -0,0 +1,168 @@
+import numpy as np
+import pytest
+
+from backend.physio_signals import (
+    LF_HF_WINDOW_S,
+    align_signals,
+    compute_rmssd,
+    detect_r_peaks,
+    detect_scrs,
+    hrv_by_window,
+    lf_hf_by_window,
+    pulse_rate_by_window,
+    resample_to_rate,
+    resp_rate_by_window,
+    rr_intervals,
+    scr_by_window,
+    window_means,
+)
+
+FS = 700
+
+
+def synthetic_ecg(rr_s, fs=FS, first_s=0.5, seed=0):
+    """Narrow R waves at known times (cumulative rr_s) on a slightly noisy baseline."""
+    beats = first_s + np.concatenate(([0.0], np.cumsum(rr_s)))
+    t = np.arange(int((beats[-1] + 1.0) * fs)) / fs
+    ecg = 0.01 * np.random.default_rng(seed).standard_normal(t.size)
+    for beat in beats:
+        ecg += np.exp(-((t - beat) ** 2) / (2 * 0.01 ** 2))
+    return ecg, np.round(beats * fs).astype(int)
+
+
+def synthetic_eda(onsets_s, fs=4, duration_s=180, amplitude=0.3, rise_s=2.0, decay_s=6.0):
+    """Flat 2 uS tonic level plus SCRs (linear rise, exponential recovery) starting at onsets_s."""
+    t = np.arange(int(duration_s * fs)) / fs
+    eda = np.full(t.size, 2.0)
+    for onset in onsets_s:
+        dt = t - onset
+        rise = (dt >= 0) & (dt < rise_s)
+        eda[rise] += amplitude * dt[rise] / rise_s
+        after = dt >= rise_s
+        eda[after] += amplitude * np.exp(-(dt[after] - rise_s) / decay_s)
+    return eda
+
+
+def test_rmssd_of_known_rr_intervals():
+    # Alternating 800/850 ms beats: every successive difference is 50 ms
+    peaks = np.round(np.cumsum([0.0] + [0.8, 0.85] * 20) * FS).astype(int)
+    rr, times, valid = rr_intervals(peaks)
+    assert valid.all()
+    np.testing.assert_allclose(rr[:2], [0.8, 0.85], atol=1 / FS)
+    assert compute_rmssd(rr, valid) == pytest.approx(50.0, abs=2.0)
+
+
+def test_rmssd_skips_implausible_intervals():
+    rr = np.array([0.8, 0.85, 3.0, 0.8, 0.85])
+    _, _, valid = rr_intervals(np.round(np.cumsum([0.0, *rr]) * FS).astype(int))
+    assert not valid[2]
+    assert compute_rmssd(rr, valid) == pytest.approx(50.0, abs=2.0)
+    assert compute_rmssd(np.array([0.8])) is None
+
+
+def test_r_peaks_found_at_known_beats():
+    rr = [0.8, 0.85] * 40
+    ecg, beats = synthetic_ecg(rr)
+    peaks = detect_r_peaks(ecg)
+
+    assert peaks.size == beats.size
+    assert np.abs(peaks - beats).max() <= 0.01 * FS
+    rr_found, _, valid = rr_intervals(peaks)
+    assert compute_rmssd(rr_found, valid) == pytest.approx(50.0, abs=3.0)
+
+
+def test_hrv_by_window_with_known_rr():
+    rr = [0.8, 0.85] * 40  # ~66 s of beats
+    ecg, beats = synthetic_ecg(rr)
+    windows = hrv_by_window(ecg, window_s=30, hop_s=15, peaks=beats)
+
+    np.testing.assert_array_equal(windows["start_s"], [0, 15, 30])
+    np.testing.assert_allclose(windows["rmssd"], 50.0, atol=2.0)
+    np.testing.assert_allclose(windows["sdnn"], 25.0, atol=2.0)
+    np.testing.assert_allclose(windows["mean_hr"], 60 / 0.825, atol=0.5)
+
+
+def test_chunked_r_peaks_match_whole_signal():
+    ecg, _ = synthetic_ecg([0.75, 0.9, 0.8] * 30)
+    np.testing.assert_array_equal(detect_r_peaks(ecg, chunk_s=10), detect_r_peaks(ecg, chunk_s=None))
+
+
+def test_scr_onsets_and_window_rates():
+    fs = 4
+    onsets_s = [20.0, 70.0, 130.0]
+    eda = synthetic_eda(onsets_s, fs=fs)
+    scrs = detect_scrs(eda, fs)
+
+    assert scrs["onsets"].size == len(onsets_s)
+    np.testing.assert_allclose(scrs["onsets"] / fs, onsets_s, atol=1.5)
+    assert (scrs["amplitudes"] > 0.1).all()
+
+    windows = scr_by_window(eda, fs, window_s=60, hop_s=60)
+    np.testing.assert_array_equal(windows["start_s"], [0, 60, 120])
+    np.testing.assert_array_equal(windows["count"], [1, 1, 1])
+    np.testing.assert_array_equal(windows["scr_rate"], [1.0, 1.0, 1.0])
+
+
+def test_flat_eda_has_no_scrs():
+    scrs = detect_scrs(np.full(400, 2.0), 4)
+    assert scrs["onsets"].size == 0
+
+
+def test_resp_and_pulse_rates_from_dominant_frequency():
+    t = np.arange(120 * FS) / FS
+    resp = np.sin(2 * np.pi * 0.25 * t)  # 15 breaths/min
+    np.testing.assert_allclose(resp_rate_by_window(resp, FS, window_s=60, hop_s=30), 15.0, atol=0.5)
+
+    t = np.arange(120 * 64) / 64
+    bvp = np.sin(2 * np.pi * 1.2 * t)  # 72 bpm
+    np.testing.assert_allclose(pulse_rate_by_window(bvp, 64, window_s=60), 72.0, atol=0.5)
+
+
+def test_resample_bins_and_interpolates():
+    ramp = np.arange(640, dtype=float)  # 10 s at 64 Hz
+    # Non-integer ratio (6.4): each output sample is the mean of its input bin
+    down = resample_to_rate(ramp, 64, 10)
+    assert down.size == 100
+    bounds = np.floor(np.arange(101) * 6.4).astype(int)
+    np.testing.assert_allclose(down, [ramp[lo:hi].mean() for lo, hi in zip(bounds[:-1], bounds[1:])])
+    # Integer ratio goes through decimate with the same bin means
+    np.testing.assert_allclose(resample_to_rate(ramp, 64, 4), ramp.reshape(40, 16).mean(axis=1))
+    # Slower signals are linearly interpolated
+    np.testing.assert_allclose(resample_to_rate(np.arange(8.0), 4, 8)[:14], np.arange(14) / 2)
+
+
+def test_align_signals_and_window_means():
+    signals = {
+        "EDA": np.full(4 * 120, 3.0),  # 120 s at 4 Hz
+        "Temp": np.linspace(30, 31, 64 * 100, endpoint=False),  # 100 s at 64 Hz
+        "Empty": np.empty(0),
+    }
+    names, matrix = align_signals(signals, {"EDA": 4, "Temp": 64, "Empty": 1}, 4)
+
+    assert names == ["EDA", "Temp"]
+    assert matrix.shape == (400, 2) and matrix.dtype == np.float32
+    means = window_means(matrix, 4, window_s=50, hop_s=25)
+    assert means.shape == (3, 2)
+    np.testing.assert_allclose(means[:, 0], 3.0)
+    np.testing.assert_allclose(means[:, 1], [30.25, 30.5, 30.75], atol=1e-3)
+
+    matrix[10, 1] = np.nan
+    assert np.isnan(window_means(matrix, 4, window_s=50, hop_s=25)[0, 1])
+
+
+def modulated_peaks(freq_hz, duration_s=300.0, fs=FS):
+    """R-peak samples of a 0.8 s rhythm whose RR interval oscillates at freq_hz."""
+    beats = [0.5]
+    while beats[-1] < duration_s - 1.0:
+        beats.append(beats[-1] + 0.8 + 0.05 * np.sin(2 * np.pi * freq_hz * beats[-1]))
+    return np.round(np.array(beats) * fs).astype(int)
+
+
+def test_lf_hf_needs_a_long_enough_rr_span():
+    lf = lf_hf_by_window(modulated_peaks(0.1), FS, 300.0, window_s=60.0, hop_s=30.0)
+    hf = lf_hf_by_window(modulated_peaks(0.25), FS, 300.0, window_s=60.0, hop_s=30.0)
+
+    short = lf["start_s"] + 60.0 < LF_HF_WINDOW_S
+    assert short.any() and np.isnan(lf["lf_hf"][short]).all()
+    assert (lf["lf_hf"][~short] > 1.0).all()
+    assert (hf["lf_hf"][~short] < 1.0).all()
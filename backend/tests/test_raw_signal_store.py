@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from backend import raw_signal_store
+from backend.raw_signal_store import decode_samples, encode_samples
+
+
+@pytest.mark.parametrize("compression", [None, "zlib"])
+@pytest.mark.parametrize("delta", [False, True])
+def test_encode_decode_round_trip(compression, delta):
+    samples = np.sin(np.linspace(0, 20, 1000)).astype(np.float32)
+    payload, encoding = encode_samples(samples, "float32", delta, compression)
+    np.testing.assert_array_equal(decode_samples(payload, encoding), samples)
+
+
+def test_zstd_without_zstandard_is_a_clear_error(monkeypatch):
+    monkeypatch.setattr(raw_signal_store, "zstandard", None)
+    encoding = {"dtype": "float32", "delta": True, "compression": "zstd"}
+    with pytest.raises(ValueError, match="zstandard"):
+        encode_samples(np.zeros(4), compression="zstd")
+    with pytest.raises(ValueError, match="zstandard"):
+        decode_samples(b"\x00" * 16, encoding)
+
+
+def test_high_rate_channels_are_lossless_by_default():
+    samples = np.sin(np.linspace(0, 20, 700)).astype(np.float32)
+    doc = raw_signal_store.raw_window_doc("S1", "ECG", samples, 700.0, 1_700_000_000.0)
+    assert doc["dtype"] == "float32"
+    np.testing.assert_array_equal(decode_samples(bytes(doc["data"]), doc), samples)
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from backend import raw_signal_store, signal_buffers, wearable_upload, wellness_stream
+
+
+@pytest.fixture
+def tiny_budget(monkeypatch):
+    """Room for exactly one 100 Hz buffer."""
+    monkeypatch.setattr(signal_buffers, "BUFFER_BUDGET_BYTES", signal_buffers.RingBuffer(100).nbytes)
+    yield
+    for subject_id in list(signal_buffers._subjects):
+        signal_buffers.drop_subject(subject_id)
+
+
+def test_eviction_forgets_per_subject_state(tiny_budget):
+    signal_buffers.append_samples("A", "EDA", np.zeros(100), 100, 1000.0)
+    wearable_upload._next_window_end["A"] = 1060.0
+    raw_signal_store._flushed_until["A"] = {"EDA": 1000.0}
+
+    signal_buffers.append_samples("B", "EDA", np.zeros(100), 100, 1000.0)
+
+    assert signal_buffers.subject_buffers("A") == {}
+    assert signal_buffers.buffer_stats()["evicted_subjects"] >= 1
+    assert "A" not in wearable_upload._next_window_end
+    assert "A" not in raw_signal_store._flushed_until
+
+
+def test_drop_subject_forgets_per_subject_state():
+    signal_buffers.append_samples("C", "EDA", np.zeros(10), 4, 1000.0)
+    wearable_upload._next_window_end["C"] = 1060.0
+    signal_buffers.drop_subject("C")
+    assert "C" not in wearable_upload._next_window_end
+
+
+def test_stream_states_are_bounded(monkeypatch):
+    monkeypatch.setattr(wellness_stream, "STREAM_MAX_SUBJECTS", 2)
+    wellness_stream.reset_state()
+    for subject_id in ("S1", "S2", "S1", "S3"):
+        wellness_stream._load_state(subject_id)
+    assert list(wellness_stream._states) == ["S1", "S3"]
+
+    # A state in the middle of an update is never dropped
+    with wellness_stream._states["S1"].lock:
+        wellness_stream._load_state("S4")
+    assert list(wellness_stream._states) == ["S1", "S4"]
+    wellness_stream.reset_state()
+
+
+def test_stale_chunk_is_dropped_without_reset():
+    buffer = signal_buffers.RingBuffer(10, seconds=2)
+    buffer.append(np.arange(10), 100.0)
+    buffer.append(np.arange(10, 20), 101.0)
+
+    # Ends before the newest sample, and even before the buffered history
+    assert buffer.append(np.full(5, -1.0), 90.0) == 0
+    assert buffer.append(np.full(5, -1.0), 101.2) == 0
+    assert buffer.stale_chunks == 2
+    assert buffer.end_time == 102.0
+    np.testing.assert_array_equal(buffer.latest(20), np.arange(20))
+
+    # An overlapping chunk only contributes its new tail
+    assert buffer.append(np.arange(15, 25), 101.5) == 5
+    np.testing.assert_array_equal(buffer.latest(20), np.arange(5, 25))
+
+
+def test_ring_buffer_wraps_around_with_contiguous_views():
+    buffer = signal_buffers.RingBuffer(10, seconds=1)  # 10 samples
+    for second in range(3):
+        buffer.append(np.arange(7) + 7 * second, 100.0 + 0.7 * second)
+
+    # 21 samples written into 10 slots: the newest 10 survive, oldest first
+    assert buffer.size == 10 and buffer.head == 1
+    assert buffer.end_time == pytest.approx(102.1)
+    assert buffer.start_time == pytest.approx(101.1)
+    latest = buffer.latest(10)
+    np.testing.assert_array_equal(latest, np.arange(11, 21))
+    # Views span the wrap point without a copy
+    assert np.shares_memory(latest, buffer.data)
+    np.testing.assert_array_equal(buffer.window(101.5, 102.0), np.arange(15, 20))
+
+
+def test_ring_buffer_windows_outside_history():
+    buffer = signal_buffers.RingBuffer(10, seconds=1)
+    buffer.append(np.arange(15), 100.0)  # longer than capacity: keeps the tail
+    np.testing.assert_array_equal(buffer.latest(20), np.arange(5, 15))
+    assert buffer.window(100.0, 100.5) is None  # already overwritten
+    assert buffer.window(101.2, 101.8) is None  # not received yet
+
+
+def test_gap_restarts_buffer():
+    buffer = signal_buffers.RingBuffer(10, seconds=1)
+    buffer.append(np.arange(5), 100.0)
+    buffer.append(np.arange(3), 110.0)
+    assert buffer.size == 3 and buffer.start_time == 110.0
@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pytest
+
+from database import wearable_preprocess
+
+
+def _db_state():
+    db = wearable_preprocess.db
+    return {name: sorted(map(repr, db[name].find())) for name in db.list_collection_names()}
+
+
+def _files(path):
+    return {
+        os.path.join(root, name): os.stat(os.path.join(root, name)).st_mtime_ns
+        for root, _, names in os.walk(path)
+        for name in names
+    }
+
+
+def test_dry_run_on_new_subject_writes_nothing(wesad_dir, tmp_path):
+    cache_dir = tmp_path / "cache"
+    before = _db_state()
+
+    summary = wearable_preprocess.process_all_subjects(str(wesad_dir), cache_dir=str(cache_dir), dry_run=True)
+
+    assert summary["processed"] == 1 and not summary["failures"]
+    assert summary["planned"]
+    assert _db_state() == before
+    assert not cache_dir.exists() or _files(cache_dir) == {}
+
+
+def test_dry_run_after_ingest_does_not_restamp(wesad_dir, tmp_path):
+    cache_dir = tmp_path / "cache"
+    summary = wearable_preprocess.process_all_subjects(str(wesad_dir), cache_dir=str(cache_dir))
+    assert summary["processed"] == 1 and not summary["failures"]
+
+    # Touched but unchanged: a real run would re-stamp the manifests
+    pkl_path = wesad_dir / "S2" / "S2.pkl"
+    stat = os.stat(pkl_path)
+    os.utime(pkl_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    db_before, files_before = _db_state(), _files(cache_dir)
+
+    skipped = wearable_preprocess.process_all_subjects(str(wesad_dir), cache_dir=str(cache_dir), dry_run=True)
+    forced = wearable_preprocess.process_all_subjects(str(wesad_dir), cache_dir=str(cache_dir), dry_run=True, force=True)
+
+    assert skipped["skipped"] == ["S2"]
+    assert forced["processed"] == 1 and not forced["failures"]
+    assert _db_state() == db_before
+    assert _files(cache_dir) == files_before
+
+
+def test_reingest_reads_saved_feature_matrix(wesad_dir, tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    wearable_preprocess.process_all_subjects(str(wesad_dir), cache_dir=str(cache_dir), force=True)
+    windows = wearable_preprocess.db["wearable_windows"]
+    first = sorted(doc["pwi"] for doc in windows.find({"subject_id": "S2"}))
+    assert first
+
+    def recompute(*args, **kwargs):
+        raise AssertionError("feature matrix recomputed for an unchanged source")
+
+    monkeypatch.setattr(wearable_preprocess, "extract_feature_matrix", recompute)
+    summary = wearable_preprocess.process_all_subjects(str(wesad_dir), cache_dir=str(cache_dir), force=True)
+
+    assert summary["processed"] == 1 and not summary["failures"]
+    assert sorted(doc["pwi"] for doc in windows.find({"subject_id": "S2"})) == first
+
+
+def test_segmented_stats_skip_non_finite_samples():
+    arr = np.array([1.0, np.nan, 3.0, np.inf, -np.inf, 5.0])
+    segments = (np.array([1]), np.array([0]), np.array([6]))
+
+    session, conditions = wearable_preprocess.segmented_stats(arr, 1, segments, label_rate=1)
+
+    assert session["mean"] == pytest.approx(3.0)
+    assert conditions["baseline"]["mean"] == pytest.approx(3.0)
@@ -0,0 +1,119 @@
+import gzip
+import time
+
+import numpy as np
+import pytest
+
+from backend import signal_buffers, wearable_upload
+from backend.wearable_upload import (
+    CODEC_GZIP,
+    CODEC_RAW,
+    CODEC_ZSTD,
+    FRAME_HEADER,
+    FRAME_MAGIC,
+    FRAME_VERSION,
+    UploadError,
+    ingest_chunks,
+    parse_frames,
+)
+
+DTYPE_CODES = {np.dtype("<f4"): 1, np.dtype("<f2"): 2, np.dtype("<f8"): 3}
+NOW = float(int(time.time()))
+
+
+def frame(channel, samples, rate, start, codec=CODEC_RAW, dtype="<f4", magic=FRAME_MAGIC):
+    """One upload frame, as a phone or watch client builds it."""
+    dtype = np.dtype(dtype)
+    payload = np.asarray(samples, dtype=dtype).tobytes()
+    if codec == CODEC_GZIP:
+        payload = gzip.compress(payload)
+    name = channel.encode("ascii")
+    header = FRAME_HEADER.pack(
+        magic, FRAME_VERSION, DTYPE_CODES[dtype], codec, len(name), rate, start, len(samples), len(payload)
+    )
+    return header + name + payload
+
+
+def test_round_trip_raw_and_gzip_frames():
+    eda = np.linspace(1.0, 2.0, 240)
+    ecg = np.sin(np.linspace(0, 50, 7000))
+    body = frame("eda", eda, 4, NOW) + frame("ECG", ecg, 700, NOW + 0.5, codec=CODEC_GZIP, dtype="<f2")
+
+    chunks = parse_frames(body)
+
+    assert [(c.channel, c.sample_rate, c.start_time) for c in chunks] == [("EDA", 4.0, NOW), ("ECG", 700.0, NOW + 0.5)]
+    np.testing.assert_array_equal(chunks[0].samples, eda.astype("<f4"))
+    np.testing.assert_array_equal(chunks[1].samples, ecg.astype("<f2"))
+    # Raw payloads are views of the request body, not copies
+    assert not chunks[0].samples.flags.owndata
+
+
+@pytest.mark.parametrize(
+    "body, message",
+    [
+        (b"", "Empty upload"),
+        (frame("EDA", [1.0], 4, NOW)[:10], "Truncated frame header"),
+        (frame("EDA", [1.0, 2.0], 4, NOW)[:-1], "Truncated frame payload"),
+        (frame("EDA", [1.0], 4, NOW, magic=b"NOPE"), "bad magic"),
+        (frame("Gyro", [1.0], 4, NOW), "Unknown channel"),
+        (frame("EDA", [1.0], 0, NOW), "Invalid sample rate"),
+        (frame("EDA", [1.0], 4, NOW * 1000), "from server time"),
+        (frame("EDA", [1.0], 4, NOW - 2 * 86400), "from server time"),
+    ],
+)
+def test_malformed_frames_are_rejected(body, message):
+    with pytest.raises(UploadError, match=message):
+        parse_frames(body)
+
+
+def test_oversized_gzip_payload_is_rejected():
+    body = frame("EDA", np.zeros(4096), 4, NOW, codec=CODEC_GZIP)
+    # The header claims 10 samples, but the payload inflates far beyond that
+    fields = list(FRAME_HEADER.unpack_from(body))
+    fields[7] = 10
+    tampered = FRAME_HEADER.pack(*fields) + body[FRAME_HEADER.size:]
+    with pytest.raises(UploadError) as error:
+        parse_frames(tampered)
+    assert error.value.status_code == 413
+
+
+def test_zstd_without_zstandard_is_unsupported(monkeypatch):
+    monkeypatch.setattr(wearable_upload, "zstandard", None)
+    with pytest.raises(UploadError) as error:
+        parse_frames(frame("EDA", [1.0], 4, NOW, codec=CODEC_ZSTD))
+    assert error.value.status_code == 415
+
+
+def test_ingest_chunks_scores_completed_windows():
+    subject_id = "upload-test"
+    t = np.arange(0, 150, 0.25)
+    start = NOW - 150
+    chunks = parse_frames(
+        frame("EDA", 2.0 + 0.1 * np.sin(t / 10), 4, start) + frame("Temp", np.full(t.size, 33.0), 4, start)
+    )
+    try:
+        snapshot = ingest_chunks(subject_id, chunks)
+        assert snapshot is not None and snapshot["source"] == "stream"
+        # 150 s of samples: windows ending at 60, 90, 120 and 150 s are scored
+        assert wearable_upload._next_window_end[subject_id] == start + 180
+        # Re-sending the same chunks adds nothing and keeps the buffers
+        assert ingest_chunks(subject_id, chunks) is None
+        assert signal_buffers.subject_buffers(subject_id)["EDA"].size == t.size
+    finally:
+        signal_buffers.drop_subject(subject_id)
+
+
+def test_clock_jump_scores_only_buffered_windows(monkeypatch):
+    subject_id = "upload-skew-test"
+    calls = []
+    monkeypatch.setattr(wearable_upload, "window_features", lambda subject, end: calls.append(end))
+    t = np.arange(0, 90, 0.25)
+    try:
+        ingest_chunks(subject_id, parse_frames(frame("EDA", np.ones(t.size), 4, NOW - 3 * 3600)))
+        calls.clear()
+        # One channel suddenly hours ahead: only windows still in its buffer are scored
+        ingest_chunks(subject_id, parse_frames(frame("Temp", np.ones(t.size), 4, NOW)))
+        assert 0 < len(calls) <= wearable_upload.MAX_WINDOWS_PER_UPDATE
+        assert min(calls) >= NOW + 90 - signal_buffers.BUFFER_SECONDS
+    finally:
+        signal_buffers.drop_subject(subject_id)
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend import wellness_baselines
+from backend.wellness_baselines import (
+    baseline_sums,
+    record_feature_windows,
+    refresh_baselines,
+    refresh_changed_baselines,
+    replace_window_sums,
+    store_feature_windows,
+    wearable_windows,
+)
+from backend.wellness_fusion import wearable_baselines
+
+
+@pytest.fixture
+def subject():
+    subject_id = "B1"
+    yield subject_id
+    for collection in (wearable_windows, baseline_sums, wearable_baselines):
+        collection.delete_many({"subject_id": subject_id})
+
+
+def windows(day, values):
+    return [{"timestamp": day + timedelta(minutes=i), "features": {"eda": value}} for i, value in enumerate(values)]
+
+
+def test_aged_out_days_leave_the_rolling_baseline(subject, monkeypatch):
+    now = datetime.utcnow()
+    record_feature_windows(subject, windows(now - timedelta(days=10), [1.0, 2.0, 3.0]))
+    refresh_baselines([subject])
+    stored = wearable_baselines.find_one({"subject_id": subject})
+    assert "7d" not in stored["rolling"] and stored["rolling"]["30d"]["eda"]["mean"] == 2.0
+
+    # A stale 7-day window (computed days ago, no new data since) slides on the next refresh
+    wearable_baselines.update_one(
+        {"subject_id": subject},
+        {"$set": {"rolling.7d": {"eda": {"mean": 9.0}}, "rolling_updated_at": now - timedelta(days=2)}},
+    )
+    monkeypatch.setattr(wellness_baselines, "_last_refresh", now)
+    assert refresh_changed_baselines() >= 1
+    assert "7d" not in wearable_baselines.find_one({"subject_id": subject})["rolling"]
+
+
+def test_replace_window_sums_rebuilds_only_replaced_days(subject):
+    day = datetime(2026, 3, 1)
+    record_feature_windows(subject, windows(day, [1.0, 1.0]), source="stream")
+    store_feature_windows(replace_window_sums(subject, windows(day + timedelta(days=1), [2.0, 4.0])))
+    streamed = baseline_sums.find_one({"subject_id": subject, "day": "2026-03-01"})
+
+    # Re-ingest lands on another day: the old ingestion day is emptied, the streamed day is not touched
+    store_feature_windows(replace_window_sums(subject, windows(day + timedelta(days=2), [5.0])))
+
+    buckets = {doc["day"]: doc for doc in baseline_sums.find({"subject_id": subject})}
+    assert buckets["2026-03-01"] == streamed
+    assert buckets.get("2026-03-02", {}).get("n", {}).get("eda", 0) == 0
+    assert buckets["2026-03-03"]["sum"]["eda"] == 5.0
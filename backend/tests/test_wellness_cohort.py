@@ -0,0 +1,61 @@
+from datetime import datetime
+
+import pytest
+
+from backend import wellness_stream
+from backend.wellness_cache import clear_all
+from backend.wellness_cohort import compute_cohort_pwi
+from backend.wellness_fusion import compute_pwi, wearable_data, wellness_snapshots
+from backend.wellness_snapshots import recompute_snapshots
+
+FEATURES = {"eda": 5.0, "temp": 33.0, "bvp": 0.2, "ecg": 40.0, "resp": 0.1, "resp_rate": 15.0, "pulse_rate": 70.0, "lf_hf": 1.5}
+
+
+@pytest.fixture
+def cohort():
+    subject_ids = ["C1", "C2"]
+    wearable_data.insert_many([
+        {"subject_id": subject_id, **{name: {"mean": value * scale, "std": value / 10} for name, value in FEATURES.items()}}
+        for subject_id, scale in zip(subject_ids, (1.0, 1.3))
+    ])
+    yield subject_ids
+    wearable_data.delete_many({"subject_id": {"$in": subject_ids}})
+    wellness_snapshots.delete_many({"subject_id": {"$in": subject_ids}})
+    wellness_stream.reset_state(subject_ids)
+    clear_all()
+
+
+def test_cohort_matches_compute_pwi_for_streamed_subjects(cohort):
+    # C1 gets a live streamed snapshot; C2 only has ingested features
+    streamed = {name: value * 1.5 for name, value in FEATURES.items()}
+    wellness_stream.ingest_feature_windows("C1", [{"timestamp": datetime(2026, 1, 1, 12), "features": streamed}])
+    clear_all()
+
+    results = {result["subject_id"]: result for result in compute_cohort_pwi(subject_ids=cohort)["results"]}
+
+    for subject_id in cohort:
+        assert results[subject_id]["pwi"] == compute_pwi(subject_id)["pwi"]
+    assert results["C1"]["source"] == "stream"
+    assert compute_cohort_pwi(subject_ids=["C1"], use_snapshots=False)["results"][0]["pwi"] != results["C1"]["pwi"]
+
+
+def test_prefix_cohort_serves_snapshots_and_scores_the_rest(cohort):
+    wellness_stream.ingest_feature_windows("C1", [{"timestamp": datetime(2026, 1, 1, 12), "features": FEATURES}])
+
+    results = compute_cohort_pwi(subject_prefix="C")["results"]
+
+    assert sorted(result["subject_id"] for result in results) == cohort
+    assert all(result["pwi"] is not None for result in results)
+
+
+def test_recompute_keeps_current_stream_snapshots_and_replaces_stale_ones(cohort):
+    wellness_stream.ingest_feature_windows("C1", [{"timestamp": datetime(2026, 1, 1, 12), "features": FEATURES}])
+
+    recompute_snapshots(force=True)
+    assert wellness_snapshots.find_one({"subject_id": "C1"})["source"] == "stream"
+
+    wellness_snapshots.update_one({"subject_id": "C1"}, {"$set": {"scoring_version": "old"}})
+    recompute_snapshots()
+    clear_all()
+    assert wellness_snapshots.find_one({"subject_id": "C1"})["source"] == "ingestion"
+    assert compute_pwi("C1")["pwi"] == compute_cohort_pwi(subject_ids=["C1"], use_snapshots=False)["results"][0]["pwi"]
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from backend.wellness_baselines import record_feature_windows, wearable_windows
+from backend.wellness_series import get_pwi_series, lttb_indices, minmax_indices, naive_utc
+
+
+@pytest.fixture
+def series():
+    subject_id = "T1"
+    start = datetime(2026, 2, 1)
+    record_feature_windows(subject_id, [
+        {"timestamp": start + timedelta(minutes=i, microseconds=1500), "features": {"eda": float(i)}, "pwi": 50 + 10 * np.sin(i / 20)}
+        for i in range(1000)
+    ])
+    yield subject_id, start
+    wearable_windows.delete_many({"subject_id": subject_id})
+
+
+def test_naive_utc():
+    aware = datetime(2026, 2, 1, 14, tzinfo=timezone(timedelta(hours=2)))
+    assert naive_utc(aware) == datetime(2026, 2, 1, 12)
+    assert naive_utc(datetime(2026, 2, 1, 12)) == datetime(2026, 2, 1, 12)
+    assert naive_utc(None) is None
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+def test_series_downsamples_with_features(series, method):
+    subject_id, start = series
+    result = get_pwi_series(subject_id, start=start, end=start + timedelta(days=1), points=50, method=method)
+
+    assert result["raw_count"] == 1000
+    assert 2 < len(result["points"]) <= 50
+    for point in result["points"]:
+        minute = (datetime.fromisoformat(point["timestamp"]) - start) // timedelta(minutes=1)
+        assert point["features"]["eda"] == minute
+        assert point["pwi"] == pytest.approx(50 + 10 * np.sin(minute / 20), abs=0.01)
+
+
+def test_series_accepts_aware_bounds(series):
+    subject_id, start = series
+    aware_start = start.replace(tzinfo=timezone.utc) - timedelta(hours=1)
+    result = get_pwi_series(subject_id, start=aware_start, end=start + timedelta(hours=1))
+    assert result["raw_count"] == 60
+    assert result["from"] == (start - timedelta(hours=1)).isoformat()
+
+
+def test_lttb_keeps_endpoints_and_spike():
+    x = np.arange(100.0)
+    y = np.zeros(100)
+    y[37] = 10
+    selected = lttb_indices(x, y, 10)
+    assert selected[0] == 0 and selected[-1] == 99 and 37 in selected
+    assert 37 in minmax_indices(x, y, 10)
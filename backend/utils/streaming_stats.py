@@ -0,0 +1,115 @@
+"""
+Chunked streaming statistics for large signal arrays.
+
+Mean/variance are merged chunk by chunk (Chan et al. parallel Welford), so a
+signal of any length is summarized with memory bounded by the chunk size:
+non-finite samples (NaN, +/-inf) are dropped per chunk and no full-length
+copy is ever made. Arrays can be in-memory or memory-mapped
+(np.load(..., mmap_mode="r") / a .npy path), in which case only the pages of
+the current chunk are read.
+"""
+import math
+from typing import Dict, Iterator, Optional, Union
+
+import numpy as np
+
+DEFAULT_CHUNK_SIZE = 1 << 20  # samples per chunk (8 MB of float64)
+
+ArrayLike = Union[np.ndarray, str]
+
+
+class RunningStats:
+    """Count, mean, M2, min and max of a stream of values, ignoring NaN and +/-inf."""
+
+    __slots__ = ("count", "mean", "m2", "min", "max", "nonfinite_count")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.nonfinite_count = 0
+
+    def update(self, chunk: np.ndarray) -> "RunningStats":
+        """Fold one chunk of values into the running statistics."""
+        chunk = np.asarray(chunk, dtype=float).reshape(-1)
+        finite = chunk[np.isfinite(chunk)]
+        self.nonfinite_count += chunk.size - finite.size
+        if finite.size == 0:
+            return self
+
+        other = RunningStats()
+        other.count = finite.size
+        other.mean = float(finite.mean())
+        other.m2 = float(np.square(finite - other.mean).sum())
+        other.min = float(finite.min())
+        other.max = float(finite.max())
+        return self.merge(other)
+
+    def merge(self, other: "RunningStats") -> "RunningStats":
+        """Combine with statistics computed over a disjoint set of values."""
+        self.nonfinite_count += other.nonfinite_count
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            return self
+
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self) -> Optional[float]:
+        """Population variance (matches np.var / np.std defaults)."""
+        return self.m2 / self.count if self.count else None
+
+    @property
+    def std(self) -> Optional[float]:
+        variance = self.variance
+        return math.sqrt(variance) if variance is not None else None
+
+    def to_dict(self) -> Dict[str, Optional[float]]:
+        empty = self.count == 0
+        return {
+            "count": self.count,
+            "mean": None if empty else self.mean,
+            "std": self.std,
+            "min": None if empty else self.min,
+            "max": None if empty else self.max,
+            "nonfinite_count": self.nonfinite_count,
+        }
+
+
+def open_signal(source: ArrayLike) -> np.ndarray:
+    """Return `source` as an array; .npy paths are memory-mapped read-only."""
+    if isinstance(source, str):
+        return np.load(source, mmap_mode="r")
+    return source
+
+
+def iter_chunks(arr: np.ndarray, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[np.ndarray]:
+    """Yield consecutive flattened slices of at most chunk_size samples."""
+    arr = open_signal(arr)
+    if arr.ndim > 1:
+        # (n, 1) sensor columns: chunk along rows so memmaps stay contiguous
+        rows = max(1, chunk_size // max(1, int(np.prod(arr.shape[1:]))))
+    else:
+        rows = chunk_size
+    for start in range(0, arr.shape[0], rows):
+        yield np.asarray(arr[start:start + rows]).reshape(-1)
+
+
+def running_stats(arr: ArrayLike, chunk_size: int = DEFAULT_CHUNK_SIZE) -> RunningStats:
+    """Single pass over `arr` in chunks."""
+    stats = RunningStats()
+    for chunk in iter_chunks(arr, chunk_size):
+        stats.update(chunk)
+    return stats
@@ -0,0 +1,310 @@
+"""
+Live wearable uploads: binary chunk decoding, bounded ingestion queues and
+incremental PWI updates.
+
+A request body holds one or more frames back to back. Each frame is a fixed
+little-endian header, the channel name and the (optionally compressed) samples:
+
+    magic      4s   b"PWU1"
+    version    B    1
+    dtype      B    1 = float32, 2 = float16, 3 = float64 (little-endian)
+    codec      B    0 = raw, 1 = gzip, 2 = zstd (needs the zstandard package)
+    name_len   B    length of the ASCII channel name
+    rate       f    sample rate (Hz)
+    start      d    time of the first sample (unix seconds, within MAX_CLOCK_SKEW_S of server time)
+    samples    I    number of samples
+    size       I    payload bytes as sent (after compression)
+    name       name_len bytes, e.g. "ECG", "EDA", "BVP", "Temp", "Resp"
+    payload    size bytes
+
+Payloads are decoded with np.frombuffer (no copy), appended to the subject's
+ring buffers (backend/signal_buffers.py) by worker threads, and every time all
+active channels cover a new UPLOAD_WINDOW_S window, its features are extracted
+with the same code as offline ingestion and folded into the streaming state
+(ingest_feature_windows); completed time buckets of raw samples are stored
+compactly by backend/raw_signal_store.py. Subjects are sharded over the
+workers so each subject's chunks stay in order; when a shard's queue is full
+the upload is rejected and the client retries later (backpressure).
+"""
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from backend.feature_windows import extract_feature_matrix, segment_lf_hf
+from backend.physio_signals import DEFAULT_HOP_S, DEFAULT_WINDOW_S, LF_HF_WINDOW_S
+from backend.raw_signal_store import ensure_raw_indexes, flush_raw_buckets
+from backend.signal_buffers import BUFFER_SECONDS, add_eviction_listener, append_samples, subject_buffers
+from backend.stress_events import ensure_event_indexes
+from backend.wellness_stream import ingest_feature_windows
+
+try:
+    import zstandard
+except ImportError:  # optional: zstd frames are rejected without it
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+FRAME_MAGIC = b"PWU1"
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct("<4sBBBBfdII")
+FRAME_DTYPES = {1: np.dtype("<f4"), 2: np.dtype("<f2"), 3: np.dtype("<f8")}
+CODEC_RAW, CODEC_GZIP, CODEC_ZSTD = 0, 1, 2
+
+# Channel names accepted in uploads (case-insensitive) -> sensor name used by feature extraction
+UPLOAD_CHANNELS = {name.lower(): name for name in ("EDA", "ECG", "EMG", "BVP", "Resp", "Temp")}
+MAX_SAMPLE_RATE = 2000.0
+MAX_UPLOAD_BYTES = int(os.getenv("WEARABLE_MAX_UPLOAD_BYTES", str(8 << 20)))
+MAX_DECODED_BYTES = int(os.getenv("WEARABLE_MAX_DECODED_BYTES", str(32 << 20)))
+
+UPLOAD_WINDOW_S = DEFAULT_WINDOW_S
+UPLOAD_HOP_S = DEFAULT_HOP_S
+# A window is scored without a lagging channel once another channel is this far past it
+MAX_CHANNEL_LAG_S = DEFAULT_WINDOW_S
+# Windows scored per upload at most (a full buffer holds about BUFFER_SECONDS / UPLOAD_HOP_S)
+MAX_WINDOWS_PER_UPDATE = int(os.getenv("WEARABLE_MAX_WINDOWS_PER_UPDATE", "16"))
+
+# Frames starting further than this from server time are rejected (e.g. a clock
+# sending milliseconds), so one bad clock cannot make a worker walk years of windows
+MAX_CLOCK_SKEW_S = float(os.getenv("WEARABLE_MAX_CLOCK_SKEW_S", "86400"))
+
+UPLOAD_WORKERS = int(os.getenv("WEARABLE_UPLOAD_WORKERS", "2"))
+UPLOAD_QUEUE_SIZE = int(os.getenv("WEARABLE_UPLOAD_QUEUE_SIZE", "256"))
+
+
+class UploadError(ValueError):
+    """Malformed or unsupported upload; `status_code` is the HTTP status to return."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class SignalChunk(NamedTuple):
+    channel: str
+    sample_rate: float
+    start_time: float
+    samples: np.ndarray
+
+
+def _decompress(payload: bytes, codec: int, limit: int) -> bytes:
+    """Decompress one payload, refusing anything that inflates past `limit` bytes."""
+    if codec == CODEC_RAW:
+        return payload
+    if codec == CODEC_GZIP:
+        inflater = zlib.decompressobj(wbits=47)  # gzip or zlib header
+        try:
+            data = inflater.decompress(payload, limit)
+        except zlib.error as e:
+            raise UploadError(f"Invalid gzip payload: {e}")
+        if inflater.unconsumed_tail:
+            raise UploadError("Decoded payload too large", status_code=413)
+        return data
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise UploadError("zstd uploads need the zstandard package; use gzip", status_code=415)
+        try:
+            reader = zstandard.ZstdDecompressor().stream_reader(payload)
+            data = reader.read(limit + 1)
+        except zstandard.ZstdError as e:
+            raise UploadError(f"Invalid zstd payload: {e}")
+        if len(data) > limit:
+            raise UploadError("Decoded payload too large", status_code=413)
+        return data
+    raise UploadError(f"Unknown codec {codec}", status_code=415)
+
+
+def parse_frames(body: bytes) -> List[SignalChunk]:
+    """
+    Decode every frame of an upload body.
+
+    Raises:
+        UploadError: malformed frames, unknown channels/dtypes/codecs, or oversized payloads
+    """
+    if len(body) > MAX_UPLOAD_BYTES:
+        raise UploadError("Upload too large", status_code=413)
+    view = memoryview(body)
+    now = time.time()
+    chunks = []
+    decoded = 0
+    offset = 0
+    while offset < len(view):
+        if len(view) - offset < FRAME_HEADER.size:
+            raise UploadError("Truncated frame header")
+        magic, version, dtype_code, codec, name_len, rate, start, n_samples, size = FRAME_HEADER.unpack_from(view, offset)
+        if magic != FRAME_MAGIC or version != FRAME_VERSION:
+            raise UploadError("Not a wearable upload frame (bad magic or version)")
+        offset += FRAME_HEADER.size
+        if len(view) - offset < name_len + size:
+            raise UploadError("Truncated frame payload")
+
+        name = bytes(view[offset:offset + name_len]).decode("ascii", errors="replace")
+        channel = UPLOAD_CHANNELS.get(name.lower())
+        if channel is None:
+            raise UploadError(f"Unknown channel {name!r}")
+        dtype = FRAME_DTYPES.get(dtype_code)
+        if dtype is None:
+            raise UploadError(f"Unknown dtype code {dtype_code}")
+        if not (0 < rate <= MAX_SAMPLE_RATE) or not np.isfinite(start):
+            raise UploadError(f"Invalid sample rate or start time for {channel}")
+        if abs(start - now) > MAX_CLOCK_SKEW_S:
+            raise UploadError(f"{channel}: start time is more than {MAX_CLOCK_SKEW_S:g} s from server time")
+        offset += name_len
+
+        expected = n_samples * dtype.itemsize
+        decoded += expected
+        if decoded > MAX_DECODED_BYTES:
+            raise UploadError("Decoded upload too large", status_code=413)
+        payload = _decompress(view[offset:offset + size], codec, expected)
+        offset += size
+        if len(payload) != expected:
+            raise UploadError(f"{channel}: expected {n_samples} samples, got {len(payload) // dtype.itemsize}")
+        chunks.append(SignalChunk(channel, float(rate), float(start), np.frombuffer(payload, dtype=dtype)))
+    if not chunks:
+        raise UploadError("Empty upload")
+    return chunks
+
+
+# -----------------------------
+# Incremental windows
+# -----------------------------
+_next_window_end: Dict[str, float] = {}
+
+# Evicted buffers restart from their oldest sample anyway
+add_eviction_listener(lambda subject_id: _next_window_end.pop(subject_id, None))
+
+
+def window_features(subject_id: str, end_time: float) -> Optional[Dict[str, float]]:
+    """PWI features of the UPLOAD_WINDOW_S window ending at end_time, computed on zero-copy buffer views."""
+    start_time = end_time - UPLOAD_WINDOW_S
+    signals, sample_rates = {}, {}
+    for channel, buffer in subject_buffers(subject_id).items():
+        segment = buffer.window(start_time, end_time)
+        if segment is not None:
+            signals[channel], sample_rates[channel] = segment, buffer.sample_rate
+    matrix = extract_feature_matrix(signals, sample_rates, UPLOAD_WINDOW_S, UPLOAD_WINDOW_S) if signals else None
+    if matrix is None:
+        return None
+    features = dict(zip(matrix["names"], matrix["values"][0].tolist()))
+    # LF/HF needs a longer RR span than the window: take it from the ECG history
+    ecg = subject_buffers(subject_id).get("ECG")
+    span_s = max(UPLOAD_WINDOW_S, LF_HF_WINDOW_S)
+    segment = ecg.window(end_time - span_s, end_time) if ecg is not None else None
+    features["lf_hf"] = segment_lf_hf(segment, ecg.sample_rate) if segment is not None else float("nan")
+    return {name: value for name, value in features.items() if not np.isnan(value)}
+
+
+def advance_windows(subject_id: str) -> Optional[dict]:
+    """
+    Score every complete window not seen yet and fold them into the streaming
+    state as one batch (one write per upload).
+
+    Windows no longer buffered are skipped, and at most MAX_WINDOWS_PER_UPDATE
+    are scored per call (the rest on the next upload).
+
+    Returns:
+        The latest snapshot, or None when no new window was complete
+    """
+    buffers = subject_buffers(subject_id)
+    if not buffers:
+        return None
+    ends = [b.end_time for b in buffers.values() if b.end_time is not None]
+    starts = [b.start_time for b in buffers.values() if b.start_time is not None]
+    if not ends:
+        return None
+    newest = max(ends)
+    # After a gap (or on the first upload) start from the oldest buffered sample
+    next_end = max(_next_window_end.get(subject_id, 0.0), min(starts) + UPLOAD_WINDOW_S)
+    # ...but never before the oldest window still buffered, staying on the hop grid
+    oldest_end = newest - BUFFER_SECONDS + UPLOAD_WINDOW_S
+    if next_end < oldest_end:
+        next_end += float(np.ceil((oldest_end - next_end) / UPLOAD_HOP_S)) * UPLOAD_HOP_S
+
+    windows = []
+    scored = 0
+    while newest >= next_end and scored < MAX_WINDOWS_PER_UPDATE:
+        if min(ends) < next_end and newest < next_end + MAX_CHANNEL_LAG_S:
+            break  # wait for lagging channels
+        scored += 1
+        features = window_features(subject_id, next_end)
+        if features:
+            windows.append({"timestamp": datetime.utcfromtimestamp(next_end), "features": features})
+        next_end += UPLOAD_HOP_S
+    _next_window_end[subject_id] = next_end
+    return ingest_feature_windows(subject_id, windows) if windows else None
+
+
+def ingest_chunks(subject_id: str, chunks: List[SignalChunk]) -> Optional[dict]:
+    """
+    Append decoded chunks to the subject's ring buffers, update the PWI for
+    completed windows and store completed raw buckets.
+    """
+    for chunk in chunks:
+        append_samples(subject_id, chunk.channel, chunk.samples, chunk.sample_rate, chunk.start_time)
+    snapshot = advance_windows(subject_id)
+    try:
+        flush_raw_buckets(subject_id)
+    except Exception:
+        # MongoDB unavailable - the live PWI does not depend on the raw store
+        logger.exception(f"Could not store raw buckets for {subject_id}")
+    return snapshot
+
+
+# -----------------------------
+# Bounded queues (backpressure)
+# -----------------------------
+_queues: List[queue.Queue] = []
+_workers_lock = threading.Lock()
+
+
+def _shard(subject_id: str) -> queue.Queue:
+    return _queues[zlib.crc32(subject_id.encode()) % len(_queues)]
+
+
+def _worker(jobs: queue.Queue) -> None:
+    while True:
+        subject_id, chunks = jobs.get()
+        try:
+            ingest_chunks(subject_id, chunks)
+        except Exception:
+            logger.exception(f"Wearable upload processing failed for {subject_id}")
+        finally:
+            jobs.task_done()
+
+
+def start_upload_workers(workers: int = UPLOAD_WORKERS, queue_size: int = UPLOAD_QUEUE_SIZE) -> None:
+    """Start the ingestion worker threads (once per process)."""
+    with _workers_lock:
+        if _queues:
+            return
+        try:
+            ensure_raw_indexes()
+            ensure_event_indexes()
+        except Exception:
+            logger.exception("Could not create raw signal / stress event indexes")
+        for i in range(max(1, workers)):
+            jobs = queue.Queue(maxsize=queue_size)
+            _queues.append(jobs)
+            threading.Thread(target=_worker, args=(jobs,), name=f"wearable-upload-{i}", daemon=True).start()
+
+
+def enqueue_upload(subject_id: str, chunks: List[SignalChunk]) -> bool:
+    """Queue decoded chunks for ingestion; False when the subject's queue is full."""
+    if not _queues:
+        start_upload_workers()
+    try:
+        _shard(subject_id).put_nowait((subject_id, chunks))
+        return True
+    except queue.Full:
+        return False
+
+
+def queue_depths() -> List[int]:
+    return [jobs.qsize() for jobs in _queues]
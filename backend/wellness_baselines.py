@@ -0,0 +1,291 @@
+"""
+Time-windowed (rolling) baselines from time-indexed feature windows.
+
+Feature windows land in `wearable_windows` (indexed on subject_id + timestamp)
+and are merged into per-day running sums (`wearable_baseline_sums`: count,
+sum and sum of squares per feature) with a single $inc per day bucket. A
+rolling N-day baseline is then a server-side $group over at most N bucket
+documents, never over the full window history.
+
+The refresher (start_baseline_refresher) periodically recomputes rolling
+baselines for subjects whose buckets changed, and for subjects whose rolling
+baselines are older than ROLLING_MAX_AGE (so days that aged out of the window
+drop out even without new data), and stores them under `rolling.<N>d` in
+wearable_baselines, where get_or_compute_baseline picks them up.
+"""
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+from backend.wellness_cache import invalidate_subject
+from backend.wellness_fusion import PWI_FEATURES, db, wearable_baselines
+
+logger = logging.getLogger(__name__)
+
+wearable_windows = db["wearable_windows"]
+baseline_sums = db["wearable_baseline_sums"]
+
+ROLLING_WINDOW_DAYS = (7, 30)
+# Rolling baselines slide by whole days; refresh them at least this often
+ROLLING_MAX_AGE = timedelta(days=1)
+DAY_FORMAT = "%Y-%m-%d"
+
+_refresh_lock = threading.Lock()
+_last_refresh: Optional[datetime] = None
+
+
+def ensure_baseline_indexes() -> None:
+    wearable_windows.create_index([("subject_id", ASCENDING), ("timestamp", DESCENDING)])
+    baseline_sums.create_index([("subject_id", ASCENDING), ("day", ASCENDING)], unique=True)
+    baseline_sums.create_index([("updated_at", ASCENDING)])
+
+
+def _day_key(timestamp: datetime) -> str:
+    return timestamp.strftime(DAY_FORMAT)
+
+
+def _window_doc(subject_id: str, window: dict, source: str, now: datetime) -> dict:
+    return {
+        "subject_id": subject_id,
+        "timestamp": window.get("timestamp") or now,
+        # PWI inputs are always present (None when missing); extra per-window features are kept as-is
+        "features": {**{name: None for name in PWI_FEATURES}, **(window.get("features") or {})},
+        "pwi": window.get("pwi"),
+        "source": source,
+    }
+
+
+def record_feature_windows(
+    subject_id: str,
+    windows: Iterable[dict],
+    store_windows: bool = True,
+    source: str = "stream",
+) -> int:
+    """
+    Store feature windows and merge them into the per-day running sums.
+
+    Each window is {"timestamp": datetime, "features": {...}, "pwi": optional float}.
+
+    Returns:
+        Number of windows recorded
+    """
+    now = datetime.utcnow()
+    docs = [_window_doc(subject_id, window, source, now) for window in windows]
+    if not docs:
+        return 0
+    if store_windows:
+        wearable_windows.insert_many(docs, ordered=False)
+    _merge_day_sums(subject_id, docs, now)
+    return len(docs)
+
+
+def _merge_day_sums(subject_id: str, docs: List[dict], now: datetime) -> None:
+    """$inc the per-day running sums with a batch of window documents."""
+    increments: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    for doc in docs:
+        bucket = increments[_day_key(doc["timestamp"])]
+        for name in PWI_FEATURES:
+            value = doc["features"][name]
+            if value is None:
+                continue
+            bucket[f"n.{name}"] += 1
+            bucket[f"sum.{name}"] += value
+            bucket[f"sumsq.{name}"] += value * value
+
+    operations = [
+        UpdateOne(
+            {"subject_id": subject_id, "day": day},
+            {"$inc": dict(inc), "$set": {"updated_at": now}},
+            upsert=True,
+        )
+        for day, inc in increments.items()
+        if inc
+    ]
+    if operations:
+        baseline_sums.bulk_write(operations, ordered=False)
+
+
+def _rolling_pipeline(subject_ids: List[str], window_days: int, now: datetime) -> list:
+    cutoff = _day_key(now - timedelta(days=window_days - 1))
+    group = {"_id": "$subject_id"}
+    project = {"_id": 0, "subject_id": "$_id"}
+    for name in PWI_FEATURES:
+        n, total, total_sq = f"n_{name}", f"s_{name}", f"ss_{name}"
+        group[n] = {"$sum": f"$n.{name}"}
+        group[total] = {"$sum": f"$sum.{name}"}
+        group[total_sq] = {"$sum": f"$sumsq.{name}"}
+        mean = {"$divide": [f"${total}", f"${n}"]}
+        variance = {"$subtract": [{"$divide": [f"${total_sq}", f"${n}"]}, {"$multiply": [mean, mean]}]}
+        project[name] = {
+            "count": f"${n}",
+            "mean": {"$cond": [{"$gt": [f"${n}", 0]}, mean, None]},
+            "std": {"$cond": [{"$gt": [f"${n}", 1]}, {"$sqrt": {"$max": [variance, 0]}}, None]},
+        }
+    return [
+        {"$match": {"subject_id": {"$in": subject_ids}, "day": {"$gte": cutoff}}},
+        {"$group": group},
+        {"$project": project},
+    ]
+
+
+def compute_rolling_baselines(subject_ids: List[str], window_days: int, now: Optional[datetime] = None) -> Dict[str, dict]:
+    """Rolling mean/std/count per feature over the last `window_days` days, per subject."""
+    if not subject_ids:
+        return {}
+    now = now or datetime.utcnow()
+    results = baseline_sums.aggregate(_rolling_pipeline(list(subject_ids), window_days, now))
+    return {doc.pop("subject_id"): doc for doc in results}
+
+
+def refresh_baselines(subject_ids: List[str], window_days: Iterable[int] = ROLLING_WINDOW_DAYS) -> int:
+    """
+    Recompute and store rolling baselines for the given subjects.
+
+    A window without any day bucket left is removed, so the baseline falls
+    back to the session stats instead of keeping days that aged out.
+    """
+    if not subject_ids:
+        return 0
+    window_days = tuple(window_days)
+    now = datetime.utcnow()
+    updates: Dict[str, dict] = defaultdict(dict)
+    for days in window_days:
+        for subject_id, stats in compute_rolling_baselines(subject_ids, days, now).items():
+            updates[subject_id][f"rolling.{days}d"] = stats
+
+    operations = []
+    for subject_id in subject_ids:
+        fields = updates.get(subject_id, {})
+        update = {"$set": {**fields, "subject_id": subject_id, "rolling_updated_at": now}}
+        expired = {f"rolling.{days}d": "" for days in window_days if f"rolling.{days}d" not in fields}
+        if expired:
+            update["$unset"] = expired
+        operations.append(UpdateOne({"subject_id": subject_id}, update, upsert=bool(fields)))
+    wearable_baselines.bulk_write(operations, ordered=False)
+    for subject_id in subject_ids:
+        invalidate_subject(subject_id)
+    return len(operations)
+
+
+def refresh_changed_baselines() -> int:
+    """
+    Refresh subjects whose day buckets changed since the last run (any writer
+    process) and those whose rolling baselines are older than ROLLING_MAX_AGE.
+    """
+    global _last_refresh
+    with _refresh_lock:
+        started = datetime.utcnow()
+        query = {"updated_at": {"$gte": _last_refresh}} if _last_refresh else {}
+        subject_ids = set(baseline_sums.distinct("subject_id", query))
+        subject_ids.update(
+            wearable_baselines.distinct("subject_id", {"rolling_updated_at": {"$lt": started - ROLLING_MAX_AGE}})
+        )
+        refreshed = refresh_baselines(sorted(subject_ids))
+        _last_refresh = started
+        return refreshed
+
+
+def _day_range(day: str) -> dict:
+    start = datetime.strptime(day, DAY_FORMAT)
+    return {"timestamp": {"$gte": start, "$lt": start + timedelta(days=1)}}
+
+
+def _window_days(query: dict) -> List[str]:
+    """Distinct day keys of the windows matching query."""
+    group = {"$group": {"_id": {"$dateToString": {"format": DAY_FORMAT, "date": "$timestamp"}}}}
+    return sorted(doc["_id"] for doc in wearable_windows.aggregate([{"$match": query}, group]))
+
+
+def rebuild_daily_sums(subject_id: str, days: Optional[List[str]] = None) -> int:
+    """
+    Rebuild a subject's day buckets from raw windows with one $group aggregation.
+
+    Args:
+        days: Only rebuild these day keys (default: the whole history)
+    """
+    match: dict = {"subject_id": subject_id}
+    if days is not None:
+        if not days:
+            return 0
+        match["$or"] = [_day_range(day) for day in days]
+    group = {"_id": {"$dateToString": {"format": DAY_FORMAT, "date": "$timestamp"}}}
+    for name in PWI_FEATURES:
+        value = f"$features.{name}"
+        present = {"$ne": [{"$ifNull": [value, None]}, None]}
+        group[f"n_{name}"] = {"$sum": {"$cond": [present, 1, 0]}}
+        group[f"s_{name}"] = {"$sum": {"$cond": [present, value, 0]}}
+        group[f"ss_{name}"] = {"$sum": {"$cond": [present, {"$multiply": [value, value]}, 0]}}
+    buckets = wearable_windows.aggregate([{"$match": match}, {"$group": group}])
+
+    now = datetime.utcnow()
+    operations = []
+    for bucket in buckets:
+        fields = {"subject_id": subject_id, "day": bucket["_id"], "updated_at": now}
+        for name in PWI_FEATURES:
+            fields[f"n.{name}"] = bucket[f"n_{name}"]
+            fields[f"sum.{name}"] = bucket[f"s_{name}"]
+            fields[f"sumsq.{name}"] = bucket[f"ss_{name}"]
+        operations.append(UpdateOne({"subject_id": subject_id, "day": bucket["_id"]}, {"$set": fields}, upsert=True))
+    stale = {"subject_id": subject_id}
+    if days is not None:
+        stale["day"] = {"$in": list(days)}
+    baseline_sums.delete_many(stale)
+    if operations:
+        baseline_sums.bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def replace_window_sums(subject_id: str, windows: Iterable[dict], source: str = "ingestion") -> List[dict]:
+    """
+    Replace a subject's windows from one source (e.g. a re-ingested recording)
+    in its day buckets, so reruns never double-count.
+
+    The old windows are deleted and only the days they covered are rebuilt
+    from the remaining windows; the new windows are then merged in, and
+    returned but not stored yet: refresh the rolling baselines, score the
+    windows against them, then store them with store_feature_windows.
+
+    Returns:
+        The new window documents
+    """
+    now = datetime.utcnow()
+    docs = [_window_doc(subject_id, window, source, now) for window in windows]
+    replaced = {"subject_id": subject_id, "source": source}
+    days = _window_days(replaced)
+    wearable_windows.delete_many(replaced)
+    rebuild_daily_sums(subject_id, days)
+    if docs:
+        _merge_day_sums(subject_id, docs, now)
+    return docs
+
+
+def store_feature_windows(docs: List[dict]) -> int:
+    """Insert window documents prepared by replace_window_sums."""
+    if docs:
+        wearable_windows.insert_many(docs, ordered=False)
+    return len(docs)
+
+
+def start_baseline_refresher(interval_s: float = 900.0) -> threading.Event:
+    """Run refresh_changed_baselines every `interval_s` seconds in a daemon thread."""
+    stop = threading.Event()
+
+    def loop():
+        try:
+            ensure_baseline_indexes()
+        except Exception:
+            logger.exception("Could not create baseline indexes")
+        while not stop.wait(interval_s):
+            try:
+                refreshed = refresh_changed_baselines()
+                if refreshed:
+                    logger.info(f"Refreshed rolling baselines for {refreshed} subjects")
+            except Exception:
+                logger.exception("Rolling baseline refresh failed")
+
+    threading.Thread(target=loop, name="baseline-refresher", daemon=True).start()
+    return stop
@@ -0,0 +1,93 @@
+"""
+In-process per-subject cache for wellness lookups.
+
+compute_pwi runs on every chat message, but wearable data only changes when an
+ingestion path writes it. Baselines and PWI results are cached per subject with
+a TTL. Subjects without wearable data (or lookups that failed because MongoDB
+was unreachable) are cached as negative entries with a shorter TTL, so they stop
+paying for the same failed round-trips on every message.
+
+Ingestion code calls invalidate_subject() after writing a subject. Writers in
+another process (e.g. the wearable_preprocess CLI) are picked up by the server
+once the TTL expires.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Tuple
+
+CACHE_TTL_SECONDS = float(os.getenv("WELLNESS_CACHE_TTL", "300"))
+NEGATIVE_TTL_SECONDS = float(os.getenv("WELLNESS_NEGATIVE_TTL", "60"))
+CACHE_MAX_ENTRIES = int(os.getenv("WELLNESS_CACHE_MAX_ENTRIES", "10000"))
+
+
+class TTLCache:
+    """Thread-safe TTL cache with negative entries and a bounded size."""
+
+    def __init__(self, name: str, ttl: float = CACHE_TTL_SECONDS,
+                 negative_ttl: float = NEGATIVE_TTL_SECONDS, max_entries: int = CACHE_MAX_ENTRIES):
+        self.name = name
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any, bool]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "negative_hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Return (hit, value). Negative entries are hits whose value was stored as negative."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self._stats["misses"] += 1
+                return False, None
+            self._stats["negative_hits" if entry[2] else "hits"] += 1
+            return True, entry[1]
+
+    def set(self, key: Hashable, value: Any, negative: bool = False) -> None:
+        ttl = self.negative_ttl if negative else self.ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + ttl, value, negative)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stats["invalidations"] += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"name": self.name, "size": len(self._entries), **self._stats}
+
+
+baseline_cache = TTLCache("wellness_baselines")
+pwi_cache = TTLCache("wellness_pwi")
+
+
+def invalidate_subject(subject_id: str) -> None:
+    """Drop every cached wellness entry for a subject (call after ingestion writes)."""
+    baseline_cache.invalidate(subject_id)
+    pwi_cache.invalidate(subject_id)
+
+
+def clear_all() -> None:
+    baseline_cache.clear()
+    pwi_cache.clear()
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    return {"baselines": baseline_cache.stats(), "pwi": pwi_cache.stats()}
@@ -0,0 +1,173 @@
+"""
+Cohort (bulk) PWI computation for clinician dashboards.
+
+Serves the same PWI as compute_pwi: materialized snapshots of the current
+scoring version (ingestion, streaming EMA, rolling-baseline recomputes) are
+loaded with one $in query and returned as stored. Only subjects without one
+are scored here: features and baselines come from a single aggregation
+($lookup joins wearable_baselines server-side) and the rest of the cohort is
+scored as NumPy array operations via score_feature_matrix, instead of one
+compute_pwi call (and its Mongo reads) per patient.
+"""
+import re
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from backend.wellness_fusion import (
+    DEFAULT_BASELINE_WINDOW_DAYS,
+    FEATURE_SOURCES,
+    PWI_FEATURES,
+    apply_rolling_baseline,
+    feature_stats,
+    score_feature_matrix,
+    scoring_version,
+    wearable_data,
+    wearable_baselines,
+    wellness_snapshots,
+)
+
+MAX_COHORT_SIZE = 5000
+
+
+def _subject_match(subject_ids: Optional[List[str]], subject_prefix: Optional[str]) -> Dict:
+    if subject_ids:
+        return {"$in": list(subject_ids)}
+    if subject_prefix:
+        return {"$regex": f"^{re.escape(subject_prefix)}"}
+    return {}
+
+
+def _load_snapshots(subject_match: Dict, limit: int) -> List[dict]:
+    """Current-version snapshots (what compute_pwi serves first) of the selected subjects."""
+    query = {"scoring_version": scoring_version(), "snapshot.pwi": {"$ne": None}}
+    if subject_match:
+        query["subject_id"] = subject_match
+    cursor = wellness_snapshots.find(query, {"_id": 0, "snapshot": 1}, max_time_ms=10000).limit(limit)
+    return [doc["snapshot"] for doc in cursor if doc.get("snapshot")]
+
+
+def _cohort_pipeline(subject_match: Dict, exclude: List[str], limit: int) -> list:
+    match: Dict = {}
+    if subject_match or exclude:
+        match["subject_id"] = {**subject_match, **({"$nin": exclude} if exclude else {})}
+
+    field_paths = PWI_FEATURES + [".".join(path) for path in FEATURE_SOURCES.values()]
+    feature_fields = {f"{path}.{stat}": 1 for path in field_paths for stat in ("mean", "std")}
+    baseline_fields = {f"baseline.{path}": 1 for path in feature_fields}
+    baseline_fields[f"baseline.rolling.{DEFAULT_BASELINE_WINDOW_DAYS}d"] = 1
+    # apply_rolling_baseline keeps label-derived baselines as they are
+    baseline_fields["baseline.baseline_source"] = 1
+    return [
+        {"$match": match},
+        {"$limit": limit},
+        {
+            "$lookup": {
+                "from": wearable_baselines.name,
+                "localField": "subject_id",
+                "foreignField": "subject_id",
+                "as": "baseline",
+            }
+        },
+        {"$project": {"_id": 0, "subject_id": 1, **feature_fields, "baseline": {"$arrayElemAt": ["$baseline", 0]}}},
+        {"$project": {"subject_id": 1, **feature_fields, **baseline_fields}},
+    ]
+
+
+def _stat_matrix(docs: List[dict], stat: str, nested: Optional[str] = None) -> np.ndarray:
+    """(n_subjects, n_features) matrix of one statistic, NaN where missing."""
+    sources = [(doc.get(nested) or {}) if nested else doc for doc in docs]
+    # dtype=float turns missing (None) statistics into NaN in the same build
+    values = [(feature_stats(source, name) or {}).get(stat) for source in sources for name in PWI_FEATURES]
+    return np.array(values, dtype=float).reshape(len(docs), len(PWI_FEATURES))
+
+
+def compute_cohort_pwi(
+    subject_ids: Optional[List[str]] = None,
+    subject_prefix: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = MAX_COHORT_SIZE,
+    use_snapshots: bool = True,
+) -> dict:
+    """
+    PWI for a cohort of subjects: stored snapshots first, the rest in one query and one vectorized pass.
+
+    Args:
+        subject_ids: Explicit list of subjects (takes precedence over subject_prefix)
+        subject_prefix: Select every subject whose id starts with this prefix
+        status: Only return subjects with this wellness status
+        limit: Maximum number of subjects to load
+        use_snapshots: Serve current-version snapshots like compute_pwi
+            (False scores every subject from its features, as recompute_snapshots needs)
+
+    Returns:
+        dict with count, per-status summary and per-subject results
+    """
+    limit = max(1, min(limit, MAX_COHORT_SIZE))
+    timestamp = datetime.utcnow().isoformat()
+    subject_match = _subject_match(subject_ids, subject_prefix)
+    results = []
+    docs = []
+    try:
+        if use_snapshots:
+            results = _load_snapshots(subject_match, limit)
+        remaining = limit - len(results)
+        if remaining > 0:
+            pipeline = _cohort_pipeline(subject_match, [result["subject_id"] for result in results], remaining)
+            docs = list(wearable_data.aggregate(pipeline, maxTimeMS=10000))
+    except Exception:
+        # MongoDB unavailable - report every requested subject as missing
+        results, docs = [], []
+
+    if docs:
+        for doc in docs:
+            doc["baseline"] = apply_rolling_baseline(doc.get("baseline"))
+        values = _stat_matrix(docs, "mean")
+        # Subjects without a stored baseline are scored against their own features,
+        # mirroring get_or_compute_baseline's fallback
+        means = _stat_matrix(docs, "mean", nested="baseline")
+        stds = _stat_matrix(docs, "std", nested="baseline")
+        no_baseline = np.isnan(means).all(axis=1)
+        means[no_baseline] = values[no_baseline]
+        stds[no_baseline] = _stat_matrix(docs, "std")[no_baseline]
+
+        pwi, statuses, normalized = score_feature_matrix(values, means, stds)
+        has_data = ~np.isnan(values).all(axis=1)
+
+        feature_rows = np.round(values, 3).tolist()
+        normalized_rows = np.round(normalized, 3).tolist()
+        for doc, row_pwi, row_status, row_values, row_norm, ok in zip(
+            docs, np.round(pwi, 2).tolist(), statuses.tolist(), feature_rows, normalized_rows, has_data.tolist()
+        ):
+            if not ok:
+                results.append({"subject_id": doc["subject_id"], "pwi": None, "status": "Unknown (No Data)"})
+                continue
+            results.append({
+                "subject_id": doc["subject_id"],
+                "pwi": row_pwi,
+                "status": row_status,
+                "features": {
+                    name: (None if np.isnan(value) else value) for name, value in zip(PWI_FEATURES, row_values)
+                },
+                "normalized_features": dict(zip(PWI_FEATURES, row_norm)),
+            })
+
+    if subject_ids:
+        found = {result["subject_id"] for result in results}
+        results.extend(
+            {"subject_id": subject_id, "pwi": None, "status": "Unknown (No Data)"}
+            for subject_id in subject_ids
+            if subject_id not in found
+        )
+
+    if status:
+        results = [result for result in results if result["status"] == status]
+
+    return {
+        "count": len(results),
+        "summary": dict(Counter(result["status"] for result in results)),
+        "results": results,
+        "timestamp": timestamp,
+    }
@@ -1,21 +1,45 @@
+import hashlib
+import json
 import numpy as np
 from datetime import datetime
 from database.db_connection import get_database
+from backend.physio_signals import EDA_SAMPLE_RATE, compute_rmssd, detect_r_peaks, detect_scrs, rr_intervals
+from backend.wellness_cache import baseline_cache, pwi_cache
 
 # Connect to MongoDB
 db = get_database()
 wearable_data = db["wearable_data"]
 wearable_baselines = db["wearable_baselines"]
+wellness_state = db["wellness_state"]
+wellness_snapshots = db["wellness_snapshots"]
 
 # Feature weights (tunable)
+# Stress weights sum to 0.6 and calm weights to 0.4, so neutral inputs score 50
 FEATURE_WEIGHTS = {
-    "eda": 0.25,
-    "temp": 0.15,
-    "bvp": 0.20,
-    "ecg": 0.20,
-    "resp": 0.20,
+    "eda": 0.20,
+    "temp": 0.10,
+    "bvp": 0.15,
+    "ecg": 0.25,
+    "resp": 0.05,
+    "resp_rate": 0.10,
+    "pulse_rate": 0.05,
+    "lf_hf": 0.10,
 }
 
+# Order of the PWI inputs; calm indicators are normalized inversely
+PWI_FEATURES = ["eda", "temp", "bvp", "ecg", "resp", "resp_rate", "pulse_rate", "lf_hf"]
+CALM_FEATURES = {"bvp", "ecg"}
+
+# PWI inputs read from another document field when ingestion stored it:
+# the "ecg" input uses HRV RMSSD from R-peak detection instead of the raw ECG mean,
+# "lf_hf" the spectral LF/HF ratio of the RR series
+FEATURE_SOURCES = {"ecg": ("hrv", "rmssd"), "lf_hf": ("hrv", "lf_hf")}
+
+# Rolling baselines (backend.wellness_baselines) replace session stats once they cover enough windows;
+# baselines from the labelled baseline condition are never replaced (rolling stats include stress windows)
+DEFAULT_BASELINE_WINDOW_DAYS = 7
+MIN_ROLLING_WINDOWS = 30
+
 # EMA smoothing factor (alpha)
 EMA_ALPHA = 0.3
 
@@ -44,58 +68,126 @@ def safe_std(value_dict):
     return None
 
 
+def feature_stats(doc, name):
+    """Return the {"mean", "std"} stats a features/baseline document holds for a PWI input."""
+    if not isinstance(doc, dict):
+        return None
+    source = FEATURE_SOURCES.get(name)
+    if source:
+        stats = doc
+        for key in source:
+            stats = stats.get(key) if isinstance(stats, dict) else None
+        if isinstance(stats, dict) and stats.get("mean") is not None:
+            return stats
+    return doc.get(name)
+
+
 def compute_hrv_rmssd(ecg_signal, sampling_rate=700):
-    """Compute HRV RMSSD from ECG signal (simplified)."""
+    """Compute HRV RMSSD (ms) from an ECG signal via R-peak detection."""
     if ecg_signal is None or len(ecg_signal) < 2:
         return None
     try:
-        # Simplified: use std of signal as proxy for HRV
-        # In production, would detect R-peaks and compute RR intervals
-        return float(np.std(ecg_signal))
+        peaks = detect_r_peaks(ecg_signal, fs=sampling_rate)
+        rr, _, valid = rr_intervals(peaks, fs=sampling_rate)
+        return compute_rmssd(rr, valid)
     except Exception:
         return None
 
 
-def compute_eda_peaks(eda_signal, threshold_percentile=75):
-    """Count EDA peaks above threshold (simplified)."""
+def compute_eda_peaks(eda_signal, sampling_rate=EDA_SAMPLE_RATE):
+    """SCR rate (responses per minute) from EDA via tonic/phasic SCR detection."""
     if eda_signal is None or len(eda_signal) < 10:
         return None
     try:
-        threshold = np.percentile(eda_signal, threshold_percentile)
-        peaks = np.sum(eda_signal > threshold)
-        return float(peaks / len(eda_signal))  # Normalized peak rate
+        scrs = detect_scrs(eda_signal, fs=sampling_rate)
+        minutes = len(eda_signal) / sampling_rate / 60.0
+        return float(scrs["peaks"].size / minutes)
     except Exception:
         return None
 
 
-def get_or_compute_baseline(subject_id: str, window_days: int = 7):
-    """Get baseline stats for subject, or compute from historical data."""
+def apply_rolling_baseline(baseline, window_days: int = DEFAULT_BASELINE_WINDOW_DAYS):
+    """
+    Overlay the stored rolling N-day stats on a baseline document, per feature.
+
+    Label-derived baselines (baseline_source == "label") are returned as-is:
+    they are the baseline-condition-only reference, while rolling stats mix
+    in every window of the session.
+    """
+    if not baseline or baseline.get("baseline_source") == "label":
+        return baseline
+    rolling = (baseline.get("rolling") or {}).get(f"{window_days}d")
+    if not rolling:
+        return baseline
+
+    merged = dict(baseline)
+    for name in PWI_FEATURES:
+        stats = rolling.get(name)
+        if not stats or stats.get("mean") is None or (stats.get("count") or 0) < MIN_ROLLING_WINDOWS:
+            continue
+        source = FEATURE_SOURCES.get(name)
+        if source:
+            # Write at the source path so feature_stats() resolves to the rolling stats
+            parent_key, child_key = source
+            merged[parent_key] = {**(merged.get(parent_key) or {}), child_key: stats}
+        else:
+            merged[name] = stats
+    return merged
+
+
+def resolve_baselines(subject_ids, window_days: int = DEFAULT_BASELINE_WINDOW_DAYS):
+    """
+    Stored baselines of many subjects as every PWI scorer sees them (rolling stats applied).
+
+    Returns:
+        subject_id -> baseline; subjects without a stored baseline are absent
+    """
+    docs = wearable_baselines.find({"subject_id": {"$in": list(subject_ids)}})
+    return {doc["subject_id"]: apply_rolling_baseline(doc, window_days) for doc in docs}
+
+
+def get_or_compute_baseline(subject_id: str, window_days: int = DEFAULT_BASELINE_WINDOW_DAYS):
+    """
+    Get baseline stats for subject, or compute from historical data.
+    
+    Rolling stats over the last `window_days` days are used for every feature
+    that has enough windows; other features, and label-derived baselines,
+    keep the ingestion baseline.
+    """
+    hit, cached = baseline_cache.get(subject_id)
+    if hit:
+        return apply_rolling_baseline(cached, window_days)
+
     try:
         baseline = wearable_baselines.find_one({"subject_id": subject_id}, max_time_ms=5000)
         if baseline:
-            return baseline
+            baseline_cache.set(subject_id, baseline)
+            return apply_rolling_baseline(baseline, window_days)
 
         # Compute baseline from existing data (if available)
         subject_data = wearable_data.find_one({"subject_id": subject_id}, max_time_ms=5000)
         if not subject_data:
+            baseline_cache.set(subject_id, None, negative=True)
             return None
     except Exception:
         # MongoDB connection failed
+        baseline_cache.set(subject_id, None, negative=True)
         return None
 
-    # Use current data as baseline (in production, would aggregate over time window)
+    # No stored baseline yet: use current data until rolling stats accumulate
     baseline_stats = {
         "subject_id": subject_id,
-        "eda": {"mean": safe_mean(subject_data.get("eda")), "std": safe_std(subject_data.get("eda"))},
-        "temp": {"mean": safe_mean(subject_data.get("temp")), "std": safe_std(subject_data.get("temp"))},
-        "bvp": {"mean": safe_mean(subject_data.get("bvp")), "std": safe_std(subject_data.get("bvp"))},
-        "ecg": {"mean": safe_mean(subject_data.get("ecg")), "std": safe_std(subject_data.get("ecg"))},
-        "resp": {"mean": safe_mean(subject_data.get("resp")), "std": safe_std(subject_data.get("resp"))},
+        **{
+            name: {"mean": safe_mean(subject_data.get(name)), "std": safe_std(subject_data.get(name))}
+            for name in PWI_FEATURES
+        },
+        "hrv": subject_data.get("hrv"),
         "computed_at": datetime.utcnow(),
     }
 
-    # Store baseline
+    # Store baseline (write-through)
     wearable_baselines.insert_one(baseline_stats)
+    baseline_cache.set(subject_id, baseline_stats)
     return baseline_stats
 
 
@@ -123,18 +215,143 @@ def apply_ema_smoothing(current_value, previous_value, alpha=EMA_ALPHA):
     return alpha * current_value + (1 - alpha) * previous_value
 
 
-def compute_pwi(subject_id: str, use_smoothing: bool = True):
+def classify_pwi(pwi):
+    """Map a PWI value (0-100) to a wellness status label."""
+    if pwi >= PWI_THRESHOLDS["Calm"]:
+        return "Calm"
+    if pwi >= PWI_THRESHOLDS["Neutral"]:
+        return "Neutral"
+    if pwi >= PWI_THRESHOLDS["Mild Stress"]:
+        return "Mild Stress"
+    return "Stressed"
+
+
+def score_features(values: dict, baseline: dict):
     """
-    Compute Personalized Wellness Index with baseline normalization and smoothing.
+    Normalize raw feature values against a baseline and combine them into a PWI.
+    
+    Args:
+        values: Raw feature values keyed by PWI_FEATURES (missing -> neutral)
+        baseline: Per-feature {"mean", "std"} reference statistics
+    
+    Returns:
+        (pwi, status, normalized_features)
+    """
+    normalized = {}
+    for name in PWI_FEATURES:
+        reference = feature_stats(baseline, name) or {}
+        normalized[name] = normalize_feature(
+            values.get(name), reference.get("mean"), reference.get("std"), inverse=name in CALM_FEATURES
+        )
+
+    # Weighted combination
+    stress_components = sum(FEATURE_WEIGHTS[n] * normalized[n] for n in PWI_FEATURES if n not in CALM_FEATURES)
+    calm_components = sum(FEATURE_WEIGHTS[n] * normalized[n] for n in PWI_FEATURES if n in CALM_FEATURES)
+
+    # Compute raw PWI (0-100 scale, higher = better wellness)
+    raw_pwi = (1 - stress_components) * 0.6 + calm_components * 0.4
+    pwi = float(np.clip(raw_pwi * 100, 0, 100))
+    return pwi, classify_pwi(pwi), normalized
+
+
+def classify_pwi_array(pwi):
+    """Vectorized classify_pwi over an array of PWI values."""
+    pwi = np.asarray(pwi, dtype=float)
+    return np.select(
+        [pwi >= PWI_THRESHOLDS["Calm"], pwi >= PWI_THRESHOLDS["Neutral"], pwi >= PWI_THRESHOLDS["Mild Stress"]],
+        ["Calm", "Neutral", "Mild Stress"],
+        default="Stressed",
+    )
+
+
+def score_feature_matrix(values, means, stds):
+    """
+    Vectorized score_features for many rows at once (subjects or time windows).
+    
+    Args:
+        values, means, stds: float arrays of shape (n_rows, len(PWI_FEATURES)),
+            NaN where a value or reference statistic is missing
+    
+    Returns:
+        (pwi, status, normalized) arrays of shape (n,), (n,), (n, n_features)
+    """
+    values = np.asarray(values, dtype=float)
+    means = np.asarray(means, dtype=float)
+    stds = np.asarray(stds, dtype=float)
+
+    calm_mask = np.array([name in CALM_FEATURES for name in PWI_FEATURES])
+    weights = np.array([FEATURE_WEIGHTS[name] for name in PWI_FEATURES])
+
+    # Same neutral fallback as normalize_feature: missing value/mean/std or zero std -> 0.5
+    with np.errstate(invalid="ignore"):
+        valid = ~(np.isnan(values) | np.isnan(means) | np.isnan(stds) | (stds == 0))
+    z_score = np.divide(values - means, stds, out=np.zeros_like(values), where=valid)
+    z_score = np.where(calm_mask, -z_score, z_score)
+    with np.errstate(over="ignore"):
+        normalized = np.where(valid, 1 / (1 + np.exp(-z_score)), 0.5)
+
+    stress_components = normalized[:, ~calm_mask] @ weights[~calm_mask]
+    calm_components = normalized[:, calm_mask] @ weights[calm_mask]
+    raw_pwi = (1 - stress_components) * 0.6 + calm_components * 0.4
+    pwi = np.clip(raw_pwi * 100, 0, 100)
+    return pwi, classify_pwi_array(pwi), normalized
+
+
+def build_pwi_result(subject_id: str, pwi: float, status: str, values: dict, normalized: dict, **extra):
+    """Assemble the PWI response document returned by compute_pwi."""
+    result = {
+        "subject_id": subject_id,
+        "pwi": round(pwi, 2),
+        "status": status,
+        "features": {
+            name: round(values[name], 3) if values.get(name) is not None else None
+            for name in PWI_FEATURES
+        },
+        "normalized_features": {name: round(normalized[name], 3) for name in PWI_FEATURES},
+        "timestamp": datetime.utcnow().isoformat(),
+    }
+    result.update(extra)
+    return result
+
+
+def compute_pwi(subject_id: str):
+    """
+    Compute Personalized Wellness Index with baseline normalization.
+
+    Subjects fed by the streaming engine (backend.wellness_stream) are served
+    their EMA-smoothed snapshot; otherwise the PWI is scored from the stored
+    features.
+    
+    Results are cached per subject (see backend.wellness_cache); subjects with
+    no wearable data are cached as negative entries with a shorter TTL.
     
     Args:
         subject_id: Subject identifier
-        use_smoothing: Whether to apply EMA smoothing (requires previous PWI in session)
     
     Returns:
         dict with pwi, status, features, and metadata
     """
+    hit, cached = pwi_cache.get(subject_id)
+    if hit:
+        return dict(cached)
+
+    result = _compute_pwi_from_db(subject_id)
+    pwi_cache.set(subject_id, result, negative=result.get("pwi") is None)
+    return dict(result)
+
+
+def _compute_pwi_from_db(subject_id: str):
+    """Uncached PWI computation from the wearable collections."""
     try:
+        # Materialized snapshot written at ingestion / by the streaming engine
+        stored = wellness_snapshots.find_one(
+            {"subject_id": subject_id, "scoring_version": scoring_version()},
+            {"_id": 0, "snapshot": 1},
+            max_time_ms=5000,
+        )
+        if stored and stored.get("snapshot"):
+            return stored["snapshot"]
+
         # Try to connect to MongoDB with a short timeout
         subject = wearable_data.find_one({"subject_id": subject_id}, max_time_ms=5000)
     except Exception as e:
@@ -177,16 +394,22 @@ def compute_pwi(subject_id: str, use_smoothing: bool = True):
             "timestamp": datetime.utcnow().isoformat(),
         }
 
-    # Extract raw features
-    eda_mean = safe_mean(subject.get("eda"))
-    temp_mean = safe_mean(subject.get("temp"))
-    bvp_mean = safe_mean(subject.get("bvp"))
-    ecg_mean = safe_mean(subject.get("ecg"))
-    resp_mean = safe_mean(subject.get("resp"))
+    result = pwi_from_documents(subject_id, subject, baseline)
+    if result.get("pwi") is not None:
+        # Materialize so the next cold read is a single lookup
+        store_snapshot(subject_id, result, source="on_demand")
+    return result
 
-    # Check if all features are missing
-    feature_values = [eda_mean, temp_mean, bvp_mean, ecg_mean, resp_mean]
-    if all(v is None for v in feature_values):
+
+def pwi_from_documents(subject_id: str, features_doc: dict, baseline_doc: dict = None):
+    """
+    Score a wearable_data document against a baseline document.
+    
+    Without a baseline the document is scored against its own statistics,
+    like get_or_compute_baseline's fallback.
+    """
+    values = {name: safe_mean(feature_stats(features_doc, name)) for name in PWI_FEATURES}
+    if all(v is None for v in values.values()):
         return {
             "subject_id": subject_id,
             "pwi": None,
@@ -195,58 +418,45 @@ def compute_pwi(subject_id: str, use_smoothing: bool = True):
             "timestamp": datetime.utcnow().isoformat(),
         }
 
-    # Normalize features relative to baseline
-    eda_norm = normalize_feature(eda_mean, baseline["eda"]["mean"], baseline["eda"]["std"], inverse=False)
-    temp_norm = normalize_feature(temp_mean, baseline["temp"]["mean"], baseline["temp"]["std"], inverse=False)
-    bvp_norm = normalize_feature(bvp_mean, baseline["bvp"]["mean"], baseline["bvp"]["std"], inverse=True)
-    ecg_norm = normalize_feature(ecg_mean, baseline["ecg"]["mean"], baseline["ecg"]["std"], inverse=True)
-    resp_norm = normalize_feature(resp_mean, baseline["resp"]["mean"], baseline["resp"]["std"], inverse=False)
+    pwi, status, normalized = score_features(values, baseline_doc or features_doc)
+    return build_pwi_result(subject_id, pwi, status, values, normalized)
 
-    # Weighted combination
-    stress_components = (
-        FEATURE_WEIGHTS["eda"] * eda_norm
-        + FEATURE_WEIGHTS["temp"] * temp_norm
-        + FEATURE_WEIGHTS["resp"] * resp_norm
-    )
-    calm_components = FEATURE_WEIGHTS["bvp"] * bvp_norm + FEATURE_WEIGHTS["ecg"] * ecg_norm
 
-    # Compute raw PWI (0-100 scale, higher = better wellness)
-    raw_pwi = (1 - stress_components) * 0.6 + calm_components * 0.4
-    pwi = float(np.clip(raw_pwi * 100, 0, 100))
-
-    # Determine status
-    if pwi >= PWI_THRESHOLDS["Calm"]:
-        status = "Calm"
-    elif pwi >= PWI_THRESHOLDS["Neutral"]:
-        status = "Neutral"
-    elif pwi >= PWI_THRESHOLDS["Mild Stress"]:
-        status = "Mild Stress"
-    else:
-        status = "Stressed"
-
-    result = {
-        "subject_id": subject_id,
-        "pwi": round(pwi, 2),
-        "status": status,
-        "features": {
-            "eda": round(eda_mean, 3) if eda_mean is not None else None,
-            "temp": round(temp_mean, 3) if temp_mean is not None else None,
-            "bvp": round(bvp_mean, 3) if bvp_mean is not None else None,
-            "ecg": round(ecg_mean, 3) if ecg_mean is not None else None,
-            "resp": round(resp_mean, 3) if resp_mean is not None else None,
-        },
-        "normalized_features": {
-            "eda": round(eda_norm, 3),
-            "temp": round(temp_norm, 3),
-            "bvp": round(bvp_norm, 3),
-            "ecg": round(ecg_norm, 3),
-            "resp": round(resp_norm, 3),
+def scoring_version():
+    """Short hash of everything that affects a PWI score (weights, thresholds, inputs)."""
+    payload = json.dumps(
+        {
+            "weights": FEATURE_WEIGHTS,
+            "thresholds": PWI_THRESHOLDS,
+            "features": PWI_FEATURES,
+            "calm": sorted(CALM_FEATURES),
+            "sources": FEATURE_SOURCES,
         },
-        "timestamp": datetime.utcnow().isoformat(),
-    }
+        sort_keys=True,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
 
-    return result
 
+def store_snapshot(subject_id: str, result: dict, source: str):
+    """Upsert the materialized PWI snapshot for a subject and refresh the cache."""
+    try:
+        wellness_snapshots.update_one(
+            {"subject_id": subject_id},
+            {
+                "$set": {
+                    "subject_id": subject_id,
+                    "scoring_version": scoring_version(),
+                    "source": source,
+                    "computed_at": datetime.utcnow(),
+                    "snapshot": result,
+                }
+            },
+            upsert=True,
+        )
+    except Exception:
+        # MongoDB unavailable - the snapshot is recomputed on the next miss
+        pass
+    pwi_cache.set(subject_id, result)
 
 if __name__ == "__main__":
     result = compute_pwi("S10")
@@ -0,0 +1,173 @@
+"""
+Downsampled PWI / feature time series for dashboards.
+
+Reads a subject's feature windows from `wearable_windows` over a time range
+(served by the (subject_id, timestamp) index from ensure_baseline_indexes) and
+reduces them server-side to a fixed number of points, so multi-month charts
+stay small:
+
+- "lttb": Largest-Triangle-Three-Buckets on the PWI curve (keeps the visual
+  shape; features are sampled at the same timestamps)
+- "minmax": per time bucket, the minimum and maximum PWI windows (keeps spikes)
+
+Only timestamp and PWI are streamed from the cursor, into preallocated NumPy
+arrays; the features of the selected points are read afterwards with one
+indexed $in query.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import numpy as np
+
+from backend.wellness_baselines import wearable_windows
+from backend.wellness_fusion import PWI_FEATURES
+
+DEFAULT_SERIES_POINTS = 500
+MAX_SERIES_POINTS = 5000
+DEFAULT_SERIES_RANGE = timedelta(days=30)
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Naive UTC datetime (as stored in MongoDB) from a naive (assumed UTC) or timezone-aware one."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """
+    Indices selected by Largest-Triangle-Three-Buckets.
+
+    The first and last samples are always kept; every bucket in between keeps
+    the sample forming the largest triangle with the previously selected point
+    and the average of the next bucket.
+    """
+    n = x.size
+    if points >= n:
+        return np.arange(n)
+    if points < 3:
+        return np.array([0, n - 1])
+
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    # Averages of every bucket (the next-bucket anchor for the one before it)
+    csum_x = np.concatenate(([0.0], np.cumsum(x)))
+    csum_y = np.concatenate(([0.0], np.cumsum(y)))
+    sizes = np.maximum(edges[1:] - edges[:-1], 1)
+    avg_x = (csum_x[edges[1:]] - csum_x[edges[:-1]]) / sizes
+    avg_y = (csum_y[edges[1:]] - csum_y[edges[:-1]]) / sizes
+    avg_x = np.append(avg_x[1:], x[-1])
+    avg_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    prev = 0
+    # Each choice depends on the previous one, so this loop is over buckets, not samples
+    for bucket, (lo, hi) in enumerate(zip(edges[:-1], edges[1:])):
+        area = np.abs(
+            (x[prev] - avg_x[bucket]) * (y[lo:hi] - y[prev])
+            - (x[prev] - x[lo:hi]) * (avg_y[bucket] - y[prev])
+        )
+        prev = lo + int(np.argmax(area))
+        selected[bucket + 1] = prev
+    return selected
+
+
+def minmax_indices(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """Indices of the min and max sample in each of points // 2 equal time buckets."""
+    n = x.size
+    buckets = max(1, points // 2)
+    if points >= n:
+        return np.arange(n)
+    edges = np.linspace(x[0], x[-1], buckets + 1)
+    bucket = np.clip(np.searchsorted(edges, x, side="right") - 1, 0, buckets - 1)
+
+    # Sort by (bucket, y): the first/last sample of each bucket run are its min/max
+    order = np.lexsort((y, bucket))
+    starts = np.flatnonzero(np.diff(bucket[order], prepend=-1))
+    ends = np.append(starts[1:], n) - 1
+    return np.unique(np.concatenate((order[starts], order[ends])))
+
+
+def get_pwi_series(
+    subject_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    points: int = DEFAULT_SERIES_POINTS,
+    method: str = "lttb",
+) -> dict:
+    """
+    PWI and feature history for a subject, downsampled to at most `points` points.
+
+    Args:
+        subject_id: Subject identifier
+        start: Range start (defaults to DEFAULT_SERIES_RANGE before end)
+        end: Range end (defaults to now)
+        points: Maximum number of points returned
+        method: "lttb" or "minmax"
+
+    Returns:
+        dict with range, raw_count and a list of {timestamp, pwi, features} points
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Unknown downsampling method: {method}")
+    points = max(2, min(int(points), MAX_SERIES_POINTS))
+    end = naive_utc(end) or datetime.utcnow()
+    start = naive_utc(start) or end - DEFAULT_SERIES_RANGE
+
+    query = {"subject_id": subject_id, "timestamp": {"$gte": start, "$lte": end}, "pwi": {"$ne": None}}
+    try:
+        n = wearable_windows.count_documents(query)
+        timestamps = np.empty(n, dtype="datetime64[ms]")
+        y = np.empty(n)
+        cursor = wearable_windows.find(query, {"_id": 0, "timestamp": 1, "pwi": 1}).sort("timestamp", 1).batch_size(10000)
+        count = 0
+        for doc in cursor:
+            if count == n:
+                break  # windows added since the count are left for the next request
+            timestamps[count], y[count] = doc["timestamp"], doc["pwi"]
+            count += 1
+        timestamps, y = timestamps[:count], y[:count]
+    except Exception:
+        # MongoDB unavailable - return an empty series
+        timestamps, y = np.empty(0, dtype="datetime64[ms]"), np.empty(0)
+
+    result = {
+        "subject_id": subject_id,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "method": method,
+        "raw_count": int(timestamps.size),
+        "points": [],
+    }
+    if not timestamps.size:
+        return result
+
+    x = timestamps.astype(np.int64).astype(float)
+    if method == "lttb":
+        selected = lttb_indices(x, y, points)
+    else:
+        selected = minmax_indices(x, y, points)
+
+    chosen = timestamps[selected].astype(datetime).tolist()
+    features = {}
+    try:
+        cursor = wearable_windows.find(
+            {"subject_id": subject_id, "timestamp": {"$in": chosen}, "pwi": {"$ne": None}},
+            {"_id": 0, "timestamp": 1, **{f"features.{name}": 1 for name in PWI_FEATURES}},
+        )
+        for doc in cursor:
+            features.setdefault(doc["timestamp"], doc.get("features") or {})
+    except Exception:
+        # MongoDB unavailable - points keep their PWI only
+        pass
+
+    result["points"] = [
+        {
+            "timestamp": timestamp.isoformat(),
+            "pwi": round(float(value), 2),
+            "features": {name: features.get(timestamp, {}).get(name) for name in PWI_FEATURES},
+        }
+        for timestamp, value in zip(chosen, y[selected].tolist())
+    ]
+    return result
@@ -0,0 +1,140 @@
+"""
+Materialized PWI snapshots.
+
+Ingestion (database/wearable_preprocess.py) and the streaming engine write one
+compact `wellness_snapshots` document per subject, stamped with the scoring
+version (a hash of weights, thresholds and inputs). compute_pwi serves that
+document with a single projected find_one. When the scoring version changes,
+the stale snapshots are recomputed in bulk with the vectorized cohort engine.
+
+Recomputes follow compute_pwi's precedence: a snapshot stamped with the
+current scoring version is served as-is, whatever its source, so streamed
+snapshots that are current are never overwritten. A stale snapshot (streamed
+or not) is not served by compute_pwi either, which scores the stored features
+instead; the recompute writes exactly that score, and the subject's next
+streamed window replaces it again.
+
+Usage:
+    python -m backend.wellness_snapshots            # recompute stale snapshots
+    python -m backend.wellness_snapshots --force    # recompute every subject
+"""
+import argparse
+import logging
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from pymongo import ASCENDING, UpdateOne
+
+from backend.wellness_cache import pwi_cache
+from backend.wellness_cohort import MAX_COHORT_SIZE, compute_cohort_pwi
+from backend.wellness_fusion import (
+    pwi_from_documents,
+    scoring_version,
+    wearable_data,
+    wellness_snapshots,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def ensure_snapshot_indexes() -> None:
+    wellness_snapshots.create_index([("subject_id", ASCENDING)], unique=True)
+
+
+def _snapshot_upsert(result: dict, version: str, now: datetime) -> UpdateOne:
+    return UpdateOne(
+        {"subject_id": result["subject_id"]},
+        {"$set": {
+            "subject_id": result["subject_id"],
+            "scoring_version": version,
+            "source": "ingestion",
+            "computed_at": now,
+            "snapshot": result,
+        }},
+        upsert=True,
+    )
+
+
+def materialize_snapshots(items: Iterable[Tuple[str, dict, Optional[dict]]]) -> int:
+    """
+    Compute and store snapshots for freshly ingested features (ingestion
+    hook): one bulk_write for many subjects.
+
+    Args:
+        items: (subject_id, features, baseline) tuples
+
+    Returns:
+        Number of snapshots written
+    """
+    version = scoring_version()
+    now = datetime.utcnow()
+    results = [pwi_from_documents(subject_id, features, baseline) for subject_id, features, baseline in items]
+    results = [result for result in results if result.get("pwi") is not None]
+    if results:
+        wellness_snapshots.bulk_write([_snapshot_upsert(result, version, now) for result in results], ordered=False)
+    for result in results:
+        pwi_cache.set(result["subject_id"], result)
+    return len(results)
+
+
+def _stale_subject_ids(force: bool) -> List[str]:
+    version = scoring_version()
+    if not force:
+        return sorted(wellness_snapshots.distinct("subject_id", {"scoring_version": {"$ne": version}}))
+    # Current streamed snapshots win over static features, as in compute_pwi
+    streaming = set(wellness_snapshots.distinct("subject_id", {"source": "stream", "scoring_version": version}))
+    return sorted(set(wearable_data.distinct("subject_id")) - streaming)
+
+
+def recompute_snapshots(force: bool = False, batch_size: int = MAX_COHORT_SIZE) -> int:
+    """
+    Recompute snapshots whose scoring version is stale (or all with force)
+    from the stored features with the cohort engine.
+
+    Current streamed snapshots are kept even with force; stale ones are
+    replaced by the feature-based score that compute_pwi would serve.
+
+    Returns:
+        Number of snapshots written
+    """
+    subject_ids = _stale_subject_ids(force)
+    version = scoring_version()
+    written = 0
+    for start in range(0, len(subject_ids), batch_size):
+        batch = subject_ids[start:start + batch_size]
+        cohort = compute_cohort_pwi(subject_ids=batch, limit=batch_size, use_snapshots=False)
+        now = datetime.utcnow()
+        operations = []
+        for result in cohort["results"]:
+            if result.get("pwi") is None:
+                continue
+            result["timestamp"] = now.isoformat()
+            operations.append(_snapshot_upsert(result, version, now))
+            pwi_cache.set(result["subject_id"], result)
+        if operations:
+            wellness_snapshots.bulk_write(operations, ordered=False)
+            written += len(operations)
+    return written
+
+
+def recompute_if_scoring_changed() -> int:
+    """Startup hook: rebuild snapshots only when weights/thresholds changed."""
+    try:
+        ensure_snapshot_indexes()
+        written = recompute_snapshots()
+        if written:
+            logger.info(f"Recomputed {written} wellness snapshots for scoring version {scoring_version()}")
+        return written
+    except Exception:
+        logger.exception("Wellness snapshot recompute failed")
+        return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute materialized PWI snapshots")
+    parser.add_argument("--force", action="store_true", help="Recompute every subject, not only stale ones")
+    args = parser.parse_args()
+
+    ensure_snapshot_indexes()
+    count = recompute_snapshots(force=args.force)
+    print(f"✅ Recomputed {count} snapshots (scoring version {scoring_version()})")
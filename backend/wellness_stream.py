@@ -0,0 +1,248 @@
+"""
+Streaming wellness engine.
+
+Takes feature windows as they arrive (one value per PWI feature) and updates a
+per-subject rolling state in O(1): EMA-smoothed PWI, running mean/variance per
+feature (Welford), the last status and the stress-onset detector
+(backend/stress_events.py). The state is persisted as one compact
+document in the `wellness_state` collection, and every update materializes the
+subject's snapshot in `wellness_snapshots`, so reading the current PWI is a
+cache hit or a single lookup instead of a recomputation.
+
+At most STREAM_MAX_SUBJECTS states are held in memory; the least recently
+updated ones are dropped and reloaded from `wellness_state` when needed. Every
+update writes the state before releasing the subject's lock, so dropping an
+idle state never loses anything.
+"""
+import math
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from backend.stress_events import ChangeDetector, record_events
+from backend.wellness_baselines import record_feature_windows
+from backend.wellness_fusion import (
+    EMA_ALPHA,
+    PWI_FEATURES,
+    apply_ema_smoothing,
+    build_pwi_result,
+    classify_pwi,
+    get_or_compute_baseline,
+    score_features,
+    store_snapshot,
+    wellness_state,
+)
+
+# Running stats need a few windows before they are usable as a self-baseline
+MIN_WINDOWS_FOR_SELF_BASELINE = 5
+
+# Subject states kept in memory (least recently used are dropped)
+STREAM_MAX_SUBJECTS = int(os.getenv("WELLNESS_STREAM_MAX_SUBJECTS", "10000"))
+
+
+class SubjectState:
+    """Rolling per-subject state; lists are indexed like PWI_FEATURES."""
+
+    __slots__ = (
+        "subject_id", "windows", "count", "mean", "m2", "pwi_ema", "status", "snapshot", "updated_at",
+        "detector", "lock",
+    )
+
+    def __init__(self, subject_id: str):
+        self.subject_id = subject_id
+        self.lock = threading.Lock()
+        self.windows = 0
+        self.count = [0] * len(PWI_FEATURES)
+        self.mean = [0.0] * len(PWI_FEATURES)
+        self.m2 = [0.0] * len(PWI_FEATURES)
+        self.pwi_ema: Optional[float] = None
+        self.status: Optional[str] = None
+        self.snapshot: Optional[dict] = None
+        self.updated_at: Optional[datetime] = None
+        self.detector = ChangeDetector()
+
+    def observe(self, values: Dict[str, Optional[float]]) -> None:
+        """Welford update of the running mean/variance for every present feature."""
+        self.windows += 1
+        for i, name in enumerate(PWI_FEATURES):
+            value = values.get(name)
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                continue
+            self.count[i] += 1
+            delta = value - self.mean[i]
+            self.mean[i] += delta / self.count[i]
+            self.m2[i] += delta * (value - self.mean[i])
+
+    def running_stats(self) -> Dict[str, dict]:
+        stats = {}
+        for i, name in enumerate(PWI_FEATURES):
+            n = self.count[i]
+            stats[name] = {
+                "mean": self.mean[i] if n else None,
+                "std": math.sqrt(self.m2[i] / (n - 1)) if n > 1 else None,
+                "count": n,
+            }
+        return stats
+
+    def to_doc(self) -> dict:
+        return {
+            "subject_id": self.subject_id,
+            "windows": self.windows,
+            "count": self.count,
+            "mean": self.mean,
+            "m2": self.m2,
+            "pwi_ema": self.pwi_ema,
+            "status": self.status,
+            "updated_at": self.updated_at,
+            "detector": self.detector.to_doc(),
+        }
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "SubjectState":
+        state = cls(doc["subject_id"])
+        size = len(PWI_FEATURES)
+        # Pad/trim in case PWI_FEATURES changed since the state was written
+        state.windows = doc.get("windows", 0)
+        state.count = (list(doc.get("count", [])) + [0] * size)[:size]
+        state.mean = (list(doc.get("mean", [])) + [0.0] * size)[:size]
+        state.m2 = (list(doc.get("m2", [])) + [0.0] * size)[:size]
+        state.pwi_ema = doc.get("pwi_ema")
+        state.status = doc.get("status")
+        state.updated_at = doc.get("updated_at")
+        state.detector = ChangeDetector.from_doc(doc.get("detector"))
+        return state
+
+
+# subject_id -> state, least recently used first
+_states: "OrderedDict[str, SubjectState]" = OrderedDict()
+_states_lock = threading.Lock()
+
+
+def _load_state(subject_id: str) -> SubjectState:
+    with _states_lock:
+        state = _states.get(subject_id)
+        if state is not None:
+            _states.move_to_end(subject_id)
+    if state is not None:
+        return state
+
+    doc = None
+    try:
+        doc = wellness_state.find_one({"subject_id": subject_id}, {"_id": 0}, max_time_ms=2000)
+    except Exception:
+        # MongoDB unavailable - start from an empty state
+        pass
+    state = SubjectState.from_doc(doc) if doc else SubjectState(subject_id)
+    with _states_lock:
+        state = _states.setdefault(subject_id, state)
+        _evict_states()
+        return state
+
+
+def _evict_states() -> None:
+    """
+    Drop least recently used states beyond STREAM_MAX_SUBJECTS (caller holds _states_lock).
+
+    States are persisted before their lock is released, so an idle state holds
+    nothing unwritten; states in the middle of an update are skipped, so a
+    reload never races the write that is still in flight.
+    """
+    excess = len(_states) - STREAM_MAX_SUBJECTS
+    if excess <= 0:
+        return
+    for subject_id in [s for s, state in _states.items() if not state.lock.locked()][:excess]:
+        del _states[subject_id]
+
+
+def _reference_baseline(subject_id: str, state: SubjectState) -> dict:
+    """Stored baseline if available, otherwise the subject's own running stats."""
+    baseline = get_or_compute_baseline(subject_id)
+    if baseline:
+        return baseline
+    if state.windows >= MIN_WINDOWS_FOR_SELF_BASELINE:
+        return state.running_stats()
+    return {}
+
+
+def _fold_window(state: SubjectState, features: Dict[str, Optional[float]], timestamp: datetime, alpha: float):
+    """Apply one window to a locked state; returns the new snapshot and any stress events."""
+    # Score against the reference before this window moves the running stats
+    baseline = _reference_baseline(state.subject_id, state)
+    raw_pwi, raw_status, normalized = score_features(features, baseline)
+
+    state.observe(features)
+    events = state.detector.update(features, timestamp)
+    state.pwi_ema = apply_ema_smoothing(raw_pwi, state.pwi_ema, alpha=alpha)
+    state.status = classify_pwi(state.pwi_ema)
+    state.updated_at = timestamp
+    state.snapshot = build_pwi_result(
+        state.subject_id,
+        state.pwi_ema,
+        state.status,
+        features,
+        normalized,
+        pwi_raw=round(raw_pwi, 2),
+        status_raw=raw_status,
+        window_count=state.windows,
+        stress_events=list(state.detector.recent),
+        source="stream",
+    )
+    state.snapshot["timestamp"] = timestamp.isoformat()
+    return dict(state.snapshot), events
+
+
+def ingest_feature_windows(subject_id: str, windows: Iterable[dict], alpha: float = EMA_ALPHA) -> Optional[dict]:
+    """
+    Fold a batch of feature windows (in time order) into the subject's rolling
+    state and persist once at the end.
+
+    The state lock is held through the write, so concurrent updates for the
+    same subject reach MongoDB in the order they were applied.
+
+    Args:
+        subject_id: Subject identifier
+        windows: {"timestamp": datetime, "features": {...}} per window; one
+            value per PWI feature (missing -> neutral), timestamp defaults to now
+        alpha: EMA smoothing factor
+
+    Returns:
+        The latest wellness snapshot (same shape as compute_pwi), or None for no windows
+    """
+    state = _load_state(subject_id)
+    with state.lock:
+        snapshot = None
+        recorded: List[dict] = []
+        events: List[dict] = []
+        for window in windows:
+            timestamp = window.get("timestamp") or datetime.utcnow()
+            features = window.get("features") or {}
+            snapshot, detected = _fold_window(state, features, timestamp, alpha)
+            recorded.append({"timestamp": timestamp, "features": features, "pwi": snapshot["pwi_raw"]})
+            events.extend(detected)
+        if snapshot is not None:
+            _persist(subject_id, state.to_doc(), snapshot, recorded, events)
+    return snapshot
+
+
+def _persist(subject_id: str, state_doc: dict, snapshot: dict, windows: List[dict], events: List[dict]) -> None:
+    """Write the state document, the windows (+ baseline day sums), stress events and the snapshot."""
+    try:
+        wellness_state.update_one({"subject_id": subject_id}, {"$set": state_doc}, upsert=True)
+        record_feature_windows(subject_id, windows)
+        record_events(subject_id, events)
+    except Exception:
+        # MongoDB unavailable - keep the in-memory state
+        pass
+    store_snapshot(subject_id, snapshot, source="stream")
+
+
+def reset_state(subject_ids: Optional[List[str]] = None) -> None:
+    """Forget in-memory state (e.g. after a batch recompute rewrote the documents)."""
+    with _states_lock:
+        if subject_ids is None:
+            _states.clear()
+        else:
+            for subject_id in subject_ids:
+                _states.pop(subject_id, None)
@@ -1,10 +1,30 @@
 import os
 from pymongo import MongoClient
 
+# URIs with this scheme are served by mongomock (in-memory, used by tests and benchmarks;
+# see requirements-dev.txt)
+IN_MEMORY_URI_PREFIX = "mongomock://"
+
+_in_memory_client = None
+
+
+def _get_in_memory_client():
+    """Return a process-wide mongomock client so every module shares one store."""
+    global _in_memory_client
+    if _in_memory_client is None:
+        import mongomock
+
+        _in_memory_client = mongomock.MongoClient()
+    return _in_memory_client
+
+
 def get_database():
     mongodb_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
     db_name = os.getenv("MONGODB_DB", "pai_mhc_db")
-    client = MongoClient(mongodb_uri)
+    if mongodb_uri.startswith(IN_MEMORY_URI_PREFIX):
+        client = _get_in_memory_client()
+    else:
+        client = MongoClient(mongodb_uri)
     db = client[db_name]
     return db
 
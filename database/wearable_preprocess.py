@@ -1,135 +1,733 @@
-import pickle
 import numpy as np
 import os
-from datetime import datetime
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta
+from functools import partial
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import OperationFailure
 from database.db_connection import get_database
+from backend.physio_signals import (
+    DEFAULT_HOP_S,
+    DEFAULT_WINDOW_S,
+    ECG_SAMPLE_RATE,
+    EDA_SAMPLE_RATE,
+    label_segments,
+    scr_by_window,
+    summarize_windows,
+)
+from backend.feature_windows import RATE_FEATURES, extract_feature_matrix, hrv_windows
+from backend.utils.streaming_stats import RunningStats, running_stats
+from backend.stress_events import ensure_event_indexes
+from backend.wellness_baselines import (
+    ensure_baseline_indexes,
+    refresh_baselines,
+    replace_window_sums,
+    store_feature_windows,
+)
+from backend.wellness_cache import invalidate_subject
+from backend.wellness_fusion import PWI_FEATURES, feature_stats, resolve_baselines, score_feature_matrix, scoring_version
+from backend.wellness_snapshots import ensure_snapshot_indexes, materialize_snapshots
+from database.wesad_cache import (
+    DEFAULT_CACHE_DIR,
+    LABEL_SAMPLE_RATE,
+    convert_subject,
+    feature_sample_rates,
+    feature_signals,
+    file_hash,
+    flat_sample_rates,
+    is_cached,
+    load_feature_matrix,
+    load_manifest,
+    pickle_feature_signals,
+    save_feature_matrix,
+)
 
 db = get_database()
 wearable_collection = db["wearable_data"]
 wearable_baselines = db["wearable_baselines"]
+ingest_manifest = db["wearable_ingest_manifest"]
 
+# Bump whenever extracted features change, so the next run reprocesses every subject
+FEATURE_EXTRACTOR_VERSION = 6
 
-def extract_features_from_pkl(pkl_path, subject_id):
-    """Extract features from WESAD pickle file."""
-    with open(pkl_path, 'rb') as f:
-        data = pickle.load(f, encoding='latin1')
+# Subjects per bulk write (each WESAD subject is one features + one baseline document)
+DEFAULT_WRITE_BATCH = 8
+
+# Stored feature -> sensor summarized over the session (and per condition)
+SIGNAL_SENSORS = {"eda": "EDA", "ecg": "ECG", "emg": "EMG", "bvp": "BVP", "resp": "Resp", "temp": "Temp"}
+
+# WESAD protocol labels; 0 and 5-7 (transient / ignored) only count towards session stats
+CONDITION_LABELS = {1: "baseline", 2: "stress", 3: "amusement", 4: "meditation"}
+HRV_KEYS = ("rmssd", "sdnn", "mean_hr", "lf_hf")
+SCR_KEYS = ("rate", "amplitude")
+
+def _mean_std(stats):
+    if stats.count == 0:
+        return {"mean": None, "std": None}
+    return {"mean": float(stats.mean), "std": float(stats.std)}
+
+
+def signal_stats(arr):
+    """Mean/std of a signal in fixed-size chunks (NaNs skipped, no full-length copies)."""
+    if arr is None or not len(arr):
+        return {"mean": None, "std": None}
+    return _mean_std(running_stats(arr))
+
+
+def hrv_stats(arr, fs=ECG_SAMPLE_RATE):
+    """HRV per 60 s window from R-peak detection on the chest ECG."""
+    if arr is None or not len(arr):
+        return None
+    windows = hrv_windows(arr, fs)
+    return {key: summarize_windows(windows[key]) for key in HRV_KEYS}
+
+
+def rate_windows(arr, fs, estimator):
+    """Spectral rate per 60 s window, keyed like segmented_window_stats expects."""
+    rate = estimator(arr, fs)
+    return {"start_s": np.arange(rate.size) * DEFAULT_WINDOW_S, "value": rate}
+
+
+def scr_windows(eda, fs=EDA_SAMPLE_RATE):
+    """SCR rate / amplitude per 60 s window, keyed like SCR_KEYS."""
+    windows = scr_by_window(eda, fs=fs)
+    return {"start_s": windows["start_s"], "rate": windows["scr_rate"], "amplitude": windows["scr_amplitude"]}
+
+
+def scr_stats(arr, fs=EDA_SAMPLE_RATE):
+    """Skin-conductance response rate and amplitude summarized over 60 s windows."""
+    if arr is None or not len(arr):
+        return None
+    windows = scr_windows(arr, fs)
+    return {key: summarize_windows(windows[key]) for key in SCR_KEYS}
+
+
+def _segment_bounds(segments, fs, label_rate, n_samples):
+    """Label segment boundaries converted to sample indices of a channel at rate fs."""
+    _, starts, stops = segments
+    scale = fs / label_rate
+    lo = np.minimum(np.floor(starts * scale).astype(np.int64), n_samples)
+    hi = np.minimum(np.floor(stops * scale).astype(np.int64), n_samples)
+    if hi.size:
+        # Samples past the last label still belong to the session
+        hi[-1] = n_samples
+    return lo, hi
+
+
+def segmented_stats(arr, fs, segments, label_rate=LABEL_SAMPLE_RATE):
+    """
+    Session and per-condition mean/std of a signal in one pass over its label segments.
+
+    Every segment is summarized once (chunked RunningStats) and merged into the
+    session total and, for protocol labels, into its condition.
+
+    Returns:
+        (session_stats, {condition: stats})
+    """
+    values = segments[0]
+    lo, hi = _segment_bounds(segments, fs, label_rate, len(arr))
+    session = RunningStats()
+    conditions = {}
+    # One iteration per label segment (a few dozen per recording), never per sample
+    for value, start, stop in zip(values.tolist(), lo.tolist(), hi.tolist()):
+        if stop <= start:
+            continue
+        segment = running_stats(arr[start:stop])
+        session.merge(segment)
+        condition = CONDITION_LABELS.get(value)
+        if condition:
+            conditions.setdefault(condition, RunningStats()).merge(segment)
+    return _mean_std(session), {name: _mean_std(stats) for name, stats in conditions.items()}
+
+
+def segmented_window_stats(windows, keys, segments, label_rate=LABEL_SAMPLE_RATE):
+    """Session and per-condition summaries of per-window metrics; a window counts for a condition if it lies in one segment."""
+    session = {key: summarize_windows(windows[key]) for key in keys}
+
+    values, _, stops = segments
+    first = (windows["start_s"] * label_rate).astype(np.int64)
+    last = ((windows["start_s"] + DEFAULT_WINDOW_S) * label_rate).astype(np.int64) - 1
+    first_segment = np.searchsorted(stops, first, side="right")
+    last_segment = np.searchsorted(stops, last, side="right")
+    inside = (first_segment == last_segment) & (first_segment < values.size)
+    window_labels = np.where(inside, values[np.minimum(first_segment, values.size - 1)], -1)
+
+    conditions = {}
+    for value, condition in CONDITION_LABELS.items():
+        mask = window_labels == value
+        if mask.any():
+            conditions[condition] = {key: summarize_windows(windows[key][mask]) for key in keys}
+    return session, conditions
+
+
+def extract_features_from_signals(signals, subject_id, sample_rates=None):
+    """
+    Extract features from a mapping of sensor name -> array.
+
+    Arrays may be memory-mapped (np.load(..., mmap_mode="r")): statistics are
+    streamed in chunks, so only the pages of the current chunk are resident.
+    When a "label" array is present, signals are segmented by condition in the
+    same pass and per-condition statistics are stored under "conditions".
+    """
+    sample_rates = sample_rates or flat_sample_rates(signals)
+    labels = signals.get('label')
+    segments = label_segments(labels) if labels is not None and len(labels) else None
+    label_rate = sample_rates.get('label', LABEL_SAMPLE_RATE)
+
+    features = {"subject_id": subject_id}
+    conditions = {}
+    for name, sensor in SIGNAL_SENSORS.items():
+        arr = signals.get(sensor)
+        if segments is None or arr is None or not len(arr):
+            features[name] = signal_stats(arr)
+            continue
+        fs = sample_rates.get(sensor, ECG_SAMPLE_RATE)
+        features[name], by_condition = segmented_stats(arr, fs, segments, label_rate)
+        for condition, stats in by_condition.items():
+            conditions.setdefault(condition, {})[name] = stats
 
-    # Access the correct structure
-    signals = data.get('signal', {})
-    
-    # Each sensor signal is a NumPy array
-    eda = signals.get('EDA')
     ecg = signals.get('ECG')
-    emg = signals.get('EMG')
-    temp = signals.get('Temp')
-    bvp = signals.get('BVP')
-    resp = signals.get('Resp')
+    ecg_rate = sample_rates.get('ECG', ECG_SAMPLE_RATE)
+    if segments is None or ecg is None or not len(ecg):
+        features["hrv"] = hrv_stats(ecg, ecg_rate)
+    else:
+        windows = hrv_windows(ecg, ecg_rate)
+        features["hrv"], by_condition = segmented_window_stats(windows, HRV_KEYS, segments, label_rate)
+        for condition, stats in by_condition.items():
+            conditions.setdefault(condition, {})["hrv"] = stats
 
-    # Compute mean and std safely
-    def safe_stats(arr):
+    eda = signals.get('EDA')
+    eda_rate = sample_rates.get('EDA', EDA_SAMPLE_RATE)
+    if segments is None or eda is None or not len(eda):
+        features["scr"] = scr_stats(eda, eda_rate)
+    else:
+        windows = scr_windows(eda, eda_rate)
+        features["scr"], by_condition = segmented_window_stats(windows, SCR_KEYS, segments, label_rate)
+        for condition, stats in by_condition.items():
+            conditions.setdefault(condition, {})["scr"] = stats
+
+    for name, (sensor, estimator) in RATE_FEATURES.items():
+        arr = signals.get(sensor)
         if arr is None or not len(arr):
-            return {"mean": None, "std": None}
-        arr_clean = np.array(arr)
-        arr_clean = arr_clean[~np.isnan(arr_clean)]
-        if len(arr_clean) == 0:
-            return {"mean": None, "std": None}
-        return {"mean": float(np.mean(arr_clean)), "std": float(np.std(arr_clean))}
-
-    features = {
-        "subject_id": subject_id,
-        "eda": safe_stats(eda),
-        "ecg": safe_stats(ecg),
-        "emg": safe_stats(emg),
-        "bvp": safe_stats(bvp),
-        "resp": safe_stats(resp),
-        "temp": safe_stats(temp),
-        "processed_at": datetime.utcnow(),
-    }
+            features[name] = {"mean": None, "std": None}
+            continue
+        windows = rate_windows(arr, sample_rates.get(sensor, ECG_SAMPLE_RATE), estimator)
+        if segments is None:
+            features[name] = summarize_windows(windows["value"])
+            continue
+        session, by_condition = segmented_window_stats(windows, ("value",), segments, label_rate)
+        features[name] = session["value"]
+        for condition, stats in by_condition.items():
+            conditions.setdefault(condition, {})[name] = stats["value"]
 
+    if conditions:
+        features["conditions"] = conditions
+    features["processed_at"] = datetime.utcnow()
     return features
 
 
+def load_pkl_signals(pkl_path):
+    """
+    Sensor name -> array (plus "label" when present) and sensor name -> sample rate
+    from a WESAD pickle, in either layout (chest/wrist or flat).
+    """
+    return pickle_feature_signals(pkl_path)
+
+
+def extract_features_from_pkl(pkl_path, subject_id):
+    """Extract features from WESAD pickle file."""
+    signals, sample_rates = load_pkl_signals(pkl_path)
+    return extract_features_from_signals(signals, subject_id, sample_rates)
+
+
+def has_pwi_features(features):
+    """Whether extraction produced at least one PWI input (False when no channel was recognized)."""
+    return any((feature_stats(features, name) or {}).get("mean") is not None for name in PWI_FEATURES)
+
+
+def matrix_to_windows(matrix, start_time=None, pwi=None):
+    """
+    Window documents ({"timestamp": window end, "features": {...}, "pwi"}) from a feature matrix.
+
+    start_time defaults to now minus the recording length.
+    """
+    if matrix is None:
+        return []
+    start_time = start_time or datetime.utcnow() - timedelta(seconds=matrix["duration_s"])
+    names = matrix["names"]
+    ends = (np.asarray(matrix["start_s"]) + matrix["window_s"]).tolist()
+    rows = np.round(np.asarray(matrix["values"], dtype=float), 4).tolist()
+    pwi = np.round(pwi, 2).tolist() if pwi is not None else [None] * len(rows)
+    return [
+        {
+            "timestamp": start_time + timedelta(seconds=float(end)),
+            "features": {name: (None if np.isnan(value) else value) for name, value in zip(names, row)},
+            "pwi": value,
+        }
+        for end, row, value in zip(ends, rows, pwi)
+    ]
+
+
+def score_matrix(names, values, baseline=None):
+    """
+    PWI of every row of a feature matrix in one vectorized pass.
+
+    Scored against the baseline's mean/std (or the columns' own statistics).
+    """
+    index = [names.index(name) for name in PWI_FEATURES]
+    values = np.asarray(values, dtype=float)[:, index]
+    if not len(values):
+        return np.empty(0)
+    if baseline:
+        means = np.array([(feature_stats(baseline, name) or {}).get("mean") for name in PWI_FEATURES], dtype=float)
+        stds = np.array([(feature_stats(baseline, name) or {}).get("std") for name in PWI_FEATURES], dtype=float)
+    else:
+        with np.errstate(invalid="ignore"):
+            means, stds = np.nanmean(values, axis=0), np.nanstd(values, axis=0)
+    pwi, _, _ = score_feature_matrix(values, means[None, :], stds[None, :])
+    return pwi
+
+
 def compute_baseline_from_features(features):
-    """Compute baseline statistics from extracted features."""
+    """
+    Compute baseline statistics from extracted features.
+
+    Uses the labelled baseline condition when the recording has one (falling
+    back to whole-session statistics) and keeps every condition's statistics
+    as reference values.
+    """
+    conditions = features.get("conditions") or {}
+    reference = conditions.get("baseline")
+    source = reference or features
     baseline = {
         "subject_id": features["subject_id"],
-        "eda": features.get("eda", {}),
-        "temp": features.get("temp", {}),
-        "bvp": features.get("bvp", {}),
-        "ecg": features.get("ecg", {}),
-        "resp": features.get("resp", {}),
+        "eda": source.get("eda", {}),
+        "temp": source.get("temp", {}),
+        "bvp": source.get("bvp", {}),
+        "ecg": source.get("ecg", {}),
+        "resp": source.get("resp", {}),
+        "resp_rate": source.get("resp_rate", {}),
+        "pulse_rate": source.get("pulse_rate", {}),
+        "hrv": source.get("hrv", {}),
+        "scr": source.get("scr", {}),
+        "baseline_source": "label" if reference else "session",
+        "conditions": conditions,
         "computed_at": datetime.utcnow(),
     }
     return baseline
 
 
-def process_all_subjects(base_path="data/wearable", compute_baselines=True):
+def ensure_wearable_indexes():
+    """Unique subject_id indexes, so every upsert is a single index lookup."""
+    for collection in (wearable_collection, wearable_baselines):
+        try:
+            collection.create_index([("subject_id", ASCENDING)], unique=True)
+        except OperationFailure as e:
+            # Duplicate documents (or an existing non-unique index) - keep a plain index
+            print(f"⚠️  Could not create unique subject_id index on {collection.name}: {e}")
+            collection.create_index([("subject_id", ASCENDING)])
+    ingest_manifest.create_index([("subject_id", ASCENDING)], unique=True)
+    ensure_snapshot_indexes()
+    ensure_baseline_indexes()
+    ensure_event_indexes()
+
+
+def extractor_signature(compute_baselines=True, window_s=DEFAULT_WINDOW_S, hop_s=DEFAULT_HOP_S):
+    """Everything besides the source file that determines the ingested documents."""
+    return {
+        "version": FEATURE_EXTRACTOR_VERSION,
+        "baselines": bool(compute_baselines),
+        "window_s": window_s,
+        "hop_s": hop_s if window_s else None,
+    }
+
+
+def source_info(pkl_path, source_hash=None):
+    """Size, mtime and content hash of a source pickle."""
+    stat = os.stat(pkl_path)
+    return {
+        "path": os.path.abspath(pkl_path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "hash": source_hash or file_hash(pkl_path),
+    }
+
+
+def select_changed_subjects(subjects, signature, restamp=True):
+    """
+    Split subjects into (changed, unchanged) using the ingestion manifest.
+
+    Size + mtime short-circuit the check; a touched but identical file is
+    confirmed by its hash and re-stamped (unless restamp=False). A different
+    extractor signature always means reprocessing.
+    """
+    entries = {
+        doc["subject_id"]: doc
+        for doc in ingest_manifest.find({"subject_id": {"$in": [subject_id for subject_id, _ in subjects]}})
+    }
+    changed, unchanged, restamps = [], [], []
+    for subject_id, pkl_path in subjects:
+        entry = entries.get(subject_id)
+        if not entry or entry.get("extractor") != signature:
+            changed.append((subject_id, pkl_path))
+            continue
+        source = entry.get("source", {})
+        stat = os.stat(pkl_path)
+        if source.get("size") == stat.st_size and source.get("mtime") == stat.st_mtime:
+            unchanged.append(subject_id)
+        elif source.get("size") == stat.st_size and source.get("hash") == file_hash(pkl_path):
+            unchanged.append(subject_id)
+            restamps.append(UpdateOne({"subject_id": subject_id}, {"$set": {"source.mtime": stat.st_mtime}}))
+        else:
+            changed.append((subject_id, pkl_path))
+    if restamps and restamp:
+        ingest_manifest.bulk_write(restamps, ordered=False)
+    return changed, unchanged
+
+
+def record_ingested(results, signature):
+    """Upsert manifest entries for a successfully written batch."""
+    now = datetime.utcnow()
+    version = scoring_version()
+    ingest_manifest.bulk_write(
+        [
+            UpdateOne(
+                {"subject_id": r["subject_id"]},
+                {"$set": {
+                    "subject_id": r["subject_id"],
+                    "source": r["source"],
+                    "extractor": signature,
+                    "outputs": {
+                        "features": FEATURE_EXTRACTOR_VERSION,
+                        "windows": len(r["matrix"]["values"]) if r.get("matrix") is not None else 0,
+                        "scoring_version": version,
+                    },
+                    "ingested_at": now,
+                }},
+                upsert=True,
+            )
+            for r in results
+        ],
+        ordered=False,
+    )
+
+
+def find_subject_files(base_path="data/wearable"):
+    """(subject_id, pkl_path) for every S* folder that has a .pkl file."""
+    subjects = []
+    for subject_folder in sorted(os.listdir(base_path)):
+        if not subject_folder.startswith("S"):
+            continue
+        pkl_path = os.path.join(base_path, subject_folder, f"{subject_folder}.pkl")
+        if not os.path.exists(pkl_path):
+            print(f"⚠️  No .pkl file found for {subject_folder}")
+            continue
+        subjects.append((subject_folder, pkl_path))
+    return subjects
+
+
+def process_subject(
+    subject_id,
+    pkl_path,
+    compute_baselines=True,
+    cache_dir=DEFAULT_CACHE_DIR,
+    window_s=DEFAULT_WINDOW_S,
+    hop_s=DEFAULT_HOP_S,
+    dry_run=False,
+):
+    """
+    Extract features, the aligned feature matrix (and baseline) for one subject without touching MongoDB.
+
+    Runs inside worker processes in parallel mode, so it only returns plain
+    documents and one compact float32 matrix; the parent process does all
+    writes in bulk. With a cache_dir, the pickle is converted once
+    (database/wesad_cache.py), features are read from memory-mapped channels
+    and the feature matrix is saved next to them (and read back while the
+    source and extractor version are unchanged). window_s=None skips
+    windowed features. With dry_run nothing is written: an up-to-date cache
+    is read as-is, otherwise the pickle is read directly.
+    """
+    started = time.perf_counter()
+    manifest = None
+    if cache_dir and dry_run:
+        manifest = load_manifest(subject_id, cache_dir)
+        if manifest is not None and not is_cached(pkl_path, subject_id, cache_dir, manifest, restamp=False):
+            manifest = None
+    elif cache_dir:
+        manifest = convert_subject(pkl_path, subject_id, cache_dir)
+    if manifest is not None:
+        signals = feature_signals(subject_id, cache_dir, manifest)
+        sample_rates = feature_sample_rates(manifest)
+        source = source_info(pkl_path, manifest["source_hash"])
+    else:
+        source = source_info(pkl_path)
+        signals, sample_rates = load_pkl_signals(pkl_path)
+    features = extract_features_from_signals(signals, subject_id, sample_rates)
+    if not has_pwi_features(features):
+        # Never write (or record as ingested) a result without any usable signal
+        raise ValueError(f"No PWI features extracted for {subject_id} (channels found: {sorted(signals) or 'none'})")
+    matrix = None
+    if window_s and manifest is not None:
+        matrix = load_feature_matrix(subject_id, window_s, hop_s, cache_dir, manifest, version=FEATURE_EXTRACTOR_VERSION)
+    if window_s and matrix is None:
+        matrix = extract_feature_matrix(signals, sample_rates, window_s, hop_s)
+        if matrix is not None and manifest is not None and not dry_run:
+            save_feature_matrix(subject_id, matrix, cache_dir, manifest, version=FEATURE_EXTRACTOR_VERSION)
+    baseline = compute_baseline_from_features(features) if compute_baselines else None
+    return {
+        "subject_id": subject_id,
+        "features": features,
+        "baseline": baseline,
+        "matrix": matrix,
+        "source": source,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def write_subject_results(results, compute_baselines=True):
+    """
+    Upsert features/baselines for a batch of subjects with one bulk_write per collection,
+    replace their feature windows and refresh rolling baselines, then score the
+    windows and materialize PWI snapshots against the resolved baselines.
+
+    Every score is taken against resolve_baselines (the stored baseline with
+    rolling stats applied), so snapshots match what compute_pwi, the cohort
+    engine and recompute_snapshots would compute.
+
+    Returns:
+        Number of newly inserted baselines
+    """
+    if not results:
+        return 0
+
+    wearable_collection.bulk_write(
+        [
+            UpdateOne({"subject_id": r["subject_id"]}, {"$set": r["features"]}, upsert=True)
+            for r in results
+        ],
+        ordered=False,
+    )
+    baseline_count = 0
+    if compute_baselines:
+        outcome = wearable_baselines.bulk_write(
+            [
+                UpdateOne({"subject_id": r["subject_id"]}, {"$set": r["baseline"]}, upsert=True)
+                for r in results
+            ],
+            ordered=False,
+        )
+        baseline_count = outcome.upserted_count
+
+    # Day buckets for the new windows first, so rolling baselines cover them before scoring
+    pending = {
+        r["subject_id"]: replace_window_sums(r["subject_id"], matrix_to_windows(r["matrix"]), source="ingestion")
+        for r in results
+        if r.get("matrix") is not None
+    }
+    refresh_baselines(list(pending))
+    baselines = resolve_baselines([r["subject_id"] for r in results])
+
+    snapshots = []
+    for r in results:
+        subject_id = r["subject_id"]
+        baseline = baselines.get(subject_id)
+        docs = pending.get(subject_id)
+        if docs:
+            pwi = score_matrix(r["matrix"]["names"], r["matrix"]["values"], baseline)
+            for doc, value in zip(docs, np.round(pwi, 2).tolist()):
+                doc["pwi"] = value
+            store_feature_windows(docs)
+        # Drop cached baselines / PWI for this subject (write-through invalidation)
+        invalidate_subject(subject_id)
+        snapshots.append((subject_id, r["features"], baseline))
+    # Materialize the PWI snapshots that compute_pwi serves
+    materialize_snapshots(snapshots)
+    return baseline_count
+
+
+def plan_subject_writes(results, compute_baselines=True):
+    """
+    Writes write_subject_results would make for a batch, without writing (dry run).
+
+    Returns:
+        {collection: {operation: count}}
+    """
+    subject_ids = [r["subject_id"] for r in results]
+    selector = {"subject_id": {"$in": subject_ids}}
+    plan = {}
+
+    existing = set(wearable_collection.distinct("subject_id", selector))
+    plan[wearable_collection.name] = {"insert": len(set(subject_ids) - existing), "update": len(existing)}
+    if compute_baselines:
+        existing = set(wearable_baselines.distinct("subject_id", selector))
+        plan[wearable_baselines.name] = {"insert": len(set(subject_ids) - existing), "update": len(existing)}
+    windowed = [r for r in results if r.get("matrix") is not None]
+    if windowed:
+        plan["wearable_windows"] = {
+            "replace_subjects": len(windowed),
+            "insert": sum(len(r["matrix"]["values"]) for r in windowed),
+        }
+    plan["wellness_snapshots"] = {"upsert": len(results)}
+    return plan
+
+
+def _submit_pool(subjects, worker, workers, max_tasks_per_child):
+    """Yield (subject_id, result, error) as workers finish, keeping at most `workers` subjects in flight."""
+    try:
+        executor = ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=max_tasks_per_child)
+    except TypeError:
+        # Python < 3.11 has no max_tasks_per_child
+        executor = ProcessPoolExecutor(max_workers=workers)
+
+    pending = {}
+    queue = iter(subjects)
+    with executor:
+        for subject_id, pkl_path in queue:
+            pending[executor.submit(worker, subject_id, pkl_path)] = subject_id
+            if len(pending) >= workers:
+                break
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                subject_id = pending.pop(future)
+                try:
+                    yield subject_id, future.result(), None
+                except Exception as e:
+                    yield subject_id, None, e
+                # Refill: one finished subject -> one new subject (bounded memory)
+                for next_id, next_path in queue:
+                    pending[executor.submit(worker, next_id, next_path)] = next_id
+                    break
+
+
+def _run_serial(subjects, worker):
+    for subject_id, pkl_path in subjects:
+        print(f"📦 Processing {subject_id}...")
+        try:
+            yield subject_id, worker(subject_id, pkl_path), None
+        except Exception as e:
+            yield subject_id, None, e
+
+
+def process_all_subjects(
+    base_path="data/wearable",
+    compute_baselines=True,
+    workers=1,
+    batch_size=DEFAULT_WRITE_BATCH,
+    max_tasks_per_child=1,
+    cache_dir=DEFAULT_CACHE_DIR,
+    window_s=DEFAULT_WINDOW_S,
+    hop_s=DEFAULT_HOP_S,
+    dry_run=False,
+    force=False,
+):
     """
     Process all subject folders and extract features.
     
     Args:
         base_path: Base path to wearable data directory
         compute_baselines: Whether to compute and store baseline statistics
+        workers: Number of worker processes (1 = process subjects in this process)
+        batch_size: Number of subjects per bulk write
+        max_tasks_per_child: Recycle a worker after this many subjects, releasing
+            the memory of each unpickled recording (parallel mode only)
+        cache_dir: Memory-mappable signal cache (None reads the pickles directly)
+        window_s: Feature window length in seconds (None = no windowed features)
+        hop_s: Step between feature windows in seconds
+        dry_run: Extract features and report the planned writes without writing
+        force: Reprocess every subject, even if unchanged since the last run
+
+    Returns:
+        Summary dict with processed/baseline counts, failures, elapsed seconds
+        and (dry run) the planned writes per collection
     """
+    started = time.perf_counter()
     processed_count = 0
     baseline_count = 0
+    failures = {}
+    planned = {}
+    if not dry_run:
+        ensure_wearable_indexes()
 
-    for subject_folder in os.listdir(base_path):
-        if not subject_folder.startswith("S"):
-            continue
+    signature = extractor_signature(compute_baselines, window_s, hop_s)
+    subjects = find_subject_files(base_path)
+    unchanged = []
+    if not force:
+        subjects, unchanged = select_changed_subjects(subjects, signature, restamp=not dry_run)
+        if unchanged:
+            print(f"⏭️  Skipping {len(unchanged)} unchanged subjects (use --force to reprocess)")
+    total = len(subjects)
+    worker = partial(
+        process_subject,
+        compute_baselines=compute_baselines,
+        cache_dir=cache_dir,
+        window_s=window_s,
+        hop_s=hop_s,
+        dry_run=dry_run,
+    )
+    if workers > 1:
+        print(f"🚀 Processing {total} subjects with {workers} workers...")
+        outcomes = _submit_pool(subjects, worker, workers, max_tasks_per_child)
+    else:
+        outcomes = _run_serial(subjects, worker)
 
-        subject_path = os.path.join(base_path, subject_folder)
-        pkl_path = os.path.join(subject_path, f"{subject_folder}.pkl")
+    batch = []
 
-        if not os.path.exists(pkl_path):
-            print(f"⚠️  No .pkl file found for {subject_folder}")
-            continue
-
-        print(f"📦 Processing {subject_folder}...")
-        
+    def flush():
+        nonlocal baseline_count, processed_count
+        if not batch:
+            return
         try:
-            # Extract features
-            features = extract_features_from_pkl(pkl_path, subject_folder)
-            
-            # Check if subject already exists
-            existing = wearable_collection.find_one({"subject_id": subject_folder})
-            if existing:
-                # Update existing record
-                wearable_collection.update_one(
-                    {"subject_id": subject_folder},
-                    {"$set": features}
-                )
-                print(f"  ✅ Updated features for {subject_folder}")
+            if dry_run:
+                for collection, operations in plan_subject_writes(batch, compute_baselines).items():
+                    for operation, count in operations.items():
+                        planned.setdefault(collection, {}).setdefault(operation, 0)
+                        planned[collection][operation] += count
             else:
-                # Insert new record
-                wearable_collection.insert_one(features)
-                print(f"  ✅ Inserted features for {subject_folder}")
-            
-            processed_count += 1
-
-            # Compute and store baseline if requested
-            if compute_baselines:
-                baseline = compute_baseline_from_features(features)
-                existing_baseline = wearable_baselines.find_one({"subject_id": subject_folder})
-                
-                if existing_baseline:
-                    wearable_baselines.update_one(
-                        {"subject_id": subject_folder},
-                        {"$set": baseline}
-                    )
-                    print(f"  ✅ Updated baseline for {subject_folder}")
-                else:
-                    wearable_baselines.insert_one(baseline)
-                    print(f"  ✅ Stored baseline for {subject_folder}")
-                    baseline_count += 1
-
+                baseline_count += write_subject_results(batch, compute_baselines)
+                record_ingested(batch, signature)
+            processed_count += len(batch)
         except Exception as e:
-            print(f"  ❌ Error processing {subject_folder}: {e}")
+            for r in batch:
+                failures[r["subject_id"]] = f"write failed: {e}"
+        batch.clear()
+
+    for done, (subject_id, result, error) in enumerate(outcomes, start=1):
+        if error is not None:
+            failures[subject_id] = str(error)
+            print(f"  ❌ [{done}/{total}] Error processing {subject_id}: {error}")
             continue
+        print(f"  ✅ [{done}/{total}] Extracted features for {subject_id} ({result['seconds']}s)")
+        batch.append(result)
+        if len(batch) >= batch_size:
+            flush()
+    flush()
 
-    print(f"\n🎉 Processing complete!")
-    print(f"  Processed subjects: {processed_count}")
+    elapsed = round(time.perf_counter() - started, 1)
+    print(f"\n🎉 Processing complete in {elapsed}s!")
+    print(f"  Processed subjects: {processed_count}/{total}")
+    print(f"  Unchanged (skipped): {len(unchanged)}")
     print(f"  Baselines computed: {baseline_count}")
+    if failures:
+        print(f"  Failed subjects: {len(failures)}")
+        for subject_id, error in sorted(failures.items()):
+            print(f"    - {subject_id}: {error}")
+    if dry_run:
+        print("  📝 Planned writes (dry run, nothing written):")
+        for collection, operations in planned.items():
+            details = ", ".join(f"{count} {operation}" for operation, count in operations.items())
+            print(f"    - {collection}: {details}")
+
+    return {
+        "total": total,
+        "processed": processed_count,
+        "skipped": unchanged,
+        "baselines": baseline_count,
+        "failures": failures,
+        "seconds": elapsed,
+        "planned": planned,
+    }
 
 
 if __name__ == "__main__":
@@ -138,9 +736,32 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Process WESAD wearable data")
     parser.add_argument("--base-path", default="data/wearable", help="Base path to wearable data")
     parser.add_argument("--no-baselines", action="store_true", help="Skip baseline computation")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (default: 1, serial)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_WRITE_BATCH, help="Subjects per bulk write")
+    parser.add_argument(
+        "--max-tasks-per-child", type=int, default=1,
+        help="Subjects per worker before it is recycled (bounds worker memory)",
+    )
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Memory-mappable signal cache directory")
+    parser.add_argument("--no-cache", action="store_true", help="Read the pickles directly, without the .npy cache")
+    parser.add_argument("--window-s", type=float, default=DEFAULT_WINDOW_S, help="Feature window length in seconds")
+    parser.add_argument("--hop-s", type=float, default=DEFAULT_HOP_S, help="Step between feature windows in seconds")
+    parser.add_argument("--no-windows", action="store_true", help="Skip windowed features")
+    parser.add_argument("--dry-run", action="store_true", help="Report planned writes without writing to MongoDB")
+    parser.add_argument("--force", action="store_true", help="Reprocess subjects even if unchanged since the last run")
     args = parser.parse_args()
     
-    process_all_subjects(
+    summary = process_all_subjects(
         base_path=args.base_path,
-        compute_baselines=not args.no_baselines
+        compute_baselines=not args.no_baselines,
+        workers=max(1, args.workers),
+        batch_size=max(1, args.batch_size),
+        max_tasks_per_child=max(1, args.max_tasks_per_child),
+        cache_dir=None if args.no_cache else args.cache_dir,
+        window_s=None if args.no_windows else args.window_s,
+        hop_s=args.hop_s,
+        dry_run=args.dry_run,
+        force=args.force,
     )
+    if summary["failures"]:
+        raise SystemExit(1)
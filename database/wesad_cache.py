@@ -0,0 +1,349 @@
+"""
+One-time conversion of WESAD pickles to a memory-mappable columnar cache.
+
+Each subject's pickle is unpickled once and written as one .npy file per
+channel plus label.npy, under a directory named after the content hash of the
+source file:
+
+    <cache_dir>/<subject_id>/manifest.json
+    <cache_dir>/<subject_id>/<hash>/chest_ECG.npy, wrist_BVP.npy, label.npy, ...
+
+The manifest records the source hash/size/mtime and, per channel, the file,
+sample rate, shape and dtype. Readers open channels with
+np.load(mmap_mode="r"), which takes milliseconds and only touches the pages a
+computation reads.
+
+Ingestion also stores each subject's aligned per-window feature matrix
+(windows x features, float32) next to the channels, registered under
+"feature_matrices" in the manifest with the extractor version that built it;
+re-ingesting an unchanged source with the same extractor reads it back
+instead of recomputing the windows.
+
+Both pickle layouts are supported: the original WESAD layout
+(signal -> chest/wrist -> channel) and a flat one (signal -> channel).
+
+Usage:
+    python -m database.wesad_cache --base-path data/wearable --cache-dir data/wearable_cache
+"""
+import hashlib
+import json
+import os
+import pickle
+import shutil
+from datetime import datetime
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = "data/wearable_cache"
+CACHE_FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+HASH_CHUNK_BYTES = 1 << 20
+
+# WESAD sample rates (Hz): RespiBAN chest device and Empatica E4 wrist device
+CHEST_SAMPLE_RATE = 700
+WRIST_SAMPLE_RATES = {"ACC": 32, "BVP": 64, "EDA": 4, "TEMP": 4}
+LABEL_SAMPLE_RATE = 700
+# Flat pickles use chest channel names, except BVP which only the wrist records
+FLAT_SAMPLE_RATES = {"BVP": 64}
+
+# Channels the feature extractor expects, in order of preference
+FEATURE_CHANNELS = {
+    "EDA": ("chest_EDA", "EDA", "wrist_EDA"),
+    "ECG": ("chest_ECG", "ECG"),
+    "EMG": ("chest_EMG", "EMG"),
+    "BVP": ("wrist_BVP", "BVP"),
+    "Resp": ("chest_Resp", "Resp"),
+    "Temp": ("chest_Temp", "Temp", "wrist_TEMP"),
+    "label": ("label",),
+}
+
+
+def file_hash(path):
+    """SHA-256 of a file, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _channels_from_pickle(data):
+    """Yield (channel_name, sample_rate, array) for every signal in a WESAD pickle."""
+    signals = data.get("signal", {})
+    if "chest" in signals or "wrist" in signals:
+        for name, arr in signals.get("chest", {}).items():
+            yield f"chest_{name}", CHEST_SAMPLE_RATE, arr
+        for name, arr in signals.get("wrist", {}).items():
+            yield f"wrist_{name}", WRIST_SAMPLE_RATES.get(name, CHEST_SAMPLE_RATE), arr
+    else:
+        for name, arr in signals.items():
+            yield name, FLAT_SAMPLE_RATES.get(name, CHEST_SAMPLE_RATE), arr
+
+
+def load_manifest(subject_id, cache_dir=DEFAULT_CACHE_DIR):
+    path = os.path.join(cache_dir, subject_id, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_manifest(subject_dir, manifest):
+    tmp_path = os.path.join(subject_dir, MANIFEST_NAME + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(subject_dir, MANIFEST_NAME))
+
+
+def is_cached(pkl_path, subject_id, cache_dir=DEFAULT_CACHE_DIR, manifest=None, restamp=True):
+    """
+    Whether the cache matches the source pickle.
+
+    Size + mtime short-circuit the check; otherwise the content hash decides
+    (a touched but unchanged file is re-stamped instead of reconverted, unless
+    restamp=False).
+    """
+    manifest = manifest or load_manifest(subject_id, cache_dir)
+    if not manifest or manifest.get("format_version") != CACHE_FORMAT_VERSION:
+        return False
+    stat = os.stat(pkl_path)
+    if manifest["source_size"] == stat.st_size and manifest["source_mtime"] == stat.st_mtime:
+        return True
+    if manifest["source_size"] != stat.st_size or file_hash(pkl_path) != manifest["source_hash"]:
+        return False
+    if not restamp:
+        return True
+    manifest["source_mtime"] = stat.st_mtime
+    _write_manifest(os.path.join(cache_dir, subject_id), manifest)
+    return True
+
+
+def _write_channels(pkl_path, out_dir):
+    """Unpickle once and write every channel (and the labels) as .npy files."""
+    with open(pkl_path, "rb") as f:
+        data = pickle.load(f, encoding="latin1")
+
+    channels = {}
+    for name, sample_rate, arr in _channels_from_pickle(data):
+        arr = np.ascontiguousarray(arr)
+        np.save(os.path.join(out_dir, f"{name}.npy"), arr)
+        channels[name] = {
+            "file": f"{name}.npy",
+            "sample_rate": sample_rate,
+            "shape": list(arr.shape),
+            "dtype": str(arr.dtype),
+            "length": int(arr.shape[0]) if arr.ndim else 0,
+        }
+    label = data.get("label")
+    if label is not None:
+        label = np.ascontiguousarray(label)
+        np.save(os.path.join(out_dir, "label.npy"), label)
+        channels["label"] = {
+            "file": "label.npy",
+            "sample_rate": LABEL_SAMPLE_RATE,
+            "shape": list(label.shape),
+            "dtype": str(label.dtype),
+            "length": int(label.shape[0]),
+        }
+    return channels
+
+
+def convert_subject(pkl_path, subject_id, cache_dir=DEFAULT_CACHE_DIR, force=False):
+    """
+    Convert one WESAD pickle to .npy channels + manifest (no-op if already cached).
+
+    Returns:
+        The subject's manifest
+    """
+    manifest = load_manifest(subject_id, cache_dir)
+    if not force and is_cached(pkl_path, subject_id, cache_dir, manifest):
+        return load_manifest(subject_id, cache_dir)
+
+    stat = os.stat(pkl_path)
+    source_hash = file_hash(pkl_path)
+    subject_dir = os.path.join(cache_dir, subject_id)
+    data_dir = os.path.join(subject_dir, source_hash[:16])
+    tmp_dir = data_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    try:
+        channels = _write_channels(pkl_path, tmp_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    shutil.rmtree(data_dir, ignore_errors=True)
+    os.replace(tmp_dir, data_dir)
+    manifest = {
+        "subject_id": subject_id,
+        "format_version": CACHE_FORMAT_VERSION,
+        "source": os.path.abspath(pkl_path),
+        "source_hash": source_hash,
+        "source_size": stat.st_size,
+        "source_mtime": stat.st_mtime,
+        "data_dir": source_hash[:16],
+        "converted_at": datetime.utcnow().isoformat(),
+        "channels": channels,
+    }
+    _write_manifest(subject_dir, manifest)
+
+    # Drop data directories of older source versions
+    for entry in os.listdir(subject_dir):
+        path = os.path.join(subject_dir, entry)
+        if os.path.isdir(path) and entry != manifest["data_dir"]:
+            shutil.rmtree(path, ignore_errors=True)
+    return manifest
+
+
+def open_channels(subject_id, cache_dir=DEFAULT_CACHE_DIR, manifest=None):
+    """Memory-map every cached channel of a subject: name -> read-only array."""
+    manifest = manifest or load_manifest(subject_id, cache_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No cached signals for {subject_id} in {cache_dir}")
+    data_dir = os.path.join(cache_dir, subject_id, manifest["data_dir"])
+    return {
+        name: np.load(os.path.join(data_dir, info["file"]), mmap_mode="r")
+        for name, info in manifest["channels"].items()
+    }
+
+
+def _feature_channel_names(available):
+    """Sensor name (EDA, ECG, ...) -> cached channel name, for the channels present."""
+    names = {}
+    for name, candidates in FEATURE_CHANNELS.items():
+        for candidate in candidates:
+            if candidate in available:
+                names[name] = candidate
+                break
+    return names
+
+
+def feature_signals(subject_id, cache_dir=DEFAULT_CACHE_DIR, manifest=None):
+    """Memory-mapped channels under the sensor names used by feature extraction (EDA, ECG, ...)."""
+    channels = open_channels(subject_id, cache_dir, manifest)
+    return {name: channels[channel] for name, channel in _feature_channel_names(channels).items()}
+
+
+def feature_sample_rates(manifest):
+    """Sample rate (Hz) per sensor name, matching feature_signals."""
+    channels = manifest["channels"]
+    return {name: channels[channel]["sample_rate"] for name, channel in _feature_channel_names(channels).items()}
+
+
+def pickle_feature_signals(pkl_path):
+    """
+    Channels of a pickle read directly (no cache), under the same sensor names
+    and sample rates as feature_signals / feature_sample_rates.
+
+    Returns:
+        (sensor name -> array, sensor name -> sample rate in Hz)
+    """
+    with open(pkl_path, "rb") as f:
+        data = pickle.load(f, encoding="latin1")
+
+    channels, rates = {}, {}
+    for name, sample_rate, arr in _channels_from_pickle(data):
+        channels[name], rates[name] = arr, sample_rate
+    if data.get("label") is not None:
+        channels["label"], rates["label"] = data["label"], LABEL_SAMPLE_RATE
+    names = _feature_channel_names(channels)
+    return (
+        {name: channels[channel] for name, channel in names.items()},
+        {name: rates[channel] for name, channel in names.items()},
+    )
+
+
+def flat_sample_rates(signals):
+    """Sample rates for a flat (signal -> channel) pickle."""
+    rates = {name: FLAT_SAMPLE_RATES.get(name, CHEST_SAMPLE_RATE) for name in signals}
+    if "label" in signals:
+        rates["label"] = LABEL_SAMPLE_RATE
+    return rates
+
+
+def _matrix_key(window_s, hop_s):
+    return f"w{window_s:g}_h{hop_s:g}"
+
+
+def save_feature_matrix(subject_id, matrix, cache_dir=DEFAULT_CACHE_DIR, manifest=None, version=None):
+    """
+    Store an aligned feature matrix as a compact float32 .npy next to the subject's channels.
+
+    Args:
+        matrix: {"names", "start_s", "values", "window_s", "hop_s", "duration_s"}
+            as built by backend.feature_windows.extract_feature_matrix
+        version: Version of the extractor that built it (checked on load)
+
+    Returns:
+        Path of the stored .npy file
+    """
+    manifest = manifest or load_manifest(subject_id, cache_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No cached signals for {subject_id} in {cache_dir}")
+    key = _matrix_key(matrix["window_s"], matrix["hop_s"])
+    subject_dir = os.path.join(cache_dir, subject_id)
+    filename = f"features_{key}.npy"
+    path = os.path.join(subject_dir, manifest["data_dir"], filename)
+    values = np.ascontiguousarray(matrix["values"], dtype=np.float32)
+    np.save(path, values)
+    manifest.setdefault("feature_matrices", {})[key] = {
+        "file": filename,
+        "names": list(matrix["names"]),
+        "window_s": matrix["window_s"],
+        "hop_s": matrix["hop_s"],
+        "duration_s": matrix["duration_s"],
+        "version": version,
+        "shape": list(values.shape),
+        "dtype": str(values.dtype),
+        "saved_at": datetime.utcnow().isoformat(),
+    }
+    _write_manifest(subject_dir, manifest)
+    return path
+
+
+def load_feature_matrix(subject_id, window_s, hop_s, cache_dir=DEFAULT_CACHE_DIR, manifest=None, version=None):
+    """Memory-mapped feature matrix saved by save_feature_matrix (same dict layout), or None if missing or from another extractor version."""
+    manifest = manifest or load_manifest(subject_id, cache_dir)
+    info = ((manifest or {}).get("feature_matrices") or {}).get(_matrix_key(window_s, hop_s))
+    if info is None or info.get("version") != version:
+        return None
+    values = np.load(os.path.join(cache_dir, subject_id, manifest["data_dir"], info["file"]), mmap_mode="r")
+    return {
+        "names": info["names"],
+        "start_s": np.arange(values.shape[0]) * info["hop_s"],
+        "values": values,
+        "window_s": info["window_s"],
+        "hop_s": info["hop_s"],
+        "duration_s": info["duration_s"],
+    }
+
+
+def convert_all_subjects(base_path="data/wearable", cache_dir=DEFAULT_CACHE_DIR, force=False):
+    """Convert every S*/S*.pkl under base_path; returns {subject_id: manifest}."""
+    manifests = {}
+    for subject_folder in sorted(os.listdir(base_path)):
+        if not subject_folder.startswith("S"):
+            continue
+        pkl_path = os.path.join(base_path, subject_folder, f"{subject_folder}.pkl")
+        if not os.path.exists(pkl_path):
+            continue
+        try:
+            manifests[subject_folder] = convert_subject(pkl_path, subject_folder, cache_dir, force=force)
+            print(f"  ✅ Cached {subject_folder} ({len(manifests[subject_folder]['channels'])} channels)")
+        except Exception as e:
+            print(f"  ❌ Error caching {subject_folder}: {e}")
+    return manifests
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert WESAD pickles to a memory-mappable .npy cache")
+    parser.add_argument("--base-path", default="data/wearable", help="Base path to wearable data")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Output cache directory")
+    parser.add_argument("--force", action="store_true", help="Reconvert even if the cache is up to date")
+    args = parser.parse_args()
+
+    converted = convert_all_subjects(args.base_path, args.cache_dir, force=args.force)
+    print(f"\n🎉 Cached {len(converted)} subjects in {args.cache_dir}")
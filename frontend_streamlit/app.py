@@ -1,6 +1,6 @@
 import streamlit as st
 import requests
-from datetime import datetime
+from datetime import datetime, timedelta
 import pandas as pd
 import time
 
@@ -99,6 +99,7 @@ CHAT_URL = f"{API_BASE}/chat"
 HISTORY_URL = f"{API_BASE}/history"
 WELLNESS_URL = f"{API_BASE}/wellness"
 RECS_URL = f"{API_BASE}/recommendations"
+SERIES_POINTS = 300  # chart points requested from the downsampled series endpoint
 
 # -----------------------------------------------------
 # Session State
@@ -282,8 +283,27 @@ with col_wellness:
     st.divider()
 
     st.subheader("📈 Trend")
-    if st.session_state.pwi_history:
-        df = pd.DataFrame(st.session_state.pwi_history)
+    trend_days = st.selectbox("Range", [1, 7, 30, 90], index=2, format_func=lambda d: f"Last {d} days")
+    series_points = []
+    try:
+        res = requests.get(
+            f"{WELLNESS_URL}/{st.session_state.subject_id}/series",
+            headers=headers,
+            params={
+                "from": (datetime.utcnow() - timedelta(days=trend_days)).isoformat(),
+                "points": SERIES_POINTS,
+            },
+            timeout=10,
+        )
+        if res.status_code == 200:
+            series_points = res.json().get("points", [])
+    except Exception:
+        pass
+
+    # Fall back to the points collected in this session when the API has no history
+    trend = series_points or st.session_state.pwi_history[-SERIES_POINTS:]
+    if trend:
+        df = pd.DataFrame(trend)
         df["timestamp"] = pd.to_datetime(df["timestamp"])
         df = df.set_index("timestamp")
         st.line_chart(df["pwi"], height=200)